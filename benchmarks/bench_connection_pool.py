@@ -0,0 +1,68 @@
+# benchmarks/bench_connection_pool.py
+"""Compare a fresh AsyncClient per request against a pooled provider client.
+
+Usage: python -m benchmarks.bench_connection_pool [requests] [concurrency]
+"""
+import asyncio
+import sys
+import time
+
+import httpx
+
+from benchmarks.mock_server import MockChatServer
+from src.providers.groq import GroqProvider
+
+
+async def run_unpooled(server, total, concurrency):
+    """Baseline: open a new client (and connection) for every request"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            async with httpx.AsyncClient() as client:
+                response = await client.post(
+                    f"{server.base_url}/chat/completions",
+                    json={"model": "mock", "messages": [{"role": "user", "content": "hi"}]},
+                )
+                response.json()
+
+    await asyncio.gather(*(one() for _ in range(total)))
+
+
+async def run_pooled(server, total, concurrency):
+    """Send requests through a provider that keeps its connection pool open"""
+    provider = GroqProvider({
+        "base_url": server.base_url,
+        "rate_limits": {"requests_per_minute": total * 10},
+        "models": {"mock": 1},
+        "http": {"max_connections": concurrency, "max_keepalive_connections": concurrency},
+    }, api_key="mock")
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            result = await provider.generate("hi", "mock")
+            assert "error" not in result, result
+
+    await provider.open()
+    try:
+        await asyncio.gather(*(one() for _ in range(total)))
+    finally:
+        await provider.aclose()
+
+
+async def main(total=500, concurrency=10):
+    for label, runner in (("new client per request", run_unpooled), ("pooled provider client", run_pooled)):
+        async with MockChatServer() as server:
+            start = time.perf_counter()
+            await runner(server, total, concurrency)
+            elapsed = time.perf_counter() - start
+            print(
+                f"{label:<24} {total} requests in {elapsed:.3f}s "
+                f"({elapsed / total * 1000:.2f} ms/request, {server.connection_count} connections)"
+            )
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    asyncio.run(main(*args))
@@ -0,0 +1,75 @@
+# benchmarks/bench_routing.py
+"""Measure routing overhead with a few hundred synthetic models.
+
+Compares the precomputed routing index against rescoring every model on
+every request, the way the router used to select candidates.
+
+Usage: python -m benchmarks.bench_routing [models] [providers] [history]
+"""
+import random
+import sys
+import time
+
+from src.providers.base import OpenAICompatibleProvider
+from src.router import LLMRouter
+
+
+def build_router(model_count, provider_count, history):
+    random.seed(0)
+    providers = []
+    for index in range(provider_count):
+        models = {f"model-{m}": random.randint(1, 10) for m in range(model_count) if random.random() < 0.6}
+        provider = OpenAICompatibleProvider(f"provider-{index}", {
+            "base_url": "http://127.0.0.1:9",
+            "rate_limits": {"requests_per_minute": history * 10, "tokens_per_minute": history * 10000},
+            "models": models,
+        })
+        providers.append(provider)
+
+    router = LLMRouter(providers=providers)
+    for provider in providers:
+        for _ in range(history):
+            router.rate_limiter.record_usage(provider.name, 100)
+    return router
+
+
+def legacy_candidates(router, tokens):
+    """Candidate selection as it was before the routing index"""
+    pairs = []
+    for model in router.list_available_models():
+        scores = [(router._get_provider_score(name, model, tokens), name) for name in router.model_map[model]]
+        scores = [(score, name) for score, name in scores if score > float("-inf")]
+        if scores:
+            _, best = max(scores)
+            pairs.append((-router.providers[best].available_models[model], model, best))
+    pairs.sort()
+    return [(name, model) for _, model, name in pairs]
+
+
+def indexed_candidates(router, tokens):
+    return list(router._iter_candidates(None, tokens))
+
+
+def first_candidate(router, tokens):
+    return next(router._iter_candidates(None, tokens))
+
+
+def bench(label, fn, router, iterations):
+    fn(router, 1000)  # warm up, builds the index
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(router, 1000)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<36} {elapsed / iterations * 1e6:10.1f} us/selection")
+
+
+def main(model_count=300, provider_count=3, history=20):
+    router = build_router(model_count, provider_count, history)
+    print(f"{len(router.model_map)} models, {provider_count} providers, {history} requests in window")
+    bench("rescore every model (legacy)", legacy_candidates, router, 200)
+    bench("routing index, full candidate list", indexed_candidates, router, 200)
+    bench("routing index, first candidate", first_candidate, router, 2000)
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:4]])
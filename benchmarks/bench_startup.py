@@ -0,0 +1,93 @@
+# benchmarks/bench_startup.py
+"""Measure the cold start cost of the router: importing it and building LLMRouter().
+
+Every run uses a fresh interpreter, the way a serverless invocation does.
+Reports the median over the runs, plus the slowest imports of one run, and
+exits with status 1 when a budget is exceeded, so it can gate CI.
+
+Usage:
+    python -m benchmarks.bench_startup [--runs 10] [--providers groq,perplexity]
+        [--import-budget-ms 100] [--construct-budget-ms 50] [--top 10]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# Runs in the fresh interpreter; keys are fake, constructing a router makes no requests
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from src.router import LLMRouter
+imported = time.perf_counter()
+router = LLMRouter({name: "startup-probe" for name in sys.argv[1].split(",") if name})
+constructed = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "construct_ms": (constructed - imported) * 1000,
+    "providers": sorted(router.providers),
+    "modules": len(sys.modules),
+}))
+"""
+
+
+def probe(providers, importtime=False):
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    result = subprocess.run(command + ["-c", PROBE, providers], capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_imports(stderr, top):
+    """Parse ``-X importtime`` output into the modules with the largest self time"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative_us), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main(args):
+    probe(args.providers)  # warm up, writes bytecode caches
+    runs = [probe(args.providers)[0] for _ in range(args.runs)]
+    import_ms = statistics.median(run["import_ms"] for run in runs)
+    construct_ms = statistics.median(run["construct_ms"] for run in runs)
+
+    print(f"providers {', '.join(runs[0]['providers']) or 'none'}, {runs[0]['modules']} modules loaded, "
+          f"median of {args.runs} runs")
+    print(f"  import src.router   {import_ms:8.1f} ms  (budget {args.import_budget_ms} ms)")
+    print(f"  LLMRouter()         {construct_ms:8.1f} ms  (budget {args.construct_budget_ms} ms)")
+
+    if args.top:
+        _, stderr = probe(args.providers, importtime=True)
+        print(f"  slowest imports (self / cumulative ms):")
+        for self_us, cumulative_us, name in slowest_imports(stderr, args.top):
+            print(f"    {self_us / 1000:7.1f} {cumulative_us / 1000:8.1f}  {name}")
+
+    over = []
+    if import_ms > args.import_budget_ms:
+        over.append("import")
+    if construct_ms > args.construct_budget_ms:
+        over.append("construction")
+    if over:
+        print(f"Over budget: {', '.join(over)}")
+        sys.exit(1)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--providers", default="groq,perplexity,openrouter",
+                        help="comma-separated providers that get a (fake) API key")
+    parser.add_argument("--import-budget-ms", type=float, default=100.0)
+    parser.add_argument("--construct-budget-ms", type=float, default=50.0)
+    parser.add_argument("--top", type=int, default=10, help="list the slowest imports, 0 to skip")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    main(parse_args())
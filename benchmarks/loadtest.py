@@ -0,0 +1,289 @@
+# benchmarks/loadtest.py
+"""Load-test the router against local mock providers.
+
+Runs the generate, stream and bulk (generate_many) paths at several
+concurrency levels against three mock OpenAI-compatible servers with
+injected latency, 429s, 5xx errors or slow streams. Reports throughput,
+latency percentiles, error counts and memory, and writes everything to a
+JSON file so runs can be compared.
+
+Usage:
+    python -m benchmarks.loadtest [--scenario clean] [--paths generate,stream,bulk]
+        [--concurrency 1,10,100,1000] [--requests 2000] [--output loadtest.json]
+        [--trace-memory] [--compare previous.json]
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from benchmarks.mock_server import MockChatServer, lognormal
+from src.providers.groq import GroqProvider
+from src.providers.openrouter import OpenRouterProvider
+from src.providers.perplexity import PerplexityProvider
+from src.router import LLMRouter
+from src.utils.admission import AdmissionQueue
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Server settings per scenario; latency is the median of a lognormal distribution
+SCENARIOS = {
+    "clean": {"latency": 0.05},
+    "rate_limited": {"latency": 0.05, "rate_limit_rate": 0.1, "retry_after": 1},
+    "flaky": {"latency": 0.05, "server_error_rate": 0.05},
+    "slow_stream": {"latency": 0.05, "stream_chunks": 32, "stream_interval": 0.01},
+}
+
+PROVIDER_CLASSES = (GroqProvider, PerplexityProvider, OpenRouterProvider)
+
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(int(round(percent / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(samples):
+    """Latency summary in milliseconds"""
+    values = sorted(samples)
+    if not values:
+        return None
+    return {
+        "p50": percentile(values, 50) * 1000,
+        "p90": percentile(values, 90) * 1000,
+        "p99": percentile(values, 99) * 1000,
+        "mean": sum(values) / len(values) * 1000,
+        "max": values[-1] * 1000,
+    }
+
+
+def max_rss_bytes():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_router(servers, total):
+    """A router over one mock server per provider, with quotas that never bind"""
+    providers = []
+    for provider_class, server in zip(PROVIDER_CLASSES, servers):
+        providers.append(provider_class({
+            "base_url": server.base_url,
+            "rate_limits": {"requests_per_minute": total * 10},
+            "models": {"mock": 5},
+            "http": {"max_connections": 200, "max_keepalive_connections": 200},
+        }, api_key="mock"))
+    # Requests beyond the concurrency limits wait instead of failing
+    return LLMRouter(providers=providers, admission_queue=AdmissionQueue(max_wait=120))
+
+
+def error_kind(result):
+    error = result.get("error")
+    if error is None:
+        return None
+    return error.split(":")[0][:60]
+
+
+async def run_generate(router, total, concurrency, prefix):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = {}
+
+    async def one(index):
+        async with semaphore:
+            start = time.perf_counter()
+            result = await router.generate(f"{prefix} {index}", "mock")
+            latencies.append(time.perf_counter() - start)
+            kind = error_kind(result)
+            if kind:
+                errors[kind] = errors.get(kind, 0) + 1
+
+    await asyncio.gather(*(one(index) for index in range(total)))
+    return {"latency_ms": summarize(latencies), "errors": errors}
+
+
+async def run_stream(router, total, concurrency, prefix):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    first_chunk = []
+    errors = {}
+
+    async def one(index):
+        async with semaphore:
+            start = time.perf_counter()
+            first = None
+            async for chunk in router.generate_stream(f"{prefix} {index}", "mock"):
+                if first is None:
+                    first = time.perf_counter() - start
+                kind = error_kind(chunk)
+                if kind:
+                    errors[kind] = errors.get(kind, 0) + 1
+            latencies.append(time.perf_counter() - start)
+            first_chunk.append(first)
+
+    await asyncio.gather(*(one(index) for index in range(total)))
+    return {"latency_ms": summarize(latencies), "first_chunk_ms": summarize(first_chunk), "errors": errors}
+
+
+async def run_bulk(router, total, concurrency, prefix):
+    start = time.perf_counter()
+    completed = []
+    errors = {}
+    async for result in router.generate_many([f"{prefix} {index}" for index in range(total)], "mock",
+                                             concurrency=concurrency):
+        # Time from the start of the batch until each result arrived
+        completed.append(time.perf_counter() - start)
+        kind = error_kind(result)
+        if kind:
+            errors[kind] = errors.get(kind, 0) + 1
+    return {"completion_ms": summarize(completed), "errors": errors}
+
+
+RUNNERS = {"generate": run_generate, "stream": run_stream, "bulk": run_bulk}
+
+
+async def run_case(scenario, path, concurrency, total, trace_memory, seed):
+    settings = dict(SCENARIOS[scenario])
+    median = settings.pop("latency")
+    rng = random.Random(seed)
+    servers = [
+        MockChatServer(latency=lognormal(median, rng=rng), seed=seed + index, **settings)
+        for index in range(len(PROVIDER_CLASSES))
+    ]
+    for server in servers:
+        await server.start()
+
+    try:
+        async with build_router(servers, total) as router:
+            gc.collect()
+            if trace_memory:
+                tracemalloc.start()
+            start = time.perf_counter()
+            measured = await RUNNERS[path](router, total, concurrency, f"{scenario}-{path}-{concurrency}")
+            elapsed = time.perf_counter() - start
+            traced_peak = None
+            if trace_memory:
+                traced_peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+    finally:
+        for server in servers:
+            await server.stop()
+
+    status_counts = {}
+    for server in servers:
+        for status, count in server.status_counts.items():
+            status_counts[str(status)] = status_counts.get(str(status), 0) + count
+
+    return {
+        "scenario": scenario,
+        "path": path,
+        "concurrency": concurrency,
+        "requests": total,
+        "duration_s": elapsed,
+        "throughput_rps": total / elapsed,
+        **measured,
+        "upstream_status": status_counts,
+        "traced_peak_bytes": traced_peak,
+        "max_rss_bytes": max_rss_bytes(),
+    }
+
+
+def case_key(result):
+    return result["scenario"], result["path"], result["concurrency"]
+
+
+def compare(results, previous_path):
+    """Print throughput and p99 changes against an earlier results file"""
+    with open(previous_path) as f:
+        previous = {case_key(result): result for result in json.load(f)["results"]}
+
+    print(f"\nCompared with {previous_path}:")
+    for result in results:
+        before = previous.get(case_key(result))
+        if before is None:
+            continue
+        change = result["throughput_rps"] / before["throughput_rps"] - 1
+        line = f"  {'/'.join(map(str, case_key(result))):<32} throughput {change:+.1%}"
+        latency, latency_before = result.get("latency_ms"), before.get("latency_ms")
+        if latency and latency_before:
+            line += f", p99 {latency['p99'] / latency_before['p99'] - 1:+.1%}"
+        print(line)
+
+
+def print_result(result):
+    latency = result.get("latency_ms") or result.get("completion_ms") or {}
+    errors = sum(result["errors"].values())
+    print(
+        f"{result['scenario']:<13} {result['path']:<9} c={result['concurrency']:<5} "
+        f"{result['throughput_rps']:>8.1f} req/s  p50 {latency.get('p50', 0):7.1f} ms  "
+        f"p99 {latency.get('p99', 0):7.1f} ms  errors {errors}"
+    )
+
+
+async def main(args):
+    results = []
+    for scenario in args.scenario.split(","):
+        for path in args.paths.split(","):
+            for concurrency in (int(c) for c in args.concurrency.split(",")):
+                total = max(args.requests, concurrency)
+                result = await run_case(scenario, path, concurrency, total, args.trace_memory, args.seed)
+                print_result(result)
+                results.append(result)
+
+    report = {
+        "meta": {
+            "timestamp": time.time(),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--scenario", default="clean", help=f"comma-separated, any of {', '.join(SCENARIOS)}")
+    parser.add_argument("--paths", default="generate,stream,bulk")
+    parser.add_argument("--concurrency", default="1,10,100,1000")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per case (at least the concurrency)")
+    parser.add_argument("--output", default="loadtest.json")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="report the peak of Python allocations (slows the run down)")
+    parser.add_argument("--compare", help="an earlier results file to compare against")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.getLogger("llm_router").setLevel(logging.ERROR)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    asyncio.run(main(parse_args()))
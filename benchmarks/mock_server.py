@@ -0,0 +1,169 @@
+# benchmarks/mock_server.py
+"""Minimal OpenAI-compatible chat completions server for local benchmarks.
+
+Speaks just enough HTTP/1.1 (with keep-alive) to answer
+``POST /chat/completions`` so the router can be benchmarked without
+network access or API keys. Latency can be a fixed number of seconds or
+a distribution (see ``lognormal`` and ``uniform``), and a share of the
+requests can be answered with 429s or 5xx errors.
+"""
+import asyncio
+import json
+import math
+import random
+
+
+def uniform(low, high, rng=random):
+    """Latency distribution: uniformly between ``low`` and ``high`` seconds"""
+    return lambda: rng.uniform(low, high)
+
+
+def lognormal(median, sigma=0.5, rng=random):
+    """Latency distribution with a long tail, as seen from real LLM APIs"""
+    mu = math.log(median)
+    return lambda: rng.lognormvariate(mu, sigma)
+
+
+class MockChatServer:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, stream_chunks=8, stream_interval=0.0,
+                 rate_limit_rate=0.0, server_error_rate=0.0, retry_after=1, seed=None):
+        self.host = host
+        self.port = port
+        self.latency = latency  # seconds, or a callable returning seconds
+        self.stream_chunks = stream_chunks
+        self.stream_interval = stream_interval
+        self.rate_limit_rate = rate_limit_rate  # share of requests answered with 429
+        self.server_error_rate = server_error_rate  # share of requests answered with 503
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.request_count = 0
+        self.connection_count = 0
+        self.status_counts = {}
+        self._server = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    async def _handle_connection(self, reader, writer):
+        self.connection_count += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                # Read headers
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                body = await reader.readexactly(length) if length else b""
+
+                request = json.loads(body or b"{}")
+                status, payload = await self.handle_request(request_line.decode("latin-1"), request)
+                self.status_counts[status] = self.status_counts.get(status, 0) + 1
+                if status == 200 and request.get("stream"):
+                    await self._write_stream(writer, request)
+                else:
+                    await self._write_json(writer, status, payload)
+
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def _write_json(self, writer, status, payload):
+        data = json.dumps(payload).encode()
+        extra = f"Retry-After: {self.retry_after}\r\n" if status == 429 else ""
+        writer.write(
+            f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"{extra}"
+            f"Connection: keep-alive\r\n\r\n".encode() + data
+        )
+        await writer.drain()
+
+    async def _write_stream(self, writer, request):
+        """Send the completion as chunked server-sent events"""
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Transfer-Encoding: chunked\r\n"
+            b"Connection: keep-alive\r\n\r\n"
+        )
+
+        events = []
+        for index in range(self.stream_chunks):
+            events.append({
+                "object": "chat.completion.chunk",
+                "model": request.get("model"),
+                "choices": [{"index": 0, "delta": {"content": f"tok{index} "}, "finish_reason": None}],
+            })
+        events.append({
+            "object": "chat.completion.chunk",
+            "model": request.get("model"),
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 8, "completion_tokens": self.stream_chunks,
+                      "total_tokens": 8 + self.stream_chunks},
+        })
+
+        for index, event in enumerate([json.dumps(e) for e in events] + ["[DONE]"]):
+            if index and self.stream_interval:
+                await asyncio.sleep(self.stream_interval)
+            data = f"data: {event}\n\n".encode()
+            writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            await writer.drain()
+
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def handle_request(self, request_line, request):
+        """Return ``(status, payload)`` for a single request"""
+        self.request_count += 1
+        latency = self.latency() if callable(self.latency) else self.latency
+        if latency:
+            await asyncio.sleep(latency)
+
+        roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            return 429, {"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}}
+        if roll < self.rate_limit_rate + self.server_error_rate:
+            return 503, {"error": {"message": "Service unavailable", "type": "server_error"}}
+
+        return 200, {
+            "id": f"mock-{self.request_count}",
+            "object": "chat.completion",
+            "model": request.get("model"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "Hello from the mock server"},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 8, "completion_tokens": 6, "total_tokens": 14},
+        }
@@ -0,0 +1,292 @@
+# benchmarks/replay.py
+"""Replay a traffic capture through the router against mocked providers.
+
+Reads a TrafficCapture file, rebuilds the providers from its latest
+config record (or the providers of a simulation scenario) and sends every
+captured request through a fresh LLMRouter at its original arrival time,
+on the virtual clock of ``benchmarks.simulate``. Each mocked provider
+answers an attempt the way the captured attempt went: same latency and
+status code, timeout or network error. Attempts the capture has no
+answer for, because the router now routes differently, succeed after a
+latency sampled from the provider's captured successes.
+
+The report compares the replay with the capture: outcomes, latency
+percentiles, fallback hops and how often the same provider served a
+request. Use it to reproduce an incident, or to check what a routing
+change would have done to real traffic.
+
+Usage:
+    python -m benchmarks.replay capture.jsonl [--start TS] [--end TS] [--prefer latency]
+        [--scenario scenario.json] [--output replay.json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import deque
+
+import httpx
+
+from benchmarks.loadtest import summarize
+from benchmarks.simulate import PROMPT_HEADER, build_prompt, run_virtual
+from src.providers.base import OpenAICompatibleProvider
+from src.router import LLMRouter
+from src.utils.capture import TrafficCapture
+
+# Latency of attempts the capture has no answer for, when the provider has no captured successes
+DEFAULT_LATENCY = 1.0
+
+# Options that only make sense against the original process
+SKIPPED_OPTIONS = ("cache",)
+
+
+def load_capture(path, start=None, end=None):
+    """Return (latest config record, request records) of a capture, in arrival order"""
+    config = None
+    requests = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if start is not None and record["timestamp"] < start:
+                if record.get("type") == "config":
+                    config = record
+                continue
+            if end is not None and record["timestamp"] >= end:
+                continue
+            if record.get("type") == "config":
+                config = record
+            elif record.get("type") == "request":
+                requests.append(record)
+    requests.sort(key=lambda record: record["timestamp"])
+    return config, requests
+
+
+class ReplayUpstream:
+    """A provider's API that answers with the captured attempts"""
+
+    def __init__(self, name, rng):
+        self.name = name
+        self.rng = rng
+        self.answers = {}  # (request index, model): captured attempts, in order
+        self.latencies = []  # latencies of captured successes
+        self.replayed = 0
+        self.unrecorded = 0
+
+    def add(self, index, attempt):
+        self.answers.setdefault((index, attempt["model"]), deque()).append(attempt)
+        if attempt.get("outcome") == "success":
+            self.latencies.append(attempt["latency"])
+
+    def transport(self):
+        return httpx.MockTransport(self.handle)
+
+    async def handle(self, request):
+        payload = json.loads(request.content)
+        index = int(PROMPT_HEADER.match(payload["messages"][-1]["content"]).group(1))
+        answers = self.answers.get((index, payload["model"]))
+        attempt = answers.popleft() if answers else None
+
+        if attempt is None or attempt.get("outcome") == "cancelled":
+            # Not captured (or a hedge that lost the race), so answer like a typical success
+            self.unrecorded += 1
+            latency = self.rng.choice(self.latencies) if self.latencies else DEFAULT_LATENCY
+            if attempt is not None:
+                latency = max(latency, attempt["latency"])
+            attempt = {"outcome": "success", "latency": latency}
+        else:
+            self.replayed += 1
+
+        await asyncio.sleep(attempt["latency"])
+        outcome = attempt["outcome"]
+        if outcome == "timeout":
+            raise httpx.ReadTimeout("captured timeout", request=request)
+        if outcome == "rate_limited":
+            return httpx.Response(429, json={"error": {"message": "rate limited", "type": "rate_limit_exceeded"}})
+        if outcome == "error":
+            if attempt.get("status") is None:
+                raise httpx.ConnectError("captured network error", request=request)
+            return httpx.Response(attempt["status"], json={"error": {"message": "captured error", "type": "error"}})
+
+        usage = {"total_tokens": attempt.get("tokens", 0)}
+        if payload.get("stream"):
+            event = {"model": payload["model"], "choices": [{"index": 0, "delta": {"content": "replayed"},
+                                                             "finish_reason": "stop"}], "usage": usage}
+            return httpx.Response(200, headers={"Content-Type": "text/event-stream"},
+                                  content=f"data: {json.dumps(event)}\n\ndata: [DONE]\n\n".encode())
+        return httpx.Response(200, json={
+            "model": payload["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "replayed"}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+
+class _ReplayRecorder(TrafficCapture):
+    """Keeps the replay's own capture records in memory, keyed by the captured request"""
+
+    def __init__(self, clock):
+        super().__init__(path=None, clock=clock)
+        self.records = {}
+
+    def request_started(self, model_name, prompt, options, stream):
+        record = super().request_started(model_name, prompt, options, stream)
+        record["replay_of"] = int(PROMPT_HEADER.match(prompt).group(1))
+        return record
+
+    def _append(self, record):
+        if record.get("type") == "request":
+            self.records[record["replay_of"]] = record
+
+
+def served_by(record):
+    """The (provider, model) of the attempt that answered a request, or None"""
+    for attempt in record.get("attempts", ()):
+        if attempt.get("outcome") == "success":
+            return attempt["provider"], attempt["model"]
+    return None
+
+
+def first_choice(record):
+    attempts = record.get("attempts")
+    return (attempts[0]["provider"], attempts[0]["model"]) if attempts else None
+
+
+def outcome_summary(records):
+    outcomes = {}
+    for record in records:
+        outcomes[record.get("outcome")] = outcomes.get(record.get("outcome"), 0) + 1
+    served = [record["latency"] for record in records if record.get("outcome") == "success"]
+    return {
+        "outcomes": outcomes,
+        "success_rate": len(served) / len(records) if records else None,
+        "latency_ms": summarize(served),
+        "fallback_hops_mean": sum(record.get("fallbacks", 0) for record in records) / max(len(records), 1),
+    }
+
+
+async def replay(providers_config, captured, options=None, seed=0):
+    """Send captured requests through a fresh router; returns the replay's records by index"""
+    clock = asyncio.get_running_loop().time
+    rng = random.Random(seed)
+    upstreams = {name: ReplayUpstream(name, rng) for name in providers_config}
+    for index, record in enumerate(captured):
+        for attempt in record.get("attempts", ()):
+            if attempt["provider"] in upstreams and "outcome" in attempt:
+                upstreams[attempt["provider"]].add(index, attempt)
+
+    providers = []
+    for name, spec in providers_config.items():
+        keys = [f"replay-{i}" for i in range(spec.get("keys", 1))]
+        provider = OpenAICompatibleProvider(name, {
+            "base_url": f"http://{name}.replayed",
+            "models": spec["models"],
+            "rate_limits": spec.get("rate_limits", {}),
+        }, api_key=keys)
+        provider.transport = upstreams[name].transport()
+        providers.append(provider)
+
+    recorder = _ReplayRecorder(clock)
+    router = LLMRouter(providers=providers, hooks=recorder, clock=clock)
+    start = clock()
+    first = captured[0]["timestamp"] if captured else 0.0
+
+    async def one(index, record):
+        await asyncio.sleep(max(start + record["timestamp"] - first - clock(), 0))
+        request_options = {k: v for k, v in record.get("options", {}).items() if k not in SKIPPED_OPTIONS}
+        request_options.update(options or {})
+        prompt = build_prompt(index, {
+            "prompt_tokens": record.get("prompt_tokens", 100),
+            "completion_tokens": record.get("completion_tokens", 100),
+        })
+        if record.get("stream"):
+            async for _ in router.generate_stream(prompt, record.get("model"), request_options):
+                pass
+        else:
+            await router.generate(prompt, record.get("model"), request_options)
+
+    async with router:
+        await asyncio.gather(*(one(index, record) for index, record in enumerate(captured)))
+    return recorder.records, upstreams
+
+
+def compare(captured, replayed, upstreams):
+    """Summarize the capture and the replay side by side"""
+    pairs = [(record, replayed[index]) for index, record in enumerate(captured) if index in replayed]
+    diverged = []
+    for index, (before, after) in enumerate(pairs):
+        if served_by(before) != served_by(after) or before.get("outcome") != after.get("outcome"):
+            diverged.append({
+                "id": before.get("id"),
+                "captured": [f"{a['provider']}/{a['model']}:{a.get('outcome')}" for a in before.get("attempts", ())],
+                "replayed": [f"{a['provider']}/{a['model']}:{a.get('outcome')}" for a in after.get("attempts", ())],
+            })
+    return {
+        "requests": len(pairs),
+        "captured": outcome_summary([before for before, _ in pairs]),
+        "replayed": outcome_summary([after for _, after in pairs]),
+        "same_first_choice": sum(first_choice(b) == first_choice(a) for b, a in pairs) / max(len(pairs), 1),
+        "same_provider": sum(served_by(b) == served_by(a) for b, a in pairs) / max(len(pairs), 1),
+        "attempts": {
+            name: {"replayed": upstream.replayed, "unrecorded": upstream.unrecorded}
+            for name, upstream in upstreams.items()
+        },
+        "diverged": diverged[:50],
+    }
+
+
+def print_report(report):
+    print(f"{report['requests']} requests, same first choice {report['same_first_choice']:.1%}, "
+          f"same provider {report['same_provider']:.1%}")
+    for side in ("captured", "replayed"):
+        summary = report[side]
+        latency = summary["latency_ms"] or {}
+        print(f"  {side:<9} success {summary['success_rate'] or 0:6.1%}  p50 {latency.get('p50', 0):8.1f} ms  "
+              f"p99 {latency.get('p99', 0):8.1f} ms  hops {summary['fallback_hops_mean']:.2f}  {summary['outcomes']}")
+    for name, counts in report["attempts"].items():
+        print(f"  {name:<12} replayed {counts['replayed']:<6} unrecorded {counts['unrecorded']}")
+
+
+def main(args):
+    config, captured = load_capture(args.capture, args.start, args.end)
+    # Cached answers never reached a provider, so there is nothing to replay
+    captured = [record for record in captured if record.get("outcome") not in ("cached", None)]
+
+    if args.scenario:
+        with open(args.scenario) as f:
+            providers_config = json.load(f)["providers"]
+    elif config is not None:
+        providers_config = config["providers"]
+    else:
+        raise SystemExit("The capture has no config record (see TrafficCapture.record_config), pass --scenario")
+
+    options = {"prefer": args.prefer} if args.prefer else None
+    wall_start = time.perf_counter()
+    replayed, upstreams = run_virtual(replay(providers_config, captured, options, args.seed))
+    report = compare(captured, replayed, upstreams)
+    report["wall_time_s"] = time.perf_counter() - wall_start
+    print_report(report)
+
+    with open(args.output, "w") as f:
+        json.dump({"meta": {"args": vars(args)}, "report": report}, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("capture", help="JSONL file written by TrafficCapture")
+    parser.add_argument("--start", type=float, help="replay requests from this Unix timestamp on")
+    parser.add_argument("--end", type=float, help="replay requests before this Unix timestamp")
+    parser.add_argument("--prefer", help="override the captured quality/latency trade-off")
+    parser.add_argument("--scenario", help="simulation scenario whose providers replace the captured config")
+    parser.add_argument("--output", default="replay.json")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.getLogger("llm_router").setLevel(logging.ERROR)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    main(parse_args())
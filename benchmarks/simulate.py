@@ -0,0 +1,455 @@
+# benchmarks/simulate.py
+"""Discrete-event simulation of the router against simulated providers.
+
+Runs the real LLMRouter and provider code on a virtual clock: sleeps,
+timeouts, rate limit windows, circuit cooldowns and latency statistics
+all use simulated time, so hours of traffic replay in seconds. Only the
+network is simulated. Each provider's API is an httpx transport that
+enforces its own RPM/TPM quotas, waits a sampled latency and fails a
+share of requests.
+
+The workload is either synthetic (Poisson arrivals) or a recorded trace,
+a JSONL file with one request per line::
+
+    {"t": 12.5, "model": "llama3-70b-8192", "prompt_tokens": 300, "completion_tokens": 150, "stream": false}
+
+Every policy in the scenario replays the same workload and is scored by
+success rate, latency percentiles, fallback hops and quota utilisation.
+
+Usage:
+    python -m benchmarks.simulate [--scenario scenario.json] [--trace trace.jsonl]
+        [--policies quality,latency] [--duration 3600] [--rate 2] [--output simulation.json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import random
+import re
+import selectors
+import time
+
+import httpx
+
+from benchmarks.loadtest import summarize
+from benchmarks.mock_server import lognormal, uniform
+from src.providers.base import OpenAICompatibleProvider
+from src.router import LLMRouter
+from src.utils.admission import AdmissionQueue
+from src.utils.metrics import MetricsRecorder
+from src.utils.rate_limiter import RateLimitTracker
+from src.utils.scoring import DefaultScoringPolicy
+from src.utils.tokens import MESSAGE_OVERHEAD_TOKENS, estimate_tokens
+
+# Providers, workload and policies used when no scenario file is given
+DEFAULT_SCENARIO = {
+    "providers": {
+        "groq": {
+            "models": {"llama3-70b-8192": 7, "llama3-8b-8192": 5},
+            "rate_limits": {"requests_per_minute": 30, "tokens_per_minute": 12000},
+            "latency": {"lognormal": 0.3, "sigma": 0.4},
+            "tokens_per_second": 300,
+            "failure_rate": 0.02,
+        },
+        "perplexity": {
+            "models": {"llama3-70b-8192": 6},
+            "rate_limits": {"requests_per_minute": 50},
+            "latency": {"lognormal": 1.0, "sigma": 0.6},
+            "tokens_per_second": 80,
+            "failure_rate": 0.01,
+        },
+        "openrouter": {
+            "models": {"llama3-70b-8192": 6, "llama3-8b-8192": 4},
+            "rate_limits": {"requests_per_minute": 200},
+            "latency": {"lognormal": 1.5, "sigma": 0.8},
+            "tokens_per_second": 60,
+            "failure_rate": 0.05,
+            "outages": [[600, 900]],
+        },
+    },
+    "workload": {
+        "duration": 1800,
+        "rate": 1.5,
+        "models": {"llama3-70b-8192": 0.8, "llama3-8b-8192": 0.2},
+        "prompt_tokens": {"lognormal": 300, "sigma": 0.8},
+        "completion_tokens": {"lognormal": 150, "sigma": 0.6},
+        "max_tokens": 1024,
+        "stream_share": 0.2,
+    },
+    "policies": {
+        "quality": {"options": {"prefer": "quality"}},
+        "balanced": {"options": {"prefer": "balanced"}},
+        "latency": {"options": {"prefer": "latency"}},
+        "lenient_health": {"options": {"prefer": "quality"}, "scoring": {"error_penalty": 0.5}},
+        "queued": {"options": {"prefer": "quality"}, "admission_queue": {"max_wait": 30}},
+    },
+}
+
+# The synthetic prompt tells the simulated provider how long the completion is
+PROMPT_HEADER = re.compile(r"^#(\d+) (\d+)\n")
+
+# Time a simulated provider takes to answer with a 429 or 503
+ERROR_LATENCY = 0.05
+
+
+class _VirtualSelector(selectors.DefaultSelector):
+    """Selector that jumps the loop's clock forward instead of blocking"""
+
+    def __init__(self, loop):
+        super().__init__()
+        self.loop = loop
+
+    def select(self, timeout=None):
+        if timeout is not None and timeout > 0:
+            # Nothing is ready before the next timer, so skip straight to it
+            self.loop.advance(timeout)
+            timeout = 0
+        return super().select(timeout)
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    """Event loop on a virtual clock that jumps to the next scheduled callback
+
+    ``asyncio.sleep``, ``wait_for`` and ``call_later`` all run on virtual
+    time, so a run takes only as long as the CPU work it causes. Pass
+    ``loop.time`` as the clock of the router and its components.
+    """
+
+    def __init__(self, start=0.0):
+        self._virtual_time = start
+        super().__init__(_VirtualSelector(self))
+
+    def time(self):
+        return self._virtual_time
+
+    def advance(self, seconds):
+        self._virtual_time += seconds
+
+
+def run_virtual(coro, start=0.0):
+    """Run a coroutine to completion on a fresh VirtualTimeLoop"""
+    loop = VirtualTimeLoop(start)
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+
+
+def distribution(spec, rng):
+    """Build a sampler from a number, ``{"lognormal": median, "sigma": s}``,
+    ``{"uniform": [low, high]}`` or recorded ``{"samples": [...]}``"""
+    if isinstance(spec, (int, float)):
+        return lambda: spec
+    if "lognormal" in spec:
+        return lognormal(spec["lognormal"], spec.get("sigma", 0.5), rng=rng)
+    if "uniform" in spec:
+        return uniform(*spec["uniform"], rng=rng)
+    if "samples" in spec:
+        samples = list(spec["samples"])
+        return lambda: rng.choice(samples)
+    raise ValueError(f"Unknown distribution {spec}")
+
+
+class SimulatedUpstream:
+    """One provider's chat completions API on the virtual clock
+
+    Serves requests through an httpx transport. Requests beyond the
+    provider's own RPM/TPM quotas get a 429 with Retry-After, a share of
+    requests (and all requests during an outage) get a 503, and the rest
+    succeed after the sampled latency plus the time to generate the
+    completion at ``tokens_per_second``.
+    """
+
+    def __init__(self, name, spec, clock, rng):
+        self.name = name
+        self.clock = clock
+        self.rng = rng
+        # The quotas the provider enforces, which may differ from what the router is told
+        self.limits = spec.get("upstream_limits", spec.get("rate_limits", {}))
+        self.latency = distribution(spec.get("latency", 0.5), rng)
+        self.tokens_per_second = spec.get("tokens_per_second")
+        self.failure_rate = spec.get("failure_rate", 0.0)
+        self.outages = spec.get("outages", [])
+        self.stream_chunks = spec.get("stream_chunks", 8)
+        self.quota = RateLimitTracker(clock=clock)
+
+        self.status_counts = {}
+        self.tokens = 0
+        self.served = []  # (timestamp, tokens) of every request served
+
+    def transport(self):
+        return httpx.MockTransport(self.handle)
+
+    async def handle(self, request):
+        payload = json.loads(request.content)
+        prompt_tokens, completion_tokens = self._measure(payload)
+        total_tokens = prompt_tokens + completion_tokens
+        now = self.clock()
+
+        if any(start <= now < end for start, end in self.outages) or self.rng.random() < self.failure_rate:
+            return await self._error(503, "server_error")
+        if not self.quota.try_acquire(self.name, self.limits, total_tokens):
+            wait = self.quota.time_until_available(self.name, self.limits, total_tokens)
+            return await self._error(429, "rate_limit_exceeded", {"Retry-After": str(max(math.ceil(wait), 1))})
+
+        self._count(200)
+        self.tokens += total_tokens
+        self.served.append((now, total_tokens))
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": total_tokens}
+        first_token = self.latency()
+        generation = completion_tokens / self.tokens_per_second if self.tokens_per_second else 0.0
+
+        if payload.get("stream"):
+            return httpx.Response(200, headers={"Content-Type": "text/event-stream"},
+                                  content=self._stream(payload["model"], usage, first_token, generation))
+
+        await asyncio.sleep(first_token + generation)
+        return httpx.Response(200, json={
+            "object": "chat.completion",
+            "model": payload["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "simulated"}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    def _measure(self, payload):
+        """Return (prompt tokens, completion tokens) of a request"""
+        messages = payload["messages"]
+        prompt_tokens = sum(estimate_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+        match = PROMPT_HEADER.match(messages[-1]["content"])
+        completion_tokens = int(match.group(2)) if match else 100
+        return prompt_tokens, min(completion_tokens, payload.get("max_tokens", 1024))
+
+    def _count(self, status):
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+    async def _error(self, status, kind, headers=None):
+        self._count(status)
+        await asyncio.sleep(ERROR_LATENCY)
+        return httpx.Response(status, headers=headers, json={"error": {"message": kind, "type": kind}})
+
+    async def _stream(self, model, usage, first_token, generation):
+        await asyncio.sleep(first_token)
+        interval = generation / self.stream_chunks
+        for index in range(self.stream_chunks):
+            if index and interval:
+                await asyncio.sleep(interval)
+            event = {"model": model, "choices": [{"index": 0, "delta": {"content": f"tok{index} "}}]}
+            yield f"data: {json.dumps(event)}\n\n".encode()
+        event = {"model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage}
+        yield f"data: {json.dumps(event)}\n\ndata: [DONE]\n\n".encode()
+
+
+def generate_workload(spec, rng):
+    """Poisson arrivals at ``rate`` requests per second over ``duration`` seconds"""
+    models = list(spec["models"].items())
+    prompt_tokens = distribution(spec.get("prompt_tokens", 300), rng)
+    completion_tokens = distribution(spec.get("completion_tokens", 150), rng)
+
+    requests = []
+    t = rng.expovariate(spec["rate"])
+    while t < spec["duration"]:
+        requests.append({
+            "t": t,
+            "model": rng.choices([m for m, _ in models], [w for _, w in models])[0],
+            "prompt_tokens": max(int(prompt_tokens()), 1),
+            "completion_tokens": max(int(completion_tokens()), 1),
+            "max_tokens": spec.get("max_tokens", 1024),
+            "stream": rng.random() < spec.get("stream_share", 0.0),
+        })
+        t += rng.expovariate(spec["rate"])
+    return requests
+
+
+def load_trace(path):
+    """Read a recorded workload; ``t`` (or ``timestamp``) is made relative to the first request
+
+    TrafficCapture files work as traces too; their config records are skipped.
+    """
+    requests = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                if record.get("type", "request") == "request":
+                    requests.append(record)
+    for request in requests:
+        request.setdefault("t", request.get("timestamp", 0.0))
+    requests.sort(key=lambda request: request["t"])
+    start = requests[0]["t"] if requests else 0.0
+    for request in requests:
+        request["t"] -= start
+    return requests
+
+
+def build_prompt(index, request):
+    """A prompt of about ``prompt_tokens`` tokens that tells the provider the completion length"""
+    header = f"#{index} {request.get('completion_tokens', 100)}\n"
+    return header + "x" * max(request.get("prompt_tokens", 100) * 4 - len(header), 0)
+
+
+async def simulate(scenario, policy, requests, seed=0):
+    """Replay ``requests`` through a router configured by ``policy``; returns the report"""
+    clock = asyncio.get_running_loop().time
+    upstreams = {}
+    providers = []
+    for name, spec in scenario["providers"].items():
+        upstream = upstreams[name] = SimulatedUpstream(name, spec, clock, random.Random(f"{seed}:{name}"))
+        provider = OpenAICompatibleProvider(name, {
+            "base_url": f"http://{name}.simulated",
+            "models": spec["models"],
+            "rate_limits": spec.get("rate_limits", {}),
+        }, api_key=spec.get("api_keys", "simulated"))
+        provider.transport = upstream.transport()
+        providers.append(provider)
+
+    queue = None
+    if "admission_queue" in policy:
+        queue = AdmissionQueue(clock=clock, **policy["admission_queue"])
+    metrics = MetricsRecorder()
+    router = LLMRouter(
+        providers=providers,
+        scoring_policy=DefaultScoringPolicy(**policy.get("scoring", {})),
+        circuit_breaker_options=policy.get("circuit_breaker"),
+        concurrency_limit_options=policy.get("concurrency"),
+        admission_queue=queue,
+        hooks=metrics,
+        clock=clock,
+    )
+
+    latencies = []
+    first_chunk = []
+    errors = {}
+    start = clock()
+
+    async def one(index, request):
+        await asyncio.sleep(max(start + request["t"] - clock(), 0))
+        options = {**policy.get("options", {}), "max_tokens": request.get("max_tokens", 1024)}
+        prompt = build_prompt(index, request)
+        sent = clock()
+        if request.get("stream"):
+            result = None
+            async for chunk in router.generate_stream(prompt, request.get("model"), options):
+                if result is None and "error" not in chunk:
+                    first_chunk.append(clock() - sent)
+                if result is None or "error" in chunk:
+                    result = chunk
+        else:
+            result = await router.generate(prompt, request.get("model"), options)
+        if "error" in result:
+            kind = result["error"].split(":")[0][:60]
+            errors[kind] = errors.get(kind, 0) + 1
+        else:
+            latencies.append(clock() - sent)
+
+    wall_start = time.perf_counter()
+    async with router:
+        await asyncio.gather(*(one(index, request) for index, request in enumerate(requests)))
+    duration = clock() - start
+
+    snapshot = metrics.snapshot()
+    return {
+        "requests": len(requests),
+        "success_rate": len(latencies) / len(requests) if requests else None,
+        "latency_ms": summarize(latencies),
+        "first_chunk_ms": summarize(first_chunk),
+        "errors": errors,
+        "fallback_hops_mean": snapshot["fallbacks"]["sum"] / max(snapshot["fallbacks"]["count"], 1),
+        "attempts": {f"{a['provider']}/{a['model']}/{a['outcome']}": a["count"] for a in snapshot["attempts"]},
+        "providers": {
+            name: quota_report(upstream, scenario["providers"][name])
+            for name, upstream in upstreams.items()
+        },
+        "virtual_duration_s": duration,
+        "wall_time_s": time.perf_counter() - wall_start,
+    }
+
+
+def peak_per_minute(served):
+    """Most requests and tokens served in any sliding 60s window, the span quotas are enforced over"""
+    peak_requests = peak_tokens = tokens = start = 0
+    for end, (timestamp, count) in enumerate(served):
+        tokens += count
+        while served[start][0] <= timestamp - 60:
+            tokens -= served[start][1]
+            start += 1
+        peak_requests = max(peak_requests, end - start + 1)
+        peak_tokens = max(peak_tokens, tokens)
+    return peak_requests, peak_tokens
+
+
+def quota_report(upstream, spec):
+    """Requests and tokens a provider served, and the peak share of its quota they used"""
+    limits = spec.get("upstream_limits", spec.get("rate_limits", {}))
+    peak_requests, peak_tokens = peak_per_minute(upstream.served)
+    report = {
+        "served": upstream.status_counts.get(200, 0),
+        "tokens": upstream.tokens,
+        "status": {str(status): count for status, count in sorted(upstream.status_counts.items())},
+    }
+    if limits.get("requests_per_minute"):
+        report["rpm_utilisation"] = peak_requests / limits["requests_per_minute"]
+    if limits.get("tokens_per_minute"):
+        report["tpm_utilisation"] = peak_tokens / limits["tokens_per_minute"]
+    return report
+
+
+def print_report(name, report):
+    latency = report["latency_ms"] or {}
+    print(
+        f"{name:<16} success {report['success_rate']:6.1%}  p50 {latency.get('p50', 0):8.1f} ms  "
+        f"p99 {latency.get('p99', 0):8.1f} ms  hops {report['fallback_hops_mean']:.2f}  "
+        f"({report['wall_time_s']:.1f}s wall for {report['virtual_duration_s']:.0f}s simulated)"
+    )
+    for provider, usage in report["providers"].items():
+        utilisation = ", ".join(
+            f"{limit} {usage[limit]:.0%}" for limit in ("rpm_utilisation", "tpm_utilisation") if limit in usage
+        )
+        print(f"    {provider:<12} served {usage['served']:<6} status {usage['status']}  {utilisation}")
+
+
+def main(args):
+    scenario = DEFAULT_SCENARIO
+    if args.scenario:
+        with open(args.scenario) as f:
+            scenario = {**DEFAULT_SCENARIO, **json.load(f)}
+    workload = dict(scenario["workload"])
+    if args.duration is not None:
+        workload["duration"] = args.duration
+    if args.rate is not None:
+        workload["rate"] = args.rate
+
+    if args.trace:
+        requests = load_trace(args.trace)
+    else:
+        requests = generate_workload(workload, random.Random(args.seed))
+
+    policies = scenario["policies"]
+    names = args.policies.split(",") if args.policies else list(policies)
+    results = {}
+    for name in names:
+        results[name] = run_virtual(simulate(scenario, policies[name], requests, args.seed))
+        print_report(name, results[name])
+
+    with open(args.output, "w") as f:
+        json.dump({"meta": {"args": vars(args), "scenario": scenario}, "results": results}, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--scenario", help="JSON file with providers, workload and policies (default: built in)")
+    parser.add_argument("--trace", help="JSONL workload trace to replay instead of synthetic traffic")
+    parser.add_argument("--policies", help="comma-separated policy names (default: all)")
+    parser.add_argument("--duration", type=float, help="simulated seconds of synthetic traffic")
+    parser.add_argument("--rate", type=float, help="synthetic requests per second")
+    parser.add_argument("--output", default="simulation.json")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.getLogger("llm_router").setLevel(logging.ERROR)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    main(parse_args())
@@ -11,6 +11,10 @@ setup(
         "python-dotenv>=1.0.0",
         "aiohttp>=3.8.0",
     ],
+    extras_require={
+        "http2": ["httpx[http2]>=0.24.0"],
+        "semantic": ["numpy>=1.20"],
+    },
     author="Your Name",
     author_email="your.email@example.com",
     description="A library that routes requests to free LLM API providers",
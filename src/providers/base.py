@@ -1,26 +1,524 @@
+import asyncio
+import json
+import logging
+import re
+import time
+from email.utils import parsedate_to_datetime
+
+from ..utils.lazy import LazyModule
+from ..utils.negative_cache import classify_failure, parse_error_body
+from ..utils.rate_limiter import RateLimitTracker
+from .key_pool import KeyPool, LEAST_LOADED
+from ..utils.tokens import estimate_request_tokens, estimate_tokens, usage_total_tokens
+
+logger = logging.getLogger("llm_router")
+
+# Imported when the first connection pool is created, not when the router is built
+httpx = LazyModule("httpx")
+
+# Connection pool defaults, overridable per provider via the "http" config section
+DEFAULT_HTTP_CONFIG = {
+    "max_connections": 100,
+    "max_keepalive_connections": 20,
+    "keepalive_expiry": 30.0,
+    "http2": False,
+}
+
 class LLMProvider:
     def __init__(self, provider_name, config, api_key=None):
         self.name = provider_name
         self.config = config
-        self.api_key = api_key
+        
+        # One key or a list of keys, each with its own rate limit window and health
+        self.key_pool = KeyPool(provider_name, api_key, config.get("key_selection", LEAST_LOADED))
+        self.api_key = self.key_pool.keys[0].api_key
         
         # Extract configuration
         self.base_url = config.get("base_url", "")
         self.rate_limits = config.get("rate_limits", {})
         self.available_models = config.get("models", {})
+        self.http_config = {**DEFAULT_HTTP_CONFIG, **(config.get("http") or {})}
+        
+        # Rate limit state; the router replaces this with a tracker shared by all providers
+        self.rate_limiter = RateLimitTracker()
+        
+        # Pooled HTTP client, created on first use and reused across requests.
+        # An httpx transport can be injected (e.g. a mock) before the pool opens.
+        self.transport = None
+        self._client = None
         
     async def generate(self, prompt, model_name, options=None):
         """Generate a response using the specified model"""
         raise NotImplementedError
         
+    async def generate_stream(self, prompt, model_name, options=None):
+        """Stream a response; providers without native streaming yield a single chunk"""
+        yield await self.generate(prompt, model_name, options)
+        
+    def update_config(self, config):
+        """Take over a changed config section, keeping keys, connection pool and rate limit state
+        
+        Models are left to the router, which also updates its model map.
+        Changed ``http`` settings apply the next time the pool is opened.
+        Returns the names of the sections that changed.
+        """
+        changed = sorted(name for name in set(config) | set(self.config) if config.get(name) != self.config.get(name))
+        self.config = config
+        self.base_url = config.get("base_url", "")
+        self.rate_limits = config.get("rate_limits", {})
+        self.http_config = {**DEFAULT_HTTP_CONFIG, **(config.get("http") or {})}
+        self.key_pool.strategy = config.get("key_selection", LEAST_LOADED)
+        return changed
+    
+    async def list_models(self):
+        """Return the ids of the models the provider currently serves, or None if it can't tell"""
+        return None
+        
     def get_rate_limit_info(self):
         """Return rate limit information for this provider"""
         return self.rate_limits
         
-    def check_availability(self):
-        """Check if this provider is currently available"""
+    def check_availability(self, tokens=0):
+        """Check if this provider is currently available for a request of ~tokens"""
         raise NotImplementedError
         
     def supports_model(self, model_name):
         """Check if this provider supports the specified model"""
-        return model_name in self.available_models
\ No newline at end of file
+        return model_name in self.available_models
+    
+    def remaining_requests(self):
+        """Free request slots across usable keys in the current window (None if unlimited)"""
+        limit_info = self.get_rate_limit_info()
+        total = 0
+        for key in self.key_pool.usable():
+            remaining = self.rate_limiter.remaining(key.rate_limit_name, limit_info)
+            if remaining is None:
+                return None
+            total += remaining
+        return total
+    
+    def time_until_available(self, tokens=0):
+        """Seconds until some key can take a request of ~tokens (inf if all are revoked)"""
+        limit_info = self.get_rate_limit_info()
+        best = float('inf')
+        for key in self.key_pool.keys:
+            wait = max(
+                self.key_pool.retry_in(key),
+                self.rate_limiter.time_until_available(key.rate_limit_name, limit_info, tokens)
+            )
+            best = min(best, wait)
+        return best
+    
+    def _acquire_key(self, tokens=0, exclude=()):
+        """Reserve a rate limit slot on the best usable key
+        
+        Returns (key, reservation), or (None, None) if no key has room. The
+        reservation is passed back to the rate limiter to correct the token
+        estimate.
+        """
+        limit_info = self.get_rate_limit_info()
+        headroom = lambda key: self.rate_limiter.remaining(key.rate_limit_name, limit_info)
+        for key in self.key_pool.candidates(headroom):
+            if key in exclude:
+                continue
+            reservation = self.rate_limiter.try_acquire(key.rate_limit_name, limit_info, tokens)
+            if reservation:
+                key.in_flight += 1
+                return key, reservation
+        return None, None
+    
+    def _key_failed(self, key, error):
+        """Update the key pool after an error result
+        
+        401s revoke the key and 429s take it out of rotation until its
+        cooldown ends. Returns True if the request should be retried with
+        another key of the pool.
+        """
+        status_code = error.get("status_code")
+        if status_code == 401:
+            logger.warning("Removing revoked key %s from the %s pool", key.label, self.name)
+            self.key_pool.revoke(key, error["error"])
+        elif status_code == 429:
+            self.key_pool.throttle(key, error.get("retry_after"), error["error"])
+        else:
+            self.key_pool.record_error(key, error["error"])
+            return False
+        return len(self.key_pool) > 1
+    
+    @property
+    def client(self):
+        """Return the pooled HTTP client, creating it on first use"""
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+        return self._client
+    
+    def _create_client(self):
+        """Create an HTTP client with this provider's connection pool settings"""
+        limits = httpx.Limits(
+            max_connections=self.http_config["max_connections"],
+            max_keepalive_connections=self.http_config["max_keepalive_connections"],
+            keepalive_expiry=self.http_config["keepalive_expiry"],
+        )
+        
+        http2 = bool(self.http_config.get("http2"))
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("HTTP/2 requested for %s but 'h2' is not installed, using HTTP/1.1", self.name)
+                http2 = False
+        
+        return httpx.AsyncClient(limits=limits, http2=http2, transport=self.transport)
+    
+    async def open(self):
+        """Open the connection pool for this provider"""
+        return self.client
+    
+    async def aclose(self):
+        """Close the connection pool and release its connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """Shared implementation for providers exposing an OpenAI-compatible chat API"""
+    
+    default_timeout = 30
+    default_requests_per_minute = 30
+    
+    def get_rate_limit_info(self):
+        """Return rate limit information, falling back to the provider defaults"""
+        return {"requests_per_minute": self.default_requests_per_minute, **self.rate_limits}
+    
+    def _build_payload(self, prompt, model_name, options, stream=False):
+        """Build the chat completions request body"""
+        payload = {
+            "model": model_name,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": options.get("max_tokens", 1024),
+            "temperature": options.get("temperature", 0.7),
+            "stream": stream
+        }
+        
+        # Add system message if provided
+        if "system_message" in options:
+            payload["messages"].insert(0, {
+                "role": "system", 
+                "content": options["system_message"]
+            })
+        
+        return payload
+    
+    def _build_headers(self, options, stream=False, api_key=None):
+        """Build the request headers, authenticating with ``api_key`` (default: the first key)"""
+        return {
+            "Authorization": f"Bearer {api_key if api_key is not None else self.api_key}",
+            "Content-Type": "application/json"
+        }
+    
+    def _status_error(self, status_code, message, headers=None, body=None):
+        """Map an HTTP error status to an error result
+        
+        Failures that will not go away on retry (unknown model, auth, billing)
+        are flagged with a ``permanent`` reason, see ``classify_failure``.
+        """
+        if status_code == 429:
+            # Rate limit exceeded, pass on how long the provider wants us to wait
+            return {
+                "error": "rate_limit_exceeded",
+                "provider": self.name,
+                "status_code": status_code,
+                "retry_after": parse_retry_after(headers or {})
+            }
+        error = {"error": f"API error: {message}", "provider": self.name, "status_code": status_code}
+        permanent = classify_failure(status_code, body)
+        if permanent is not None:
+            # Keep the provider's explanation, it tells ops which config entry is dead
+            detail = parse_error_body(body)[1]
+            if detail:
+                error["error"] = f"API error: {status_code} {detail}"
+            error["permanent"] = permanent
+        return error
+        
+    async def generate(self, prompt, model_name, options=None):
+        if not self.supports_model(model_name):
+            raise ValueError(f"Model {model_name} not supported by {self.name}")
+            
+        options = options or {}
+        payload = self._build_payload(prompt, model_name, options)
+        estimated_tokens = estimate_request_tokens(prompt, options)
+        
+        # A revoked or throttled key hands the request over to the next key of the pool
+        tried = []
+        error = None
+        while True:
+            # Reserve a rate limit slot and token budget, failing fast without a round trip if none is left
+            key, reservation = self._acquire_key(estimated_tokens, tried)
+            if key is None:
+                return error or {"error": "rate_limit_exceeded", "provider": self.name, "throttled_locally": True}
+            tried.append(key)
+            
+            try:
+                result = await self._post(key, reservation, payload, model_name, options, estimated_tokens)
+            finally:
+                key.in_flight -= 1
+            
+            if "error" not in result:
+                self.key_pool.record_success(key)
+                return result
+            if not self._key_failed(key, result):
+                return result
+            error = result
+    
+    async def _post(self, key, reservation, payload, model_name, options, estimated_tokens):
+        """Make one chat completions call with a key whose slot is already reserved"""
+        refund = True  # cleared once the reservation holds the actual usage
+        try:
+            # Make the API call over the provider's pooled connection
+            response = await self.client.post(
+                f"{self.base_url}/chat/completions",
+                json=payload,
+                headers=self._build_headers(options, api_key=key.api_key),
+                timeout=options.get("timeout", self.default_timeout)
+            )
+            response.raise_for_status()
+            data = response.json()
+            
+            # Extract and return the generated text
+            result = {
+                "text": data["choices"][0]["message"]["content"],
+                "provider": self.name,
+                "model": model_name,
+                "usage": data.get("usage", {}),
+                "raw_response": data
+            }
+            self._correct_token_usage(key, reservation, estimated_tokens, data.get("usage"))
+            refund = False
+            return result
+            
+        except httpx.HTTPStatusError as e:
+            return self._status_error(e.response.status_code, str(e), e.response.headers, e.response.text)
+        except httpx.RequestError as e:
+            return self._request_error(e)
+        except asyncio.CancelledError:
+            # The request went out and may still be served, keep its estimate
+            refund = False
+            raise
+        finally:
+            if refund:
+                # Failed requests, unparseable responses included, don't consume tokens; give the reservation back
+                self.rate_limiter.record_tokens(key.rate_limit_name, -estimated_tokens, reservation)
+    
+    async def generate_stream(self, prompt, model_name, options=None):
+        """Stream a response chunk by chunk from the server-sent events API
+        
+        Yields dicts with the incremental ``text`` of each chunk. If the
+        request fails a single ``{"error": ...}`` dict is yielded instead.
+        """
+        if not self.supports_model(model_name):
+            raise ValueError(f"Model {model_name} not supported by {self.name}")
+        
+        options = options or {}
+        payload = self._build_payload(prompt, model_name, options, stream=True)
+        estimated_tokens = estimate_request_tokens(prompt, options)
+        
+        # Before the first chunk, a revoked or throttled key hands over to the next key of the pool
+        tried = []
+        error = None
+        while True:
+            # Reserve a rate limit slot and token budget, failing fast without a round trip if none is left
+            key, reservation = self._acquire_key(estimated_tokens, tried)
+            if key is None:
+                yield error or {"error": "rate_limit_exceeded", "provider": self.name, "throttled_locally": True}
+                return
+            tried.append(key)
+            
+            streamed_tokens = 0
+            responded = False
+            settled = False  # whether the reservation holds the final token count
+            try:
+                async with self.client.stream(
+                    "POST",
+                    f"{self.base_url}/chat/completions",
+                    json=payload,
+                    headers=self._build_headers(options, stream=True, api_key=key.api_key),
+                    timeout=options.get("timeout", self.default_timeout)
+                ) as response:
+                    if response.status_code >= 400:
+                        await response.aread()
+                        self.rate_limiter.record_tokens(key.rate_limit_name, -estimated_tokens, reservation)
+                        settled = True
+                        error = self._status_error(
+                            response.status_code,
+                            f"{response.status_code} {response.reason_phrase}",
+                            response.headers,
+                            response.text
+                        )
+                        if self._key_failed(key, error):
+                            continue
+                        yield error
+                        return
+                    
+                    responded = True
+                    done = False
+                    async for line in response.aiter_lines():
+                        chunk = parse_sse_line(line)
+                        if chunk is None or done:
+                            continue
+                        if chunk is SSE_DONE:
+                            # Read on to the end of the body, so httpx's line iterators finish
+                            # here rather than being finalized by the garbage collector
+                            done = True
+                            continue
+                        
+                        choices = chunk.get("choices") or [{}]
+                        delta = choices[0].get("delta") or {}
+                        text = delta.get("content") or ""
+                        finish_reason = choices[0].get("finish_reason")
+                        usage = chunk.get("usage") or (chunk.get("x_groq") or {}).get("usage")
+                        
+                        if not text and not finish_reason and not usage:
+                            continue
+                        
+                        streamed_tokens += estimate_tokens(text)
+                        if usage and not settled:
+                            settled = self._correct_token_usage(key, reservation, estimated_tokens, usage)
+                        
+                        yield {
+                            "text": text,
+                            "provider": self.name,
+                            "model": model_name,
+                            "finish_reason": finish_reason,
+                            "usage": usage or {}
+                        }
+                    
+                    self.key_pool.record_success(key)
+                    return
+            except httpx.RequestError as e:
+                if not responded:
+                    self.rate_limiter.record_tokens(key.rate_limit_name, -estimated_tokens, reservation)
+                    settled = True
+                yield self._request_error(e)
+                return
+            finally:
+                key.in_flight -= 1
+                if responded and not settled:
+                    # No usage block, a broken stream or a consumer that stopped early:
+                    # settle on the prompt plus what was received
+                    unused_tokens = options.get("max_tokens", 1024) - streamed_tokens
+                    self.rate_limiter.record_tokens(key.rate_limit_name, -max(unused_tokens, 0), reservation)
+    
+    async def list_models(self):
+        """Return the model ids listed by the OpenAI-compatible ``/models`` endpoint
+        
+        Raises httpx errors, so a caller can tell a failed lookup from an empty list.
+        """
+        keys = self.key_pool.usable()
+        response = await self.client.get(
+            f"{self.base_url}/models",
+            headers=self._build_headers({}, api_key=keys[0].api_key if keys else None),
+            timeout=self.default_timeout
+        )
+        response.raise_for_status()
+        return [entry["id"] for entry in response.json().get("data", []) if "id" in entry]
+    
+    def _request_error(self, e):
+        """Build the result for a request that got no response; timeouts are flagged for metrics"""
+        error = {"error": f"Request error: {str(e)}", "provider": self.name}
+        if isinstance(e, httpx.TimeoutException):
+            error["timeout"] = True
+        return error
+    
+    def check_availability(self, tokens=0):
+        """Check if some usable key is below the request and token rate limits"""
+        limit_info = self.get_rate_limit_info()
+        return any(
+            self.rate_limiter.is_available(key.rate_limit_name, limit_info, tokens)
+            for key in self.key_pool.usable()
+        )
+    
+    def _correct_token_usage(self, key, reservation, estimated_tokens, usage):
+        """Replace a key's token reservation with the actual usage once it is known
+        
+        Returns True if the usage block contained a token count.
+        """
+        actual_tokens = usage_total_tokens(usage)
+        if actual_tokens is None:
+            return False
+        
+        self.rate_limiter.record_tokens(key.rate_limit_name, actual_tokens - estimated_tokens, reservation)
+        return True
+
+
+# Sentinel returned by parse_sse_line for the terminating "data: [DONE]" event
+SSE_DONE = object()
+
+def parse_sse_line(line):
+    """Parse one server-sent events line into a JSON chunk
+    
+    Returns None for blank lines, comments and non-data fields, and
+    SSE_DONE for the end-of-stream marker.
+    """
+    line = line.strip()
+    if not line.startswith("data:"):
+        return None
+    
+    data = line[5:].strip()
+    if data == "[DONE]":
+        return SSE_DONE
+    if not data:
+        return None
+    
+    try:
+        return json.loads(data)
+    except ValueError:
+        return None
+
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+def _parse_reset_value(value):
+    """Parse a rate limit reset header value into seconds from now"""
+    value = value.strip()
+    try:
+        number = float(value)
+    except ValueError:
+        # Durations like "2m59.56s" or "120ms"
+        parts = _DURATION_PART.findall(value)
+        if not parts:
+            return None
+        return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+    
+    # Epoch timestamps in milliseconds or seconds, otherwise a delay in seconds
+    if number > 1e12:
+        return number / 1000 - time.time()
+    if number > 1e9:
+        return number - time.time()
+    return number
+
+def parse_retry_after(headers):
+    """Return the seconds to wait from Retry-After / x-ratelimit-reset headers, or None"""
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            try:
+                return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0.0)
+            except (TypeError, ValueError):
+                pass
+    
+    delays = []
+    for name in ("x-ratelimit-reset", "x-ratelimit-reset-requests", "x-ratelimit-reset-tokens"):
+        value = headers.get(name)
+        if value:
+            delay = _parse_reset_value(value)
+            if delay is not None:
+                delays.append(delay)
+    
+    if not delays:
+        return None
+    # The earliest reset; a half-open probe finds out if that was enough
+    return max(min(delays), 0.0)
@@ -1,53 +1,121 @@
-from .groq import GroqProvider
-from .openrouter import OpenRouterProvider  # You'll need to implement this
-from .perplexity import PerplexityProvider  # You'll need to implement this
+import copy
+import importlib
+import logging
+
 from ..utils.config import load_provider_config
 
-# Map provider names to their classes
+logger = logging.getLogger("llm_router")
+
+# Map provider names to their classes, as "module:Class" import paths (relative to
+# this package) that are only imported the first time the provider is built
 PROVIDER_CLASSES = {
-    "groq": GroqProvider,
-    "openrouter": OpenRouterProvider,
-    "perplexity": PerplexityProvider,
-    # Add more providers here
+    "groq": ".groq:GroqProvider",
+    "openrouter": ".openrouter:OpenRouterProvider",
+    "perplexity": ".perplexity:PerplexityProvider",
+    # Add more providers here, or register them from another package (see below)
 }
 
+# Entry point group that installed packages can list provider classes under
+ENTRY_POINT_GROUP = "llm_router.providers"
+
+_entry_points_loaded = False
+
+def register_provider(provider_name, provider_class):
+    """Register a provider class, or a "module:Class" import path resolved on first use"""
+    PROVIDER_CLASSES[provider_name] = provider_class
+
+def _load_entry_points():
+    """Add providers registered as entry points; scanning installed packages is slow, so only on a miss"""
+    global _entry_points_loaded
+    if _entry_points_loaded:
+        return
+    _entry_points_loaded = True
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        return
+    
+    found = entry_points()
+    group = found.select(group=ENTRY_POINT_GROUP) if hasattr(found, "select") else found.get(ENTRY_POINT_GROUP, ())
+    for entry_point in group:
+        PROVIDER_CLASSES.setdefault(entry_point.name, entry_point.value)
+
+def _import_class(path):
+    module_name, _, class_name = path.partition(":")
+    return getattr(importlib.import_module(module_name, __package__), class_name)
+
+def is_registered(provider_name, config=None):
+    """Check whether a provider can be built, without importing its class"""
+    if (config or {}).get("class") or provider_name in PROVIDER_CLASSES:
+        return True
+    _load_entry_points()
+    return provider_name in PROVIDER_CLASSES
+
+def get_provider_class(provider_name, config=None):
+    """Return the class of a provider, importing it on first use
+    
+    A ``class`` import path in the provider's config section takes
+    precedence over the registry.
+    """
+    if (config or {}).get("class"):
+        return _import_class(config["class"])
+    
+    if not is_registered(provider_name):
+        raise ValueError(f"Provider {provider_name} not implemented")
+    provider_class = PROVIDER_CLASSES[provider_name]
+    if isinstance(provider_class, str):
+        provider_class = PROVIDER_CLASSES[provider_name] = _import_class(provider_class)
+    return provider_class
+
+def has_credentials(provider_name, config, api_key):
+    """Check whether a provider got an API key, or says in its config that it needs none"""
+    if config.get("requires_key") is False:
+        return True
+    if isinstance(api_key, (list, tuple)):
+        return any(api_key)
+    return bool(api_key)
+
 def create_provider(provider_name, api_key=None):
     """Create a provider instance from configuration"""
-    # Load all provider configs
+    # Load all provider configs (parsed once and cached)
     provider_configs = load_provider_config()
     
     # Check if provider exists in config
     if provider_name not in provider_configs:
         raise ValueError(f"Provider {provider_name} not found in configuration")
     
-    # Check if provider class exists
-    if provider_name not in PROVIDER_CLASSES:
-        raise ValueError(f"Provider {provider_name} not implemented")
-    
-    # Get provider config and class
-    provider_config = provider_configs[provider_name]
-    provider_class = PROVIDER_CLASSES[provider_name]
+    return build_provider(provider_name, provider_configs[provider_name], api_key)
+
+def build_provider(provider_name, config, api_key=None):
+    """Create a provider instance from its config section"""
+    provider_class = get_provider_class(provider_name, config)
     
-    # Create and return provider instance
-    return provider_class(provider_config, api_key)
+    # Providers keep their config, so give each its own copy of the cached one
+    return provider_class(copy.deepcopy(config), api_key)
 
-def create_all_providers(api_keys=None):
-    """Create all configured providers
+def create_all_providers(api_keys=None, provider_configs=None):
+    """Create the configured providers that have API keys
     
     Args:
-        api_keys: Dictionary mapping provider names to API keys
+        api_keys: Dictionary mapping provider names to an API key or a list of keys
+        provider_configs: Provider config sections, by default those of providers.yaml
     
     Returns:
         List of provider instances
     """
     api_keys = api_keys or {}
-    provider_configs = load_provider_config()
+    if provider_configs is None:
+        provider_configs = load_provider_config()
     providers = []
     
     for provider_name, config in provider_configs.items():
-        if provider_name in PROVIDER_CLASSES:
-            api_key = api_keys.get(provider_name)
-            provider_class = PROVIDER_CLASSES[provider_name]
-            providers.append(provider_class(config, api_key))
+        api_key = api_keys.get(provider_name)
+        if not has_credentials(provider_name, config, api_key):
+            logger.debug("Skipping provider %s, no API key", provider_name)
+            continue
+        if not is_registered(provider_name, config):
+            logger.warning("Provider %s in config is not implemented, skipping it", provider_name)
+            continue
+        providers.append(build_provider(provider_name, config, api_key))
     
-    return providers
\ No newline at end of file
+    return providers
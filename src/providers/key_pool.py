@@ -0,0 +1,121 @@
+import itertools
+import time
+
+# Cooldown for a key after a 429 that came without Retry-After or rate limit reset headers
+DEFAULT_KEY_COOLDOWN = 10.0
+
+ROUND_ROBIN = "round_robin"
+LEAST_LOADED = "least_loaded"
+
+class PooledKey:
+    """One API key of a provider's pool and its health"""
+    
+    def __init__(self, api_key, rate_limit_name):
+        self.api_key = api_key
+        self.rate_limit_name = rate_limit_name  # name of this key's window in the rate limiter
+        self.in_flight = 0
+        self.revoked = False
+        self.throttled_until = 0.0
+        self.success_count = 0
+        self.error_count = 0
+        self.last_error = None
+    
+    @property
+    def label(self):
+        """The key with all but its last four characters masked, for logs and stats"""
+        if not self.api_key:
+            return None
+        return "..." + str(self.api_key)[-4:]
+    
+    def to_dict(self, now):
+        return {
+            "key": self.label,
+            "in_flight": self.in_flight,
+            "revoked": self.revoked,
+            "throttled_for": max(self.throttled_until - now, 0.0),
+            "success_count": self.success_count,
+            "error_count": self.error_count,
+            "last_error": self.last_error
+        }
+
+class KeyPool:
+    """The API keys of one provider, each with its own rate limit window
+    
+    A single key keeps the provider's name as its rate limit window, so a
+    one-key pool behaves exactly like a plain provider. With several keys,
+    each gets a ``name[i]`` window. Keys are handed out least loaded first
+    (fewest requests in flight, then most rate limit headroom) or round
+    robin. Revoked keys (401) leave the pool for good, throttled keys (429)
+    until their cooldown ends.
+    """
+    
+    def __init__(self, provider_name, api_keys, strategy=LEAST_LOADED, clock=time.monotonic):
+        if api_keys is None or isinstance(api_keys, str):
+            api_keys = [api_keys]
+        api_keys = list(api_keys) or [None]
+        if strategy not in (LEAST_LOADED, ROUND_ROBIN):
+            raise ValueError(f"Unknown key selection strategy {strategy}")
+        
+        self.strategy = strategy
+        self.clock = clock
+        if len(api_keys) == 1:
+            self.keys = [PooledKey(api_keys[0], provider_name)]
+        else:
+            self.keys = [PooledKey(key, f"{provider_name}[{i}]") for i, key in enumerate(api_keys)]
+        self._rotation = itertools.count()
+    
+    def __len__(self):
+        return len(self.keys)
+    
+    def usable(self):
+        """Keys that are neither revoked nor cooling down after a 429"""
+        now = self.clock()
+        return [key for key in self.keys if not key.revoked and key.throttled_until <= now]
+    
+    def candidates(self, headroom=None):
+        """Usable keys in the order they should be tried
+        
+        ``headroom(key)`` returns the key's free rate limit slots (None if
+        unlimited) and breaks ties between equally loaded keys.
+        """
+        keys = self.usable()
+        if self.strategy == ROUND_ROBIN:
+            if not keys:
+                return keys
+            start = next(self._rotation) % len(keys)
+            return keys[start:] + keys[:start]
+        
+        def load(key):
+            free = headroom(key) if headroom is not None else None
+            return key.in_flight, -(float('inf') if free is None else free)
+        return sorted(keys, key=load)
+    
+    def retry_in(self, key):
+        """Seconds until a throttled key is usable again (inf if revoked)"""
+        if key.revoked:
+            return float('inf')
+        return max(key.throttled_until - self.clock(), 0.0)
+    
+    def record_success(self, key):
+        key.success_count += 1
+    
+    def revoke(self, key, error):
+        """Take a key out of the pool for good, e.g. after a 401"""
+        key.revoked = True
+        self.record_error(key, error)
+    
+    def throttle(self, key, cooldown, error):
+        """Take a key out of rotation for ``cooldown`` seconds, e.g. after a 429"""
+        if cooldown is None:
+            cooldown = DEFAULT_KEY_COOLDOWN
+        key.throttled_until = max(key.throttled_until, self.clock() + cooldown)
+        self.record_error(key, error)
+    
+    def record_error(self, key, error):
+        key.error_count += 1
+        key.last_error = error
+    
+    def stats(self):
+        """Return the state and counters of every key"""
+        now = self.clock()
+        return [key.to_dict(now) for key in self.keys]
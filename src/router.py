@@ -1,47 +1,177 @@
 # src/router.py
-import heapq
+import asyncio
+import contextvars
+import copy
+import itertools
 import time
 import logging
 from typing import Dict, List, Tuple, Any, Optional
-from .providers.factory import create_all_providers
+from .providers.factory import build_provider, create_all_providers, has_credentials, is_registered
+from .utils.batch import BatchScheduler, is_throttled
+from .utils.cache import make_cache_key
+from .utils.concurrency import AdaptiveConcurrencyLimiter
+from .utils.config import load_provider_config
+from .utils.deadline import Deadline
+from .utils.latency import LatencyStats
+from .utils.metrics import attempt_outcome, request_outcome, result_tokens
+from .utils.negative_cache import AUTH_FAILED, PROVIDER_WIDE
+from .utils.routing_index import RoutingIndex
+from .utils.scoring import DefaultScoringPolicy
+from .utils.singleflight import SingleFlight, StreamSingleFlight
+from .utils.state import InProcessStateBackend
+from .utils.tokens import estimate_request_tokens
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("llm_router")
 
+# Per-model latency is used once a model has this many samples, before that
+# the provider-wide statistics stand in for it
+MIN_MODEL_LATENCY_SAMPLES = 3
+
+# Hedge delay used before a candidate has any latency samples
+DEFAULT_HEDGE_DELAY = 2.0
+
+# Cooldown after a 429 that came without Retry-After or rate limit reset headers
+DEFAULT_RATE_LIMIT_COOLDOWN = 10.0
+
+# Relative EWMA change that triggers a rebuild of latency-aware routing indexes
+LATENCY_REINDEX_THRESHOLD = 0.2
+
+# Provider health fields kept in the state backend, so workers sharing it see the same counts
+HEALTH_COUNTERS = ("success_count", "error_count", "last_success_time", "last_error_time", "consecutive_errors")
+
+# Candidates passed to hooks that trace routing decisions
+MAX_TRACED_CANDIDATES = 20
+
+# Options that change how a call is dispatched; only calls that agree on them are coalesced
+COALESCE_KEY_OPTIONS = ("prefer", "priority", "queue", "hedge", "hedge_after", "hedge_max_parallel")
+
+class _RequestTrace:
+    """Hook context and attempt count of one router call, for the hooks"""
+    
+    __slots__ = ("context", "attempts")
+    
+    def __init__(self, context):
+        self.context = context
+        self.attempts = 0
+
+# The call being served by the current task; hedged attempts inherit it
+_current_request = contextvars.ContextVar("llm_router_request", default=None)
+
 class LLMRouter:
-    def __init__(self, api_keys=None):
+    def __init__(self, api_keys=None, providers=None, scoring_policy=None, circuit_breaker_options=None,
+                 cache=None, coalesce=False, admission_queue=None, concurrency_limit_options=None,
+                 state_backend=None, hooks=None, clock=time.monotonic, negative_cache_options=None,
+                 model_catalog=None, semantic_cache=None):
         self.providers = {}  # name: provider_instance
         self.model_map = {}  # model_name: list of providers that support it
         self.provider_health = {}  # provider_name: health metrics
+        self.api_keys = api_keys or {}  # provider_name: key(s), for providers added by a config reload
+        self.provider_configs = {}  # provider_name: config section the provider was built from
+        
+        # Time source for latencies, deadlines, key cooldowns and concurrency limits;
+        # a simulation passes a virtual clock
+        self.clock = clock
+        
+        # Rate limits, error counters, circuits and the negative cache, optionally shared with other processes
+        self.state_backend = state_backend or InProcessStateBackend(clock)
+        self.rate_limiter = self.state_backend.rate_limiter()  # shared by all providers
+        self.scoring_policy = scoring_policy or DefaultScoringPolicy()
+        self.routing_indexes = {}  # prefer: precomputed candidate ordering
+        self._indexed_latency = {}  # (provider, model): EWMA when indexes were last invalidated
+        self.circuit_breaker_options = circuit_breaker_options or {}  # CircuitBreaker arguments
+        self.concurrency_limit_options = concurrency_limit_options or {}  # AdaptiveConcurrencyLimiter arguments
+        self.cache = cache  # optional ResponseCache (or compatible) in front of dispatch
+        self.semantic_cache = semantic_cache  # optional SemanticCache for near-duplicate prompts, after the exact cache
+        
+        # Provider/model pairs that failed permanently (retired model, auth, billing), kept out of routing
+        self.negative_cache = self.state_backend.negative_cache(**(negative_cache_options or {}))
+        
+        # Single-flight groups that let identical concurrent requests share one upstream call
+        self.coalesce = coalesce
+        self.inflight = SingleFlight()
+        self.inflight_streams = StreamSingleFlight()
         
-        # Initialize providers from config
-        self._initialize_providers(api_keys)
+        # Optional AdmissionQueue that holds requests while every provider is saturated
+        self.admission_queue = admission_queue
         
-    def _initialize_providers(self, api_keys=None):
+        # Optional RouterHooks (metrics, tracing); without them the hot path skips all bookkeeping
+        self.hooks = hooks
+        
+        # Optional ModelCatalog that keeps provider models in line with their /models lists
+        self.model_catalog = model_catalog
+        
+        # Initialize providers from config, unless instances were passed in
+        self._initialize_providers(api_keys, providers)
+        
+    async def __aenter__(self):
+        await self.open()
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+    
+    async def open(self):
+        """Open the connection pools of all providers and start the model catalog refresh"""
+        for provider in self.providers.values():
+            await provider.open()
+        if self.model_catalog is not None:
+            await self.model_catalog.attach(self)
+    
+    async def aclose(self):
+        """Close the connection pools of all providers"""
+        if self.model_catalog is not None:
+            await self.model_catalog.aclose()
+        for provider in self.providers.values():
+            await provider.aclose()
+        
+    def _initialize_providers(self, api_keys=None, providers=None):
         """Initialize all providers from configuration"""
-        providers = create_all_providers(api_keys)
+        if providers is None:
+            self.provider_configs = load_provider_config()
+            providers = create_all_providers(api_keys, self.provider_configs)
         
         for provider in providers:
             self.add_provider(provider)
-            # Initialize health metrics
-            self.provider_health[provider.name] = {
-                "success_count": 0,
-                "error_count": 0,
-                "last_success_time": 0,
-                "last_error_time": 0,
-                "consecutive_errors": 0
-            }
     
     def add_provider(self, provider):
         """Add a provider to the router"""
         self.providers[provider.name] = provider
+        provider.rate_limiter = self.rate_limiter
+        provider.key_pool.clock = self.clock
+        if self.model_catalog is not None:
+            provider.available_models = self.model_catalog.models_for(provider) or provider.available_models
+        
+        # Initialize health metrics
+        self.provider_health.setdefault(provider.name, {
+            "success_count": 0,
+            "error_count": 0,
+            "last_success_time": 0,
+            "last_error_time": 0,
+            "consecutive_errors": 0,
+            "latency": LatencyStats(),
+            "model_latency": {},  # model_name: LatencyStats
+            "circuit": self.state_backend.circuit_breaker(f"circuit:{provider.name}", **self.circuit_breaker_options),
+            "model_circuits": {},  # model_name: CircuitBreaker
+            "concurrency": self._build_concurrency_limiter(provider)
+        })
         
         # Update model map
         for model_name in provider.available_models:
             if model_name not in self.model_map:
                 self.model_map[model_name] = []
             self.model_map[model_name].append(provider.name)
+        
+        self._invalidate_routing()
+            
+    def _build_concurrency_limiter(self, provider):
+        """Create a provider's concurrency limiter, starting at its request rate limit across all keys"""
+        options = {"clock": self.clock}
+        requests_per_minute = provider.get_rate_limit_info().get("requests_per_minute")
+        if requests_per_minute:
+            options["initial_limit"] = requests_per_minute * len(provider.key_pool)
+        return AdaptiveConcurrencyLimiter(**{**options, **self.concurrency_limit_options})
             
     def remove_provider(self, provider_name):
         """Remove a provider from the router"""
@@ -57,6 +187,91 @@ class LLMRouter:
             del self.providers[provider_name]
             if provider_name in self.provider_health:
                 del self.provider_health[provider_name]
+            self.state_backend.set_state(f"health:{provider_name}", None)
+            self.negative_cache.forget_provider(provider_name)
+            
+            self._invalidate_routing()
+    
+    def set_provider_models(self, provider_name, models):
+        """Replace the models (name: quality score) a provider is routed to
+        
+        The model map is rebuilt rather than edited in place, so routing
+        decisions in progress keep a consistent view. Returns True if
+        anything changed.
+        """
+        provider = self.providers[provider_name]
+        if models == provider.available_models:
+            return False
+        
+        added = set(models) - set(provider.available_models)
+        removed = set(provider.available_models) - set(models)
+        provider.available_models = dict(models)
+        
+        model_map = {}
+        for name, candidate in self.providers.items():
+            for model_name in candidate.available_models:
+                model_map.setdefault(model_name, []).append(name)
+        self.model_map = model_map
+        
+        # A model that comes back later starts with a clean slate
+        health = self.provider_health.get(provider_name)
+        for model_name in removed:
+            self.negative_cache.forget_model(provider_name, model_name)
+            if health is not None and health["model_circuits"].pop(model_name, None) is not None:
+                self.state_backend.set_state(f"circuit:{provider_name}:{model_name}", None)
+        
+        if added or removed:
+            logger.info(
+                "Models of %s updated: %s added, %s removed", provider_name,
+                sorted(added) or "none", sorted(removed) or "none"
+            )
+        self._invalidate_routing()
+        return True
+    
+    def reconfigure(self, provider_configs):
+        """Apply a changed provider config to the live router
+        
+        Every section is validated before anything changes, and providers that
+        stay keep their pools, health and rate limit windows. Returns a summary and
+        the removed providers, whose pools the caller should close.
+        """
+        # Build (and so validate) everything first; a bad section raises before anything changes
+        added = []
+        updated = {}
+        for provider_name, config in provider_configs.items():
+            if provider_name not in self.providers:
+                if not has_credentials(provider_name, config, self.api_keys.get(provider_name)):
+                    continue
+                if is_registered(provider_name, config):
+                    added.append(build_provider(provider_name, config, self.api_keys.get(provider_name)))
+                else:
+                    logger.warning("Provider %s in config is not implemented, skipping it", provider_name)
+            elif config != self.provider_configs.get(provider_name):
+                build_provider(provider_name, config, self.api_keys.get(provider_name))
+                updated[provider_name] = copy.deepcopy(config)
+        removed = [self.providers[name] for name in self.provider_configs if name not in provider_configs
+                   and name in self.providers]
+        
+        for provider in removed:
+            self.remove_provider(provider.name)
+        for provider in added:
+            self.add_provider(provider)
+        
+        changes = {"added": [p.name for p in added], "removed": [p.name for p in removed], "updated": {}}
+        for provider_name, config in updated.items():
+            provider = self.providers[provider_name]
+            changes["updated"][provider_name] = provider.update_config(config)
+            models = self.model_catalog.models_for(provider) if self.model_catalog is not None else None
+            self.set_provider_models(provider_name, models if models is not None else config.get("models", {}))
+        
+        self.provider_configs = provider_configs
+        self._invalidate_routing()
+        if added or removed or updated:
+            logger.info(
+                "Provider config applied: added %s, removed %s, updated %s",
+                changes["added"], changes["removed"], changes["updated"]
+            )
+        return changes, removed
     
     def list_available_models(self):
         """List all available models across providers"""
@@ -69,156 +284,982 @@ class LLMRouter:
             
         current_time = time.time()
         health = self.provider_health[provider_name]
+        previous_errors = health["consecutive_errors"]
+        
+        def count(counters):
+            counters = counters or {name: 0 for name in HEALTH_COUNTERS}
+            if success:
+                counters["success_count"] += 1
+                counters["last_success_time"] = current_time
+                counters["consecutive_errors"] = 0
+            else:
+                counters["error_count"] += 1
+                counters["last_error_time"] = current_time
+                counters["consecutive_errors"] += 1
+            return counters
+        
+        health.update(self.state_backend.update_state(f"health:{provider_name}", count))
+        if not success:
+            logger.warning("Provider %s error: %s", provider_name, error_message)
+        
+        # Only reorder candidates when the change can move the score
+        if health["consecutive_errors"] != previous_errors:
+            self._invalidate_routing()
+    
+    def _record_latency(self, provider_name, model_name, seconds):
+        """Record the latency of a successful call for the provider and the model"""
+        health = self.provider_health.get(provider_name)
+        if health is None:
+            return
+        
+        health["latency"].record(seconds)
+        model_stats = health["model_latency"].get(model_name)
+        if model_stats is None:
+            model_stats = health["model_latency"][model_name] = LatencyStats()
+        model_stats.record(seconds)
+        
+        # Reorder latency-aware candidates only when the expected latency moved noticeably
+        key = (provider_name, model_name)
+        indexed = self._indexed_latency.get(key)
+        if indexed is None or abs(model_stats.ewma - indexed) > LATENCY_REINDEX_THRESHOLD * indexed:
+            self._indexed_latency[key] = model_stats.ewma
+            self._invalidate_routing(latency_only=True)
+    
+    def get_latency_stats(self, provider_name, model_name=None):
+        """Return the LatencyStats for a provider/model pair, or None without samples
+        
+        Falls back to the provider-wide statistics until the model has enough
+        samples of its own.
+        """
+        health = self.provider_health.get(provider_name)
+        if health is None:
+            return None
+        
+        if model_name is not None:
+            model_stats = health["model_latency"].get(model_name)
+            if model_stats is not None and model_stats.count >= MIN_MODEL_LATENCY_SAMPLES:
+                return model_stats
+        
+        if health["latency"].count:
+            return health["latency"]
+        return None
+    
+    def _get_circuit(self, provider_name, model_name=None):
+        """Return the circuit breaker of a provider, or of one of its models"""
+        health = self.provider_health[provider_name]
+        if model_name is None:
+            return health["circuit"]
         
-        if success:
-            health["success_count"] += 1
-            health["last_success_time"] = current_time
-            health["consecutive_errors"] = 0
+        circuit = health["model_circuits"].get(model_name)
+        if circuit is None:
+            circuit = health["model_circuits"][model_name] = self.state_backend.circuit_breaker(
+                f"circuit:{provider_name}:{model_name}", **self.circuit_breaker_options
+            )
+        return circuit
+    
+    def _circuit_available(self, provider_name, model_name):
+        """Check the provider and model circuits without claiming a probe"""
+        health = self.provider_health[provider_name]
+        if not health["circuit"].is_available():
+            return False
+        model_circuit = health["model_circuits"].get(model_name)
+        return model_circuit is None or model_circuit.is_available()
+    
+    def _claim_circuits(self, provider_name, model_name):
+        """Claim permission from the provider and model circuits for one request"""
+        provider_circuit = self._get_circuit(provider_name)
+        model_circuit = self._get_circuit(provider_name, model_name)
+        
+        if not provider_circuit.allow_request():
+            return False
+        if not model_circuit.allow_request():
+            provider_circuit.release()
+            return False
+        return True
+    
+    def _claim(self, provider_name, model_name):
+        """Claim circuit permission and a concurrency slot for one request
+        
+        Returns None on success, otherwise the reason the request may not go out.
+        """
+        if not self._claim_circuits(provider_name, model_name):
+            return "circuit open"
+        if not self.provider_health[provider_name]["concurrency"].try_acquire():
+            self._get_circuit(provider_name).release()
+            self._get_circuit(provider_name, model_name).release()
+            return "concurrency limit reached"
+        return None
+    
+    def _release_claim(self, provider_name, model_name):
+        """Give back claimed probes and the concurrency slot of a request that produced no outcome"""
+        if provider_name in self.provider_health:
+            self._get_circuit(provider_name).release()
+            self._get_circuit(provider_name, model_name).release()
+            self.provider_health[provider_name]["concurrency"].release()
+    
+    def _record_success(self, provider_name, model_name, latency=None):
+        """Record a successful call in health metrics, latency stats and circuits"""
+        if provider_name not in self.provider_health:
+            return
+        
+        if latency is not None:
+            self._record_latency(provider_name, model_name, latency)
+        self._update_provider_health(provider_name, True)
+        self.provider_health[provider_name]["concurrency"].record_success(latency)
+        self._get_circuit(provider_name).record_success()
+        self._get_circuit(provider_name, model_name).record_success()
+        self.negative_cache.discard(provider_name, model_name)
+    
+    def _record_failure(self, provider_name, model_name, error, status_code=None, retry_after=None,
+                        permanent=None, timeout=False):
+        """Record a failed call in health metrics and circuits
+        
+        429s, 503s and timeouts also shrink the provider's concurrency limit, and
+        permanent failures put the pair (or the provider) in the negative cache.
+        """
+        if provider_name not in self.provider_health:
+            return
+        
+        self._update_provider_health(provider_name, False, error)
+        provider_circuit = self._get_circuit(provider_name)
+        model_circuit = self._get_circuit(provider_name, model_name)
+        concurrency = self.provider_health[provider_name]["concurrency"]
+        
+        if status_code == 429:
+            cooldown = retry_after if retry_after is not None else DEFAULT_RATE_LIMIT_COOLDOWN
+            provider_circuit.trip(cooldown)
+            model_circuit.release()
+            concurrency.record_overload()
+        elif status_code is None or status_code >= 500:
+            provider_circuit.record_failure()
+            model_circuit.release()
+            if timeout or status_code == 503:
+                concurrency.record_overload()
+            else:
+                concurrency.release()
+        else:
+            # The provider answered, only this model is failing
+            provider_circuit.record_success()
+            model_circuit.record_failure()
+            concurrency.release()
+        
+        if permanent is not None:
+            self._mark_dead(provider_name, model_name, permanent, error)
+    
+    def _mark_dead(self, provider_name, model_name, reason, error):
+        """Exclude a pair that failed permanently from routing until its negative cache entry expires"""
+        if reason == AUTH_FAILED and any(not key.revoked for key in self.providers[provider_name].key_pool.keys):
+            return  # only the key was bad, the pool has already dropped it
+        self.negative_cache.add(provider_name, None if reason in PROVIDER_WIDE else model_name, reason, error)
+    
+    def get_circuit_states(self):
+        """Return the circuit breaker state of every provider and model"""
+        return {
+            provider_name: {
+                "circuit": health["circuit"].to_dict(),
+                "models": {model: circuit.to_dict() for model, circuit in health["model_circuits"].items()}
+            }
+            for provider_name, health in self.provider_health.items()
+        }
+    
+    def get_key_states(self):
+        """Return the health of every API key in each provider's key pool"""
+        return {provider_name: provider.key_pool.stats() for provider_name, provider in self.providers.items()}
+    
+    def get_dead_models(self):
+        """Return the provider/model pairs currently excluded after permanent failures
+        
+        Entries with model None exclude the whole provider. Pairs that stay
+        here are usually config entries for retired models or providers
+        whose key or credits ran out.
+        """
+        return self.negative_cache.to_list()
+    
+    def get_concurrency_limits(self):
+        """Return the adaptive concurrency limit and in-flight count of every provider"""
+        return {
+            provider_name: health["concurrency"].to_dict()
+            for provider_name, health in self.provider_health.items()
+        }
+    
+    def time_until_capacity(self, model_name=None, tokens=0):
+        """Seconds until some provider (serving the model, if given) can take a request
+        
+        Takes rate limit windows, token budgets, open circuits and full
+        concurrency limits into account.
+        Returns 0 if a request could be dispatched right now.
+        """
+        if model_name is not None:
+            provider_names = self.model_map.get(model_name, [])
         else:
-            health["error_count"] += 1
-            health["last_error_time"] = current_time
-            health["consecutive_errors"] += 1
-            logger.warning(f"Provider {provider_name} error: {error_message}")
+            provider_names = list(self.providers)
+        
+        best = float('inf')
+        for provider_name in provider_names:
+            if self.negative_cache.is_dead(provider_name, model_name):
+                continue
+            provider = self.providers[provider_name]
+            wait = max(
+                provider.time_until_available(tokens),
+                self._get_circuit(provider_name).retry_in(),
+                self.provider_health[provider_name]["concurrency"].retry_in()
+            )
+            best = min(best, wait)
+            if best == 0:
+                break
+        return best
+    
+    def remaining_capacity(self):
+        """Total free request slots across providers whose circuits are not open
+        
+        A provider contributes the smaller of its rate limit headroom and its
+        free concurrency slots.
+        """
+        total = 0
+        for provider_name, provider in self.providers.items():
+            if not self._get_circuit(provider_name).is_available() or self.negative_cache.is_dead(provider_name):
+                continue
+            free = self.provider_health[provider_name]["concurrency"].available()
+            remaining = provider.remaining_requests()
+            total += free if remaining is None else min(remaining, free)
+        return total
     
-    def _get_provider_score(self, provider_name, model_name):
-        """Calculate a score for provider selection based on quality and health"""
+    def _invalidate_routing(self, latency_only=False):
+        """Mark routing indexes stale so they are rebuilt on next use"""
+        for prefer, index in self.routing_indexes.items():
+            if not latency_only or self.scoring_policy.uses_latency(prefer):
+                index.invalidate()
+    
+    def _resolve_prefer(self, options):
+        """Return the quality/latency trade-off requested for this call"""
+        return options.get("prefer") or self.scoring_policy.default_prefer
+    
+    def _get_static_score(self, provider_name, model_name, prefer=None):
+        """Calculate a provider's score from the scoring policy, ignoring rate limits"""
+        return self.scoring_policy.score(self, provider_name, model_name, prefer or self.scoring_policy.default_prefer)
+    
+    def _get_provider_score(self, provider_name, model_name, tokens=0, prefer=None):
+        """Calculate a score for provider selection based on quality and health
+        
+        Providers without a free request slot or enough token budget for a
+        request of ``tokens`` tokens score -inf.
+        """
         if provider_name not in self.providers:
             return float('-inf')
             
         provider = self.providers[provider_name]
-        if not provider.check_availability():
+        if not provider.check_availability(tokens):
             return float('-inf')
-            
-        # Base score is the model quality
-        quality_score = provider.available_models.get(model_name, 0)
         
-        # Adjust for health
-        health = self.provider_health[provider_name]
-        health_penalty = min(health["consecutive_errors"] * 2, 10)
+        return self._get_static_score(provider_name, model_name, prefer)
+    
+    def _ensure_routing_index(self, prefer=None):
+        """Return the routing index for a trade-off, rebuilding it if it is stale"""
+        prefer = prefer or self.scoring_policy.default_prefer
+        index = self.routing_indexes.get(prefer)
+        if index is None:
+            index = self.routing_indexes[prefer] = RoutingIndex()
         
-        # Calculate final score
-        score = quality_score - health_penalty
+        if index.is_dirty:
+            policy = self.scoring_policy
+            index.rebuild(
+                self.model_map,
+                lambda provider_name, model_name: policy.score(self, provider_name, model_name, prefer),
+                lambda provider_name, model_name: policy.model_rank(self, provider_name, model_name, prefer)
+            )
+        return index
+    
+    def _iter_candidates(self, model_name=None, tokens=0, prefer=None):
+        """Yield (provider_name, model_name) pairs in the order they should be tried
         
-        return score
+        Availability is checked right before each candidate is handed out, so
+        slots used by earlier attempts are taken into account.
+        """
+        return self._ensure_routing_index(prefer).iter_candidates(
+            model_name, lambda provider_name, candidate_model: self._candidate_available(provider_name, candidate_model, tokens)
+        )
     
-    def get_best_provider_for_model(self, model_name):
-        """Get the best available provider for a specific model"""
-        if model_name not in self.model_map:
-            return None
-            
-        # Find all providers that support this model
-        candidate_providers = []
-        for provider_name in self.model_map[model_name]:
-            provider = self.providers[provider_name]
-            score = self._get_provider_score(provider_name, model_name)
-            
-            if score > float('-inf'):  # Provider is available
-                # Using negative score because heapq is a min-heap
-                candidate_providers.append((-score, provider_name))
+    def _candidate_available(self, provider_name, model_name, tokens=0):
+        # A config reload may have removed the provider since the routing index was built
+        if provider_name not in self.provider_health:
+            return False
+        # Dead pairs, open circuits and full concurrency limits are skipped without any network I/O
+        if self.negative_cache and self.negative_cache.is_dead(provider_name, model_name):
+            return False
+        if not self._circuit_available(provider_name, model_name):
+            return False
+        if not self.provider_health[provider_name]["concurrency"].is_available():
+            return False
+        return self.providers[provider_name].check_availability(tokens)
+    
+    def explain_routing(self, model_name=None, tokens=0, prefer=None, limit=None):
+        """Return ``(provider_name, model_name, score, available)`` for every candidate in routing order"""
+        prefer = prefer or self.scoring_policy.default_prefer
+        index = self._ensure_routing_index(prefer)
+        if model_name is not None:
+            pairs = ((provider_name, model_name) for provider_name in index.model_candidates.get(model_name, ()))
+        else:
+            pairs = (
+                (provider_name, ranked_model)
+                for ranked_model in index.ranked_models
+                for provider_name in index.model_candidates[ranked_model]
+            )
         
-        if not candidate_providers:
-            return None
-            
-        # Get the provider with the highest score
-        heapq.heapify(candidate_providers)
-        _, best_provider_name = heapq.heappop(candidate_providers)
-        return self.providers[best_provider_name]
+        return [
+            (provider_name, candidate_model, self._get_static_score(provider_name, candidate_model, prefer),
+             self._candidate_available(provider_name, candidate_model, tokens))
+            for provider_name, candidate_model in itertools.islice(pairs, limit)
+        ]
+    
+    def _trace_routing(self, trace, model_name, tokens, prefer):
+        """Pass the ranked candidates to hooks that want them"""
+        if trace is not None and self.hooks.wants_candidates:
+            self.hooks.routing_decision(
+                trace.context, self.explain_routing(model_name, tokens, prefer, MAX_TRACED_CANDIDATES)
+            )
+    
+    def get_best_provider_for_model(self, model_name, tokens=0):
+        """Get the best available provider for a specific model"""
+        for provider_name, _ in self._iter_candidates(model_name, tokens):
+            return self.providers[provider_name]
+        return None
     
     async def generate(self, prompt, model_name=None, options=None):
-        """Generate a response using the best available provider"""
+        """Generate a response using the best available provider
+        
+        Set ``timeout_total`` (seconds) or ``deadline`` (a ``time.time()``
+        timestamp) in options to bound the whole call, fallbacks included.
+        With a cache (or semantic cache) configured, the ``cache`` option controls its use:
+        ``"bypass"``, ``"only_if_cached"`` or ``"if_deterministic"`` (only
+        cache when temperature is 0).
+        """
         options = options or {}
+        if self.hooks is None:
+            return await self._generate(prompt, model_name, options)
+        
+        trace = _RequestTrace(self.hooks.request_started(model_name, prompt, options, False))
+        token = _current_request.set(trace)
+        start = self.clock()
+        outcome = "cancelled"
+        try:
+            result = await self._generate(prompt, model_name, options)
+            outcome = request_outcome(result)
+            return result
+        finally:
+            _current_request.reset(token)
+            self.hooks.request_finished(
+                trace.context, model_name, outcome, self.clock() - start, max(trace.attempts - 1, 0)
+            )
+    
+    async def _generate(self, prompt, model_name, options):
+        """Serve a call from the cache, a coalesced request or the providers"""
+        cache_key = self._get_cache_key(prompt, model_name, options)
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return {**cached, "cached": True}
+        
+        semantic_hit = None
+        if self.semantic_cache is not None and self._cache_allowed(options):
+            semantic_hit = self.semantic_cache.lookup(prompt, model_name, options)
+            # A sampled share of hits goes to a provider anyway, to measure false hits
+            if semantic_hit is not None and (
+                options.get("cache") == "only_if_cached" or not self.semantic_cache.should_verify()
+            ):
+                response, similarity, entry_id = semantic_hit
+                return {**response, "cached": True, "semantic": {"similarity": similarity, "id": entry_id}}
+        if options.get("cache") == "only_if_cached":
+            return {"error": "not_cached"}
+        
+        if not self._should_coalesce(options):
+            result = await self._generate_and_cache(prompt, model_name, options, cache_key)
+        else:
+            # Identical requests already in flight share their outcome with this one,
+            # which still waits no longer than its own deadline
+            deadline = Deadline.from_options(options, self.clock)
+            try:
+                result, shared = await self.inflight.do(
+                    self._coalesce_key(prompt, model_name, options),
+                    lambda: self._generate_and_cache(prompt, model_name, options, cache_key),
+                    deadline.remaining() if deadline is not None else None
+                )
+            except asyncio.TimeoutError:
+                return deadline.error()
+            if shared:
+                result = {**result, "coalesced": True}
+        
+        if semantic_hit is not None and "error" not in result:
+            self.semantic_cache.verify(semantic_hit[2], semantic_hit[0], result)
+        return result
+    
+    async def generate_many(self, prompts, model_name=None, options=None, **scheduler_options):
+        """Generate responses for many prompts, yielding results as they complete
+        
+        Prompts are strings or dicts with ``prompt`` and optional ``model_name`` /
+        ``options``; each result carries its prompt's ``index``. See
+        ``BatchScheduler`` for the scheduler options.
+        """
+        scheduler = BatchScheduler(self, prompts, model_name, options, **{"clock": self.clock, **scheduler_options})
+        results = scheduler.run()
+        try:
+            async for result in results:
+                yield result
+        finally:
+            # Cancels the prompts still in flight if the caller stops early
+            await results.aclose()
+    
+    def _should_coalesce(self, options):
+        """Whether identical concurrent requests should share one upstream call"""
+        return options.get("coalesce", self.coalesce)
+    
+    @staticmethod
+    def _coalesce_key(prompt, model_name, options):
+        """Key of the single-flight group of a request: its response and how it is dispatched"""
+        dispatch = tuple(repr(options.get(name)) for name in COALESCE_KEY_OPTIONS)
+        return make_cache_key(prompt, model_name, options), dispatch
+    
+    async def _generate_and_cache(self, prompt, model_name, options, cache_key):
+        """Dispatch a request and cache a successful result"""
+        result = await self._generate_uncached(prompt, model_name, options)
         
+        if "error" not in result:
+            if cache_key is not None:
+                self.cache.set(cache_key, result)
+            if self.semantic_cache is not None and self._cache_allowed(options):
+                self.semantic_cache.add(prompt, model_name, options, result)
+        return result
+    
+    async def _generate_uncached(self, prompt, model_name, options):
+        """Dispatch a request, waiting in the admission queue while providers are saturated"""
+        deadline = Deadline.from_options(options, self.clock)
+        queue = self.admission_queue
+        
+        if queue is None or not options.get("queue", True) or (model_name and model_name not in self.model_map):
+            return await self._dispatch(prompt, model_name, options, deadline)
+        
+        # Without a request deadline, the queue's max_wait bounds the total time spent waiting
+        wait_budget = deadline or Deadline(queue.max_wait, self.clock)
+        tokens = estimate_request_tokens(prompt, options)
+        
+        while True:
+            admitted = await queue.wait(self, model_name, tokens, options.get("priority"), wait_budget.remaining())
+            if not admitted:
+                if deadline is not None:
+                    return deadline.error()
+                return {"error": "queue_timeout", "waited": wait_budget.elapsed()}
+            
+            result = await self._dispatch(prompt, model_name, options, deadline)
+            if not is_throttled(result) or wait_budget.expired():
+                return result
+            # Lost the race for capacity (or hit a 429), wait in line again
+    
+    async def _dispatch(self, prompt, model_name, options, deadline):
+        """Send a request to the best available candidates"""
         if model_name:
             # Specific model requested
-            return await self._generate_with_model(prompt, model_name, options)
+            return await self._generate_with_model(prompt, model_name, options, deadline)
         else:
             # No specific model requested, use the best available model
-            return await self._generate_with_best_model(prompt, options)
+            return await self._generate_with_best_model(prompt, options, deadline)
     
-    async def _generate_with_model(self, prompt, model_name, options):
-        """Generate with a specific model, trying providers in order of preference"""
-        if model_name not in self.model_map:
-            return {"error": f"Model {model_name} not available"}
+    def _cache_allowed(self, options):
+        """Whether the ``cache`` option lets this request use the caches"""
+        mode = options.get("cache")
+        if mode == "bypass":
+            return False
+        if mode == "if_deterministic" and options.get("temperature", 0.7) != 0:
+            return False
+        return True
+    
+    def _get_cache_key(self, prompt, model_name, options):
+        """Return the response cache key for a request, or None if it shouldn't be cached"""
+        if self.cache is None or not self._cache_allowed(options):
+            return None
+        return make_cache_key(prompt, model_name, options)
+    
+    def _filter_deadline(self, candidates, deadline):
+        """Yield only the candidates that can still answer within the deadline
+        
+        Candidates whose expected (EWMA) latency exceeds the remaining budget
+        are skipped and noted on the deadline; iteration stops once it expires.
+        """
+        for provider_name, model_name in candidates:
+            if deadline.expired():
+                return
+            
+            stats = self.get_latency_stats(provider_name, model_name)
+            if deadline.fits(stats.ewma if stats else None):
+                yield provider_name, model_name
+            else:
+                logger.info("Skipping %s/%s, expected latency exceeds the remaining budget", provider_name, model_name)
+                deadline.skipped.append(f"{provider_name}/{model_name}")
+    
+    @staticmethod
+    def _attempt_options(provider, options, deadline):
+        """Cap an attempt's timeout at the time left in the deadline"""
+        if deadline is None:
+            return options
+        
+        timeout = options.get("timeout", getattr(provider, "default_timeout", None))
+        remaining = deadline.remaining()
+        return {**options, "timeout": remaining if timeout is None else min(timeout, remaining)}
+    
+    @staticmethod
+    def _deadline_binds(provider, options, deadline):
+        """Whether the deadline rather than the attempt's own timeout limits an attempt
+        
+        A timeout then only means the caller's budget ran out, which is not
+        held against the provider.
+        """
+        if deadline is None:
+            return False
+        timeout = options.get("timeout", getattr(provider, "default_timeout", None))
+        return timeout is None or deadline.remaining() < timeout
+    
+    async def generate_stream(self, prompt, model_name=None, options=None):
+        """Stream a response from the best available provider
+        
+        Candidates are tried in the same order as ``generate``. A provider that
+        fails (including rate limits) before its first chunk is skipped
+        transparently; a failure after streaming has started is yielded as a
+        final ``{"error": ...}`` chunk. With coalescing on, identical
+        concurrent streams share one upstream stream.
+        """
+        options = options or {}
+        
+        trace = None
+        if self.hooks is not None:
+            trace = _RequestTrace(self.hooks.request_started(model_name, prompt, options, True))
+            start = self.clock()
+            outcome = "cancelled"
+        
+        # A joined stream runs under the deadline of the caller that started it, so enforce our own
+        deadline = None
+        if self._should_coalesce(options):
+            deadline = Deadline.from_options(options, self.clock)
+            stream = self.inflight_streams.stream(
+                self._coalesce_key(prompt, model_name, options),
+                lambda: self._generate_stream(prompt, model_name, options, trace)
+            )
+        else:
+            stream = self._generate_stream(prompt, model_name, options, trace)
+        
+        try:
+            expired = False
+            while not expired:
+                try:
+                    chunk = await self._next_chunk(stream, deadline)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    chunk = deadline.error()
+                    expired = True
+                if trace is not None:
+                    outcome = request_outcome(chunk)
+                yield chunk
+        finally:
+            await stream.aclose()
+            if trace is not None:
+                self.hooks.request_finished(
+                    trace.context, model_name, outcome, self.clock() - start, max(trace.attempts - 1, 0)
+                )
+    
+    async def _generate_stream(self, prompt, model_name, options, trace=None):
+        """Stream from the providers, waiting in the admission queue while they are saturated"""
+        deadline = Deadline.from_options(options, self.clock)
+        queue = self.admission_queue
+        
+        if queue is None or not options.get("queue", True) or (model_name and model_name not in self.model_map):
+            stream = self._stream_candidates(prompt, model_name, options, deadline, trace)
+            try:
+                async for chunk in stream:
+                    yield chunk
+            finally:
+                await stream.aclose()
+            return
+        
+        wait_budget = deadline or Deadline(queue.max_wait, self.clock)
+        tokens = estimate_request_tokens(prompt, options)
+        
+        while True:
+            admitted = await queue.wait(self, model_name, tokens, options.get("priority"), wait_budget.remaining())
+            if not admitted:
+                yield deadline.error() if deadline is not None else {"error": "queue_timeout", "waited": wait_budget.elapsed()}
+                return
             
-        # Get all providers that support this model in order of quality score
-        provider_names = self.model_map[model_name]
-        provider_scores = [(self._get_provider_score(name, model_name), name) 
-                         for name in provider_names]
+            requeue = False
+            started = False
+            stream = self._stream_candidates(prompt, model_name, options, deadline, trace)
+            try:
+                async for chunk in stream:
+                    if not started and is_throttled(chunk) and not wait_budget.expired():
+                        # Nothing was streamed yet, wait in line again
+                        requeue = True
+                        break
+                    started = True
+                    yield chunk
+            finally:
+                await stream.aclose()
+            
+            if not requeue:
+                return
+    
+    async def _stream_candidates(self, prompt, model_name, options, deadline, trace=None):
+        """Stream from the providers, falling back before the first chunk"""
+        if model_name and model_name not in self.model_map:
+            yield {"error": f"Model {model_name} not available"}
+            return
         
-        # Sort by score, highest first
-        provider_scores.sort(reverse=True)
+        errors = []
+        attempted = False
+        tokens = estimate_request_tokens(prompt, options)
+        prefer = self._resolve_prefer(options)
+        if trace is not None:
+            self._trace_routing(trace, model_name, tokens, prefer)
+        candidates = self._iter_candidates(model_name, tokens, prefer)
+        if deadline is not None:
+            candidates = self._filter_deadline(candidates, deadline)
         
-        # Try providers in order
-        for score, provider_name in provider_scores:
-            if score <= float('-inf'):  # Provider not available
+        for provider_name, model in candidates:
+            provider = self.providers.get(provider_name)
+            if provider is None:
+                continue  # removed by a config reload while this stream was waiting for an earlier attempt
+            attempted = True
+            logger.debug("Streaming from %s with model %s", provider_name, model)
+            
+            refused = self._claim(provider_name, model)
+            if refused is not None:
+                errors.append(f"{provider_name}/{model}: {refused}")
                 continue
-                
-            provider = self.providers[provider_name]
-            logger.info(f"Trying {provider_name} for model {model_name}")
             
+            hook_context = self._attempt_started(trace, provider_name, model) if trace is not None else None
+            attempt_start = self.clock()
+            tokens_used = 0
+            started = False
+            error_chunk = None
+            expired = False
+            deadline_binds = self._deadline_binds(provider, options, deadline)
+            stream = provider.generate_stream(prompt, model, self._attempt_options(provider, options, deadline))
             try:
-                result = await provider.generate(prompt, model_name, options)
-                
-                if "error" in result:
-                    self._update_provider_health(provider_name, False, result["error"])
-                    # Rate limit errors should be handled specially
-                    if result["error"] == "rate_limit_exceeded":
-                        logger.info(f"Rate limit exceeded for {provider_name}, trying next provider")
-                        continue
-                else:
-                    self._update_provider_health(provider_name, True)
-                    return result
+                while True:
+                    try:
+                        chunk = await self._next_chunk(stream, deadline)
+                    except StopAsyncIteration:
+                        break
+                    if "error" in chunk:
+                        error_chunk = chunk
+                        if started:
+                            yield chunk
+                        break
+                    if not started:
+                        # Total stream time depends on the output length and on the consumer,
+                        # the time to the first chunk is what the provider controls
+                        first_chunk_latency = self.clock() - attempt_start
+                        started = True
+                    if trace is not None:
+                        tokens_used = result_tokens(chunk) or tokens_used
+                    yield chunk
+            except asyncio.TimeoutError:
+                # The request's budget ran out between chunks
+                expired = True
+                error_chunk = deadline.error(errors)
+                if started:
+                    yield error_chunk
             except Exception as e:
-                self._update_provider_health(provider_name, False, str(e))
-                logger.exception(f"Error generating with {provider_name}: {e}")
+                error_chunk = {"error": str(e), "provider": provider_name}
+                logger.exception("Error streaming from %s: %s", provider_name, e)
+                if started:
+                    yield error_chunk
+            finally:
+                await stream.aclose()
+                # Also runs when the consumer stops early, so claimed probes are never leaked
+                if error_chunk is None:
+                    self._record_success(
+                        provider_name, model, first_chunk_latency if started else self.clock() - attempt_start
+                    )
+                elif error_chunk.get("throttled_locally") or expired or (error_chunk.get("timeout") and deadline_binds):
+                    # No request went out, or the caller's deadline rather than the provider cut it short
+                    self._release_claim(provider_name, model)
+                else:
+                    self._record_failure(
+                        provider_name, model, error_chunk["error"],
+                        error_chunk.get("status_code"), error_chunk.get("retry_after"), error_chunk.get("permanent"),
+                        error_chunk.get("timeout", False)
+                    )
+                if trace is not None and not (error_chunk or {}).get("throttled_locally"):
+                    self.hooks.attempt_finished(
+                        hook_context, provider_name, model,
+                        "success" if error_chunk is None else "timeout" if expired else attempt_outcome(error_chunk),
+                        self.clock() - attempt_start, tokens_used, (error_chunk or {}).get("status_code")
+                    )
+            
+            if error_chunk is None:
+                return
+            
+            if started:
+                return
+            errors.append(f"{provider_name}/{model}: {error_chunk['error']}")
+        
+        if deadline is not None and (deadline.expired() or deadline.skipped):
+            yield deadline.error(errors)
+            return
+        
+        if not attempted:
+            yield {"error": "No available providers"}
+            return
+        
+        yield {
+            "error": "All models and providers failed",
+            "details": errors
+        }
+    
+    @staticmethod
+    async def _next_chunk(stream, deadline):
+        """Read the next chunk of a stream, raising asyncio.TimeoutError if the deadline passes first
         
-        return {"error": f"All providers for model {model_name} failed or unavailable"}
+        httpx timeouts apply per read, so without this a steady trickle of
+        chunks would outlive any ``timeout_total``.
+        """
+        if deadline is None:
+            return await stream.__anext__()
+        return await asyncio.wait_for(stream.__anext__(), deadline.remaining())
     
-    async def _generate_with_best_model(self, prompt, options):
-        """Generate using the best available model across all providers"""
-        all_models = self.list_available_models()
+    async def _attempt(self, provider_name, model_name, prompt, options, deadline=None):
+        """Make a single generate call and record its outcome
         
-        # Create a list of (model, best provider, quality score)
-        model_provider_pairs = []
-        for model in all_models:
-            provider = self.get_best_provider_for_model(model)
-            if provider:
-                score = provider.available_models[model]
-                model_provider_pairs.append((-score, model, provider))
+        With a deadline the call gets only the time left in the budget.
+        Returns a tuple of (result, error description); exactly one is None.
+        """
+        provider = self.providers.get(provider_name)
+        if provider is None:
+            return None, f"{provider_name}/{model_name}: provider removed"
+        refused = self._claim(provider_name, model_name)
+        if refused is not None:
+            return None, f"{provider_name}/{model_name}: {refused}"
         
-        if not model_provider_pairs:
-            return {"error": "No available providers"}
-            
-        # Sort by quality score (negative because we want highest first)
-        heapq.heapify(model_provider_pairs)
+        logger.debug("Trying %s with model %s", provider_name, model_name)
         
-        # Try models in order
-        errors = []
-        while model_provider_pairs:
-            _, best_model, best_provider = heapq.heappop(model_provider_pairs)
+        trace = None
+        if self.hooks is not None:
+            trace = _current_request.get()
+            hook_context = self._attempt_started(trace, provider_name, model_name)
+        outcome = "cancelled"
+        result = None
+        deadline_binds = self._deadline_binds(provider, options, deadline)
+        
+        start = self.clock()
+        try:
+            call = provider.generate(prompt, model_name, self._attempt_options(provider, options, deadline))
+            if deadline is not None:
+                # httpx timeouts apply per phase, so enforce the total as well
+                result = await asyncio.wait_for(call, deadline.remaining())
+            else:
+                result = await call
             
-            logger.info(f"Trying {best_provider.name} with model {best_model}")
+            if result.get("throttled_locally"):
+                # Lost the race for the last rate limit slot; no request was sent
+                outcome = None
+                self._release_claim(provider_name, model_name)
+                return None, f"{provider_name}/{model_name}: {result['error']}"
+            if "error" in result:
+                outcome = attempt_outcome(result)
+                if result.get("timeout") and deadline_binds:
+                    self._release_claim(provider_name, model_name)
+                    return None, f"{provider_name}/{model_name}: {result['error']}"
+                self._record_failure(
+                    provider_name, model_name, result["error"],
+                    result.get("status_code"), result.get("retry_after"), result.get("permanent"),
+                    result.get("timeout", False)
+                )
+                
+                # Rate limit errors should be handled specially
+                if result["error"] == "rate_limit_exceeded":
+                    logger.info("Rate limit exceeded for %s, trying next candidate", provider_name)
+                return None, f"{provider_name}/{model_name}: {result['error']}"
             
-            try:
-                result = await best_provider.generate(prompt, best_model, options)
+            outcome = "success"
+            self._record_success(provider_name, model_name, self.clock() - start)
+            return result, None
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            error = f"timed out after {self.clock() - start:.2f}s"
+            if deadline_binds:
+                self._release_claim(provider_name, model_name)
+            else:
+                self._record_failure(provider_name, model_name, error, timeout=True)
+            return None, f"{provider_name}/{model_name}: {error}"
+        except asyncio.CancelledError:
+            # A hedged request lost the race
+            self._release_claim(provider_name, model_name)
+            raise
+        except Exception as e:
+            outcome = "error"
+            self._record_failure(provider_name, model_name, str(e))
+            logger.exception("Error generating with %s: %s", provider_name, e)
+            return None, f"{provider_name}/{model_name}: {str(e)}"
+        finally:
+            if self.hooks is not None and outcome is not None:
+                tokens = result_tokens(result) if outcome == "success" else 0
+                self.hooks.attempt_finished(
+                    hook_context, provider_name, model_name, outcome, self.clock() - start, tokens,
+                    result.get("status_code") if result else None
+                )
+    
+    def _attempt_started(self, trace, provider_name, model_name):
+        """Count an attempt towards its call and open its hook context"""
+        if trace is None:
+            return self.hooks.attempt_started(provider_name, model_name, None)
+        trace.attempts += 1
+        return self.hooks.attempt_started(provider_name, model_name, trace.context)
+    
+    async def _try_candidates(self, prompt, candidates, options, deadline=None):
+        """Try candidates in order until one succeeds
+        
+        Returns a tuple of (result or None, list of error descriptions,
+        whether any candidate was attempted).
+        """
+        if deadline is not None:
+            candidates = self._filter_deadline(candidates, deadline)
+        
+        if options.get("hedge"):
+            return await self._try_candidates_hedged(prompt, candidates, options, deadline)
+        
+        errors = []
+        attempted = False
+        
+        for provider_name, model_name in candidates:
+            attempted = True
+            result, error = await self._attempt(provider_name, model_name, prompt, options, deadline)
+            if result is not None:
+                return result, errors, attempted
+            errors.append(error)
+        
+        return None, errors, attempted
+    
+    def _hedge_delay(self, provider_name, model_name, options):
+        """Seconds to wait on a candidate before starting a backup request
+        
+        Uses the ``hedge_after`` option when it is a number, otherwise the
+        candidate's observed p95 latency.
+        """
+        hedge_after = options.get("hedge_after", "p95")
+        if not isinstance(hedge_after, str):
+            return hedge_after
+        
+        stats = self.get_latency_stats(provider_name, model_name)
+        if stats is None:
+            return DEFAULT_HEDGE_DELAY
+        return stats.percentile(float(hedge_after.lstrip("p")))
+    
+    async def _try_candidates_hedged(self, prompt, candidates, options, deadline=None):
+        """Try candidates in order, racing a backup when the current one is slow
+        
+        If no candidate has answered within its hedge delay, the next one is
+        started alongside it (up to ``hedge_max_parallel`` at once, 2 by
+        default). The first success wins and the others are cancelled. A
+        failure starts the next candidate straight away, as in the sequential
+        path. Every request made, including backups, takes a rate limit slot.
+        """
+        max_parallel = options.get("hedge_max_parallel", 2)
+        candidates = iter(candidates)
+        pending = {}  # task: (provider_name, model_name)
+        errors = []
+        attempted = False
+        exhausted = False
+        hedged = False
+        
+        def start_next():
+            nonlocal attempted, exhausted
+            for provider_name, model_name in candidates:
+                attempted = True
+                task = asyncio.ensure_future(self._attempt(provider_name, model_name, prompt, options, deadline))
+                pending[task] = (provider_name, model_name)
+                return task
+            exhausted = True
+            return None
+        
+        try:
+            latest = start_next()
+            while pending:
+                timeout = None
+                if not exhausted and len(pending) < max_parallel:
+                    timeout = self._hedge_delay(*pending[latest], options)
                 
-                if "error" in result:
-                    self._update_provider_health(best_provider.name, False, result["error"])
-                    errors.append(f"{best_provider.name}/{best_model}: {result['error']}")
-                    
-                    # Rate limit errors should be handled specially
-                    if result["error"] == "rate_limit_exceeded":
-                        logger.info(f"Rate limit exceeded for {best_provider.name}, trying next model")
-                        continue
-                else:
-                    self._update_provider_health(best_provider.name, True)
-                    return result
-            except Exception as e:
-                self._update_provider_health(best_provider.name, False, str(e))
-                errors.append(f"{best_provider.name}/{best_model}: {str(e)}")
-                logger.exception(f"Error generating with {best_provider.name}: {e}")
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                
+                if not done:
+                    # The latest candidate is slow, start a backup next to it
+                    logger.info("Hedging %s/%s after %.2fs", pending[latest][0], pending[latest][1], timeout)
+                    backup = start_next()
+                    if backup is not None:
+                        hedged = True
+                        latest = backup
+                    continue
+                
+                for task in done:
+                    del pending[task]
+                    result, error = task.result()
+                    if result is not None:
+                        result["hedged"] = hedged
+                        return result, errors, attempted
+                    errors.append(error)
+                
+                # Replace the failed attempts with the next candidate
+                latest = start_next() or latest
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        
+        return None, errors, attempted
+    
+    async def _generate_with_model(self, prompt, model_name, options, deadline=None):
+        """Generate with a specific model, trying providers in order of preference"""
+        if model_name not in self.model_map:
+            return {"error": f"Model {model_name} not available"}
+        
+        tokens = estimate_request_tokens(prompt, options)
+        prefer = self._resolve_prefer(options)
+        if self.hooks is not None:
+            self._trace_routing(_current_request.get(), model_name, tokens, prefer)
+        result, errors, attempted = await self._try_candidates(
+            prompt, self._iter_candidates(model_name, tokens, prefer), options, deadline
+        )
+        if result is not None:
+            return result
+        
+        if deadline is not None and (deadline.expired() or deadline.skipped):
+            return deadline.error(errors)
+        
+        if not attempted:
+            # Every provider is rate limited, circuit-broken or at its concurrency limit
+            return {"error": f"No available providers for model {model_name}"}
+        
+        return {
+            "error": f"All providers for model {model_name} failed or unavailable",
+            "details": errors
+        }
+    
+    async def _generate_with_best_model(self, prompt, options, deadline=None):
+        """Generate using the best available model across all providers"""
+        tokens = estimate_request_tokens(prompt, options)
+        prefer = self._resolve_prefer(options)
+        if self.hooks is not None:
+            self._trace_routing(_current_request.get(), None, tokens, prefer)
+        result, errors, attempted = await self._try_candidates(
+            prompt, self._iter_candidates(None, tokens, prefer), options, deadline
+        )
+        if result is not None:
+            return result
+        
+        if deadline is not None and (deadline.expired() or deadline.skipped):
+            return deadline.error(errors)
+        
+        if not attempted:
+            return {"error": "No available providers"}
         
         return {
             "error": "All models and providers failed",
             "details": errors
-        }
\ No newline at end of file
+        }
@@ -0,0 +1,175 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+from .latency import LatencyStats
+
+# Priority classes, lower is served first
+PRIORITIES = {"interactive": 0, "default": 1, "batch": 2}
+
+# Seconds between admission rounds while capacity is being handed out
+ADMIT_RECHECK_INTERVAL = 0.01
+
+class _Waiter:
+    __slots__ = ("priority", "sequence", "model_name", "tokens", "expires_at", "enqueued", "future")
+    
+    def __init__(self, priority, sequence, model_name, tokens, expires_at, enqueued, future):
+        self.priority = priority
+        self.sequence = sequence
+        self.model_name = model_name
+        self.tokens = tokens
+        self.expires_at = expires_at
+        self.enqueued = enqueued
+        self.future = future
+    
+    def __lt__(self, other):
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+class AdmissionQueue:
+    """Holds requests until a suitable provider has capacity, instead of failing them
+    
+    Waiters are served by priority class (interactive before default before
+    batch), first come first served within a class. A background task
+    checks the waiters whenever one is added and whenever the earliest
+    rate limit window or circuit cooldown is due to open. It admits as many
+    as the providers' remaining capacity allows. Waiters whose deadline
+    passes are dropped.
+    """
+    
+    def __init__(self, max_wait=30.0, max_depth=None, poll_interval=1.0, clock=time.monotonic):
+        self.max_wait = max_wait
+        self.max_depth = max_depth
+        self.poll_interval = poll_interval
+        self.clock = clock
+        
+        self._waiters = []  # heap of _Waiter
+        self._sequence = itertools.count()
+        self._wakeup = None
+        self._pump_task = None
+        
+        self.admitted = 0
+        self.expired = 0
+        self.rejected = 0
+        self.wait_stats = LatencyStats()
+    
+    @property
+    def depth(self):
+        """Number of requests currently waiting"""
+        return sum(1 for waiter in self._waiters if not waiter.future.done())
+    
+    def depth_by_priority(self):
+        depths = {}
+        for waiter in self._waiters:
+            if not waiter.future.done():
+                depths[waiter.priority] = depths.get(waiter.priority, 0) + 1
+        return depths
+    
+    @staticmethod
+    def resolve_priority(priority):
+        """Map a priority class name (or a number) to its numeric priority"""
+        if priority is None:
+            return PRIORITIES["default"]
+        if isinstance(priority, str):
+            return PRIORITIES[priority]
+        return priority
+    
+    async def wait(self, router, model_name=None, tokens=0, priority=None, timeout=None):
+        """Wait until the router can dispatch a request of this size
+        
+        Returns True once admitted, or False if ``timeout`` (default
+        ``max_wait``) seconds pass first or the queue is full.
+        """
+        priority = self.resolve_priority(priority)
+        now = self.clock()
+        
+        # Fast path: nobody of the same or higher priority waiting and capacity available
+        if not any(w.priority <= priority for w in self._waiters if not w.future.done()):
+            if router.time_until_capacity(model_name, tokens) == 0:
+                self.admitted += 1
+                self.wait_stats.record(0.0)
+                return True
+        
+        if self.max_depth is not None and self.depth >= self.max_depth:
+            self.rejected += 1
+            return False
+        
+        timeout = self.max_wait if timeout is None else timeout
+        waiter = _Waiter(
+            priority, next(self._sequence), model_name, tokens, now + timeout, now,
+            asyncio.get_event_loop().create_future()
+        )
+        heapq.heappush(self._waiters, waiter)
+        self._ensure_pump(router)
+        self._wakeup.set()
+        
+        try:
+            return await waiter.future
+        finally:
+            if not waiter.future.done():
+                # The caller was cancelled, leave its place in the queue
+                waiter.future.cancel()
+    
+    def _ensure_pump(self, router):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.ensure_future(self._pump(router))
+    
+    def _settle(self, waiter, admitted, now):
+        if admitted:
+            self.admitted += 1
+        else:
+            self.expired += 1
+        self.wait_stats.record(now - waiter.enqueued)
+        waiter.future.set_result(admitted)
+    
+    async def _pump(self, router):
+        while self._waiters:
+            self._wakeup.clear()
+            now = self.clock()
+            next_check = self.poll_interval
+            budget = router.remaining_capacity()
+            remaining = []
+            waits = {}  # (model_name, tokens): seconds, waiters mostly share a few of these
+            
+            for waiter in sorted(self._waiters):
+                if waiter.future.done():
+                    continue
+                if waiter.expires_at <= now:
+                    self._settle(waiter, False, now)
+                    continue
+                
+                shape = (waiter.model_name, waiter.tokens)
+                wait = waits.get(shape)
+                if wait is None:
+                    wait = waits[shape] = router.time_until_capacity(waiter.model_name, waiter.tokens)
+                if wait == 0 and budget > 0:
+                    budget -= 1
+                    self._settle(waiter, True, now)
+                    continue
+                
+                remaining.append(waiter)
+                # With capacity but no budget left this round, look again right after the admitted requests
+                next_check = min(next_check, waiter.expires_at - now, wait if wait > 0 else ADMIT_RECHECK_INTERVAL)
+            
+            heapq.heapify(remaining)
+            self._waiters = remaining
+            if not remaining:
+                break
+            
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(next_check, 0.001))
+            except asyncio.TimeoutError:
+                pass
+    
+    def stats(self):
+        """Return queue depth, admission counters and wait time statistics"""
+        return {
+            "depth": self.depth,
+            "depth_by_priority": self.depth_by_priority(),
+            "admitted": self.admitted,
+            "expired": self.expired,
+            "rejected": self.rejected,
+            "wait": self.wait_stats.to_dict()
+        }
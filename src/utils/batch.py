@@ -0,0 +1,231 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+from .tokens import estimate_request_tokens
+
+logger = logging.getLogger("llm_router")
+
+# Error fragments that mean "no capacity right now" rather than a real failure
+THROTTLE_MARKERS = ("rate_limit_exceeded", "circuit open", "concurrency limit reached", "No available providers")
+
+def is_throttled(result):
+    """Check if a failed result was caused by exhausted quota rather than a real error"""
+    error = result.get("error")
+    if error is None:
+        return False
+    if any(marker in error for marker in THROTTLE_MARKERS):
+        return True
+    
+    details = result.get("details")
+    return bool(details) and all(
+        any(marker in detail for marker in THROTTLE_MARKERS) for detail in details
+    )
+
+class BatchItem:
+    """One prompt of a batch and its retry state"""
+    
+    __slots__ = ("index", "prompt", "model_name", "options", "tokens", "attempts", "throttled")
+    
+    def __init__(self, index, prompt, model_name, options):
+        self.index = index
+        self.prompt = prompt
+        self.model_name = model_name
+        self.options = options
+        self.tokens = estimate_request_tokens(prompt, options)
+        self.attempts = 0
+        self.throttled = 0
+
+class BatchScheduler:
+    """Quota-aware scheduler behind ``LLMRouter.generate_many``
+    
+    Keeps at most ``concurrency`` prompts in flight and only dispatches while
+    some provider has capacity for them. Throttled prompts are requeued, other
+    failures retried up to ``max_retries`` times, and results yielded as they complete.
+    """
+    
+    def __init__(self, router, prompts, model_name=None, options=None, concurrency=16,
+                 max_retries=2, retry_backoff=1.0, max_wait=5.0, progress=None, progress_interval=1.0,
+                 clock=time.monotonic):
+        self.router = router
+        self.model_name = model_name
+        self.options = options or {}
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_wait = max_wait
+        self.progress = progress
+        self.progress_interval = progress_interval
+        self.clock = clock
+        
+        self._source = enumerate(prompts)
+        self._source_done = False
+        self._retries = []  # heap of (not_before, sequence, item)
+        self._sequence = itertools.count()
+        
+        self.total = 0
+        self.completed = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+        self.throttled = 0
+        self.in_flight = 0
+        self.started = None
+        self._last_progress = 0.0
+    
+    def _make_item(self, index, entry):
+        """Build a BatchItem from a prompt string or a dict with per-prompt overrides"""
+        if isinstance(entry, dict):
+            options = {**self.options, **entry.get("options", {})}
+            return BatchItem(index, entry["prompt"], entry.get("model_name", self.model_name), options)
+        return BatchItem(index, entry, self.model_name, self.options)
+    
+    def _next_item(self, now):
+        """Return the next item that is due, preferring retries, or None"""
+        if self._retries and self._retries[0][0] <= now:
+            return heapq.heappop(self._retries)[2]
+        
+        if self._source_done:
+            return None
+        
+        try:
+            index, entry = next(self._source)
+        except StopIteration:
+            self._source_done = True
+            return None
+        
+        self.total += 1
+        return self._make_item(index, entry)
+    
+    def _requeue(self, item, delay):
+        heapq.heappush(self._retries, (self.clock() + delay, next(self._sequence), item))
+    
+    def stats(self):
+        """Return progress and throughput counters"""
+        elapsed = self.clock() - self.started if self.started is not None else 0.0
+        return {
+            "total": self.total,
+            "completed": self.completed,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retried": self.retried,
+            "throttled": self.throttled,
+            "in_flight": self.in_flight,
+            "queued": len(self._retries),
+            "elapsed": elapsed,
+            "throughput": self.completed / elapsed if elapsed > 0 else 0.0
+        }
+    
+    def _report_progress(self, force=False):
+        if self.progress is None:
+            return
+        now = self.clock()
+        if force or now - self._last_progress >= self.progress_interval:
+            self._last_progress = now
+            self.progress(self.stats())
+    
+    async def _run_item(self, item):
+        item.attempts += 1
+        try:
+            result = await self.router.generate(item.prompt, item.model_name, item.options)
+        except Exception as e:
+            logger.exception("Batch item %s failed: %s", item.index, e)
+            result = {"error": str(e)}
+        return item, result
+    
+    def _handle_result(self, item, result):
+        """Return the result to yield, or None if the item was queued again"""
+        if "error" in result:
+            wait = self.router.time_until_capacity(item.model_name, item.tokens) if is_throttled(result) else None
+            if wait is not None and wait != float("inf"):
+                # Out of quota everywhere, wait for capacity instead of dropping it
+                item.throttled += 1
+                self.throttled += 1
+                self._requeue(item, min(max(wait, self.retry_backoff), self.max_wait))
+                return None
+            
+            # Capacity that never comes back isn't worth a retry either
+            if wait is None and item.attempts <= self.max_retries:
+                self.retried += 1
+                self._requeue(item, min(self.retry_backoff * 2 ** (item.attempts - 1), self.max_wait))
+                return None
+            
+            self.failed += 1
+        else:
+            self.succeeded += 1
+        
+        self.completed += 1
+        return {**result, "index": item.index, "attempts": item.attempts}
+    
+    async def run(self):
+        """Yield results as they complete"""
+        self.started = self.clock()
+        tasks = set()
+        held = None  # an item waiting for capacity
+        
+        try:
+            while True:
+                now = self.clock()
+                
+                # Start as many items as concurrency and provider capacity allow
+                budget = self.router.remaining_capacity()
+                wait = None
+                while len(tasks) < self.concurrency:
+                    if held is None:
+                        held = self._next_item(now)
+                    if held is None:
+                        break
+                    
+                    item_wait = self.router.time_until_capacity(held.model_name, held.tokens)
+                    if item_wait == float("inf"):
+                        # No provider will ever take it; the router fails it without a request
+                        tasks.add(asyncio.ensure_future(self._run_item(held)))
+                        held = None
+                        continue
+                    if budget <= 0:
+                        break
+                    if item_wait > 0:
+                        wait = item_wait
+                        break
+                    
+                    tasks.add(asyncio.ensure_future(self._run_item(held)))
+                    held = None
+                    budget -= 1
+                
+                self.in_flight = len(tasks)
+                if not tasks and held is None and not self._retries and self._source_done:
+                    break
+                
+                # Sleep until a request finishes, a retry is due or capacity frees up
+                timeouts = [self.max_wait]
+                if wait is not None:
+                    timeouts.append(wait)
+                if self._retries:
+                    timeouts.append(max(self._retries[0][0] - now, 0.0))
+                if budget <= 0 and not tasks:
+                    timeouts.append(self.retry_backoff)
+                timeout = max(min(timeouts), 0.001)
+                
+                if tasks:
+                    done, tasks = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                else:
+                    done = ()
+                    await asyncio.sleep(timeout)
+                
+                for task in done:
+                    item, result = task.result()
+                    output = self._handle_result(item, result)
+                    if output is not None:
+                        yield output
+                
+                self.in_flight = len(tasks)
+                self._report_progress()
+        finally:
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            self.in_flight = 0
+            self._report_progress(force=True)
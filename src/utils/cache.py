@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Request options that change the response and therefore belong in the cache key
+CACHE_KEY_OPTIONS = ("system_message", "max_tokens", "temperature")
+
+# Result fields that describe how one call was served, not the response, so they aren't cached
+PER_CALL_FIELDS = ("cached", "coalesced", "hedged", "semantic")
+
+def encode_response(response):
+    """JSON-encode a response for caching, without its per-call fields"""
+    if isinstance(response, dict):
+        response = {name: value for name, value in response.items() if name not in PER_CALL_FIELDS}
+    return json.dumps(response)
+
+def make_cache_key(prompt, model_name, options):
+    """Build a stable cache key from everything that determines the response"""
+    key_data = {
+        "prompt": prompt,
+        "model": model_name,
+        "options": {name: options.get(name) for name in CACHE_KEY_OPTIONS}
+    }
+    encoded = json.dumps(key_data, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+class SQLiteCacheStore:
+    """Persistent cache tier backed by a local SQLite file, survives restarts
+    
+    A lookup that finds the file locked by another process for longer than
+    ``busy_timeout`` counts as a miss and a write is dropped, so the event
+    loop never waits on the cache. The connection is reopened after a fork.
+    """
+    
+    # Expired rows are purged every this many writes
+    PRUNE_INTERVAL = 256
+    
+    def __init__(self, path, clock=time.time, busy_timeout=0.05):
+        self.path = str(path)
+        self.clock = clock
+        self.busy_timeout = busy_timeout
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = None
+        self._pid = None
+    
+    @property
+    def connection(self):
+        if self._conn is None or self._pid != os.getpid():
+            import sqlite3  # deferred, most processes never use the persistent tier
+            
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+    
+    def _run(self, fn, default=None):
+        """Run ``fn(connection)``, or return ``default`` if the file stays locked"""
+        import sqlite3
+        
+        with self._lock:
+            conn = self.connection
+            try:
+                return fn(conn)
+            except sqlite3.OperationalError:
+                conn.rollback()
+                return default
+    
+    def get(self, key):
+        """Return the cached value, or None if missing or expired"""
+        row = self._run(lambda conn: conn.execute(
+            "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+        ).fetchone())
+        
+        if row is None or row[1] <= self.clock():
+            return None
+        return json.loads(row[0]), row[1]
+    
+    def set(self, key, value, expires_at):
+        def store(conn):
+            conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at)
+            )
+            self._writes += 1
+            if self._writes % self.PRUNE_INTERVAL == 0:
+                conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (self.clock(),))
+            conn.commit()
+        self._run(store)
+    
+    def delete(self, key):
+        def delete(conn):
+            conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+            conn.commit()
+        self._run(delete)
+    
+    def clear(self):
+        def clear(conn):
+            conn.execute("DELETE FROM response_cache")
+            conn.commit()
+        self._run(clear)
+    
+    def close(self):
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+class ResponseCache:
+    """Response cache with an in-memory LRU tier and an optional persistent tier
+    
+    The memory tier is bounded by entry count and by encoded size. Entries are
+    kept JSON-encoded, so every hit is a fresh copy.
+    """
+    
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024, ttl=3600, persistent=None,
+                 clock=time.time):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.persistent = persistent
+        self.clock = clock
+        
+        self._entries = OrderedDict()  # key: (expires_at, encoded value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key):
+        """Return a cached response, or None on a miss"""
+        now = self.clock()
+        encoded = None
+        
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    encoded = entry[1]
+                else:
+                    self._remove(key)
+        
+        if encoded is not None:
+            return json.loads(encoded)
+        
+        if self.persistent is not None:
+            stored = self.persistent.get(key)
+            if stored is not None:
+                value, expires_at = stored
+                encoded = encode_response(value)
+                self._store(key, encoded, expires_at)
+                with self._lock:
+                    self.hits += 1
+                    self.persistent_hits += 1
+                return json.loads(encoded)
+        
+        with self._lock:
+            self.misses += 1
+        return None
+    
+    def set(self, key, value, ttl=None):
+        """Cache a response in memory and, if configured, in the persistent tier"""
+        expires_at = self.clock() + (self.ttl if ttl is None else ttl)
+        encoded = encode_response(value)
+        self._store(key, encoded, expires_at)
+        if self.persistent is not None:
+            self.persistent.set(key, json.loads(encoded), expires_at)
+    
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+        if self.persistent is not None:
+            self.persistent.delete(key)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.persistent is not None:
+            self.persistent.clear()
+    
+    def _store(self, key, encoded, expires_at):
+        if len(encoded) > self.max_bytes:
+            return
+        
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (expires_at, encoded)
+            self._bytes += len(encoded)
+            
+            # Evict least recently used entries until both limits hold
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+    
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+    
+    def stats(self):
+        """Return hit/miss counters and current memory usage"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes
+            }
@@ -0,0 +1,190 @@
+import asyncio
+import hashlib
+import itertools
+import json
+import logging
+import threading
+import time
+
+from .metrics import RouterHooks
+from .tokens import estimate_request_tokens
+
+logger = logging.getLogger("llm_router")
+
+# Request options kept in the capture, enough to replay the routing decision
+CAPTURED_OPTIONS = (
+    "prefer", "max_tokens", "temperature", "priority", "timeout", "timeout_total",
+    "hedge", "hedge_after", "hedge_max_parallel", "queue", "cache", "coalesce"
+)
+
+def hash_text(text):
+    """Stable digest that identifies a prompt without storing it"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+class TrafficCapture(RouterHooks):
+    """Append-only JSONL capture of routing decisions, written in batches off the request path
+    
+    Each router call becomes one ``request`` record with its candidates and
+    attempts. A full buffer drops records (counted in ``dropped``) instead of
+    slowing requests down. ``benchmarks.replay`` replays the file.
+    """
+    
+    wants_candidates = True
+    
+    def __init__(self, path, store_prompts=False, batch_size=256, flush_interval=1.0, max_buffer=100000,
+                 clock=time.time):
+        self.path = str(path)
+        self.store_prompts = store_prompts
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.clock = clock
+        
+        self._buffer = []
+        self._sequence = itertools.count(1)
+        self._file_lock = threading.Lock()
+        self._wakeup = None
+        self._writer_task = None
+        
+        self.written = 0
+        self.dropped = 0
+    
+    def request_started(self, model_name, prompt, options, stream):
+        record = {
+            "type": "request",
+            "id": next(self._sequence),
+            "timestamp": self.clock(),
+            "model": model_name,
+            "stream": stream,
+            "prompt_sha256": hash_text(prompt),
+            "prompt_tokens": estimate_request_tokens(prompt, {**options, "max_tokens": 0}),
+            "options": {name: options[name] for name in CAPTURED_OPTIONS if name in options},
+            "candidates": None,
+            "attempts": []
+        }
+        if "system_message" in options:
+            record["system_sha256"] = hash_text(options["system_message"])
+        if self.store_prompts:
+            record["prompt"] = prompt
+            if "system_message" in options:
+                record["system_message"] = options["system_message"]
+        return record
+    
+    def routing_decision(self, record, candidates):
+        # The latest decision wins when a request waited in the admission queue and was routed again
+        record["candidates"] = [
+            [provider_name, model_name, round(score, 3), available]
+            for provider_name, model_name, score, available in candidates
+        ]
+    
+    def attempt_started(self, provider_name, model_name, parent):
+        if parent is None:
+            return None
+        attempt = {
+            "provider": provider_name,
+            "model": model_name,
+            "start": round(self.clock() - parent["timestamp"], 4)
+        }
+        parent["attempts"].append(attempt)
+        return attempt
+    
+    def attempt_finished(self, attempt, provider_name, model_name, outcome, latency, tokens, status_code=None):
+        if attempt is None:
+            return
+        attempt["latency"] = round(latency, 4)
+        attempt["outcome"] = outcome
+        if status_code is not None:
+            attempt["status"] = status_code
+        if tokens:
+            attempt["tokens"] = tokens
+    
+    def request_finished(self, record, model_name, outcome, latency, fallbacks):
+        record["outcome"] = outcome
+        record["latency"] = round(latency, 4)
+        record["fallbacks"] = fallbacks
+        for attempt in record["attempts"]:
+            if attempt.get("outcome") == "success" and attempt.get("tokens"):
+                record["completion_tokens"] = max(attempt["tokens"] - record["prompt_tokens"], 0)
+        self._append(record)
+    
+    def record_config(self, router):
+        """Capture the providers, models and rate limits the router is using
+        
+        Replays build their providers from the latest config record, so call
+        this after creating the router and after changing its providers.
+        """
+        self._append({
+            "type": "config",
+            "timestamp": self.clock(),
+            "providers": {
+                provider_name: {
+                    "models": dict(provider.available_models),
+                    "rate_limits": provider.get_rate_limit_info(),
+                    "keys": len(provider.key_pool)
+                }
+                for provider_name, provider in router.providers.items()
+            }
+        })
+    
+    def _append(self, record):
+        if len(self._buffer) >= self.max_buffer:
+            self.dropped += 1
+            return
+        self._buffer.append(record)
+        
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return  # written by the next flush inside the event loop, or by close()
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._writer_task is None or self._writer_task.done():
+            self._writer_task = asyncio.ensure_future(self._write_loop())
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+    
+    async def _write_loop(self):
+        while self._buffer:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+    
+    async def flush(self):
+        """Write the buffered records now"""
+        batch, self._buffer = self._buffer, []
+        if batch:
+            await asyncio.get_running_loop().run_in_executor(None, self._write, batch)
+    
+    def _write(self, batch):
+        data = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in batch)
+        try:
+            with self._file_lock, open(self.path, "a") as f:
+                f.write(data)
+        except OSError as e:
+            logger.warning("Dropping %s captured records, writing %s failed: %s", len(batch), self.path, e)
+            self.dropped += len(batch)
+            return
+        self.written += len(batch)
+    
+    async def aclose(self):
+        """Stop the background writer and write what is left"""
+        if self._writer_task is not None:
+            self._writer_task.cancel()
+            try:
+                await self._writer_task
+            except asyncio.CancelledError:
+                pass
+            self._writer_task = None
+        await self.flush()
+    
+    def close(self):
+        """Write what is left synchronously, for use outside the event loop"""
+        batch, self._buffer = self._buffer, []
+        if batch:
+            self._write(batch)
+    
+    def stats(self):
+        return {"buffered": len(self._buffer), "written": self.written, "dropped": self.dropped}
@@ -0,0 +1,160 @@
+import asyncio
+import fnmatch
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger("llm_router")
+
+SNAPSHOT_VERSION = 1
+
+def merge_models(configured, discovered, default_score=1, include=None, exclude=()):
+    """Merge the models a provider lists with the scores from its config
+    
+    Configured models keep their score while the provider still lists them
+    and are dropped once it stops. Newly listed models are only added when
+    they match one of the ``include`` patterns and none of the ``exclude``
+    patterns; without ``include`` the provider keeps to its configured
+    models, since /models also lists embedding, speech and guard models.
+    """
+    models = {}
+    for model_name in discovered:
+        if model_name in configured:
+            models[model_name] = configured[model_name]
+        elif include and any(fnmatch.fnmatchcase(model_name, pattern) for pattern in include) \
+                and not any(fnmatch.fnmatchcase(model_name, pattern) for pattern in exclude):
+            models[model_name] = default_score
+    return models
+
+class ModelCatalog:
+    """Keeps the router's models in line with what providers actually serve
+    
+    Model lists are merged with the configured scores (see ``merge_models``)
+    and saved to a JSON snapshot at ``path``; a snapshot younger than ``ttl``
+    seconds spares a cold start any network I/O.
+    """
+    
+    def __init__(self, path="model_catalog.json", ttl=3600.0, default_score=1, clock=time.time):
+        self.path = str(path)
+        self.ttl = ttl
+        self.default_score = default_score
+        self.clock = clock
+        
+        self.discovered = {}  # provider_name: {"base_url", "models": listed model ids}
+        self.fetched_at = None
+        self.router = None
+        self._task = None
+        self.refreshes = 0
+        self.errors = 0
+    
+    def load_snapshot(self):
+        """Read the snapshot; returns None if it is missing or unreadable"""
+        try:
+            with open(self.path) as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable model catalog snapshot %s: %s", self.path, e)
+            return None
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            return None
+        return snapshot
+    
+    def save_snapshot(self):
+        """Write the snapshot atomically, so other processes never read half of it"""
+        snapshot = {"version": SNAPSHOT_VERSION, "fetched_at": self.fetched_at, "providers": self.discovered}
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(snapshot, f, indent=2)
+        os.replace(temp_path, self.path)
+    
+    def is_fresh(self):
+        return self.fetched_at is not None and self.clock() - self.fetched_at < self.ttl
+    
+    def models_for(self, provider):
+        """The merged models of a provider, or None to keep its configured models"""
+        discovery = provider.config.get("discovery") or {}
+        listed = self.discovered.get(provider.name)
+        if not discovery.get("enabled", True) or listed is None or listed.get("base_url") != provider.base_url:
+            return None
+        if not listed["models"]:
+            return None  # an empty list is more likely a broken endpoint than a provider without models
+        return merge_models(
+            provider.config.get("models", {}), listed["models"],
+            discovery.get("default_score", self.default_score), discovery.get("include"), discovery.get("exclude", ())
+        )
+    
+    def apply(self, router):
+        """Update the router's models from the discovered lists"""
+        for provider_name, provider in list(router.providers.items()):
+            models = self.models_for(provider)
+            if models is not None:
+                router.set_provider_models(provider_name, models)
+    
+    async def attach(self, router):
+        """Apply the snapshot to a router and keep its models refreshed in the background"""
+        self.router = router
+        snapshot = await asyncio.get_running_loop().run_in_executor(None, self.load_snapshot)
+        if snapshot is not None:
+            self.discovered = snapshot["providers"]
+            self.fetched_at = snapshot["fetched_at"]
+            self.apply(router)
+        
+        delay = max(self.fetched_at + self.ttl - self.clock(), 0.0) if self.is_fresh() else 0.0
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._refresh_loop(delay))
+    
+    async def _refresh_loop(self, delay):
+        while True:
+            await asyncio.sleep(delay)
+            delay = self.ttl
+            try:
+                await self.refresh()
+            except Exception as e:
+                self.errors += 1
+                logger.exception("Refreshing the model catalog failed: %s", e)
+    
+    async def refresh(self):
+        """Query every provider's model list now, save the snapshot and apply it"""
+        router = self.router
+        providers = [
+            provider for provider in router.providers.values()
+            if (provider.config.get("discovery") or {}).get("enabled", True)
+        ]
+        results = await asyncio.gather(*(provider.list_models() for provider in providers), return_exceptions=True)
+        
+        for provider, models in zip(providers, results):
+            if isinstance(models, BaseException):
+                # Keep the previous list; an unreachable endpoint says nothing about the models
+                self.errors += 1
+                logger.warning("Listing models of %s failed: %s", provider.name, models)
+            elif models is not None:
+                self.discovered[provider.name] = {"base_url": provider.base_url, "models": sorted(models)}
+        
+        self.fetched_at = self.clock()
+        self.refreshes += 1
+        self.apply(router)
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.save_snapshot)
+        except OSError as e:
+            logger.warning("Could not save the model catalog snapshot %s: %s", self.path, e)
+    
+    async def aclose(self):
+        """Stop the background refresh"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    def stats(self):
+        return {
+            "providers": {name: len(listed["models"]) for name, listed in self.discovered.items()},
+            "age": None if self.fetched_at is None else self.clock() - self.fetched_at,
+            "refreshes": self.refreshes,
+            "errors": self.errors,
+        }
@@ -0,0 +1,161 @@
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitBreaker:
+    """Closed / open / half-open circuit breaker
+    
+    The circuit opens after ``failure_threshold`` consecutive failures, or
+    immediately when tripped with an explicit cooldown (e.g. from a 429's
+    Retry-After header). While open, requests are refused without any I/O.
+    Once the cooldown has passed the circuit is half-open and lets exactly
+    one probe through: success closes it, failure opens it again with a
+    doubled cooldown (capped at ``max_recovery_timeout``).
+    """
+    
+    def __init__(self, failure_threshold=5, recovery_timeout=30.0, max_recovery_timeout=300.0,
+                 clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.max_recovery_timeout = max_recovery_timeout
+        self.clock = clock
+        
+        self.failures = 0
+        self.opened_until = 0.0
+        self.cooldown = recovery_timeout
+        self.probe_in_flight = False
+        self._state = CLOSED
+    
+    @property
+    def state(self):
+        """Current state; an open circuit turns half-open once its cooldown ends"""
+        if self._state == OPEN and self.clock() >= self.opened_until:
+            self._state = HALF_OPEN
+            self.probe_in_flight = False
+        return self._state
+    
+    def is_available(self):
+        """Check whether a request would be let through, without claiming it"""
+        state = self.state
+        if state == CLOSED:
+            return True
+        return state == HALF_OPEN and not self.probe_in_flight
+    
+    def allow_request(self):
+        """Claim permission for a request; in half-open only one probe gets it"""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+        return False
+    
+    def release(self):
+        """Give back a claimed probe without an outcome, e.g. when it was cancelled"""
+        self.probe_in_flight = False
+    
+    def record_success(self):
+        self._state = CLOSED
+        self.failures = 0
+        self.cooldown = self.recovery_timeout
+        self.probe_in_flight = False
+    
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN:
+            # The probe failed, back off further
+            self._open(min(self.cooldown * 2, self.max_recovery_timeout))
+        elif self.failures >= self.failure_threshold:
+            self._open(self.recovery_timeout)
+    
+    def trip(self, cooldown):
+        """Open the circuit right away for the given number of seconds"""
+        self.failures += 1
+        self._open(cooldown)
+    
+    def _open(self, cooldown):
+        self._state = OPEN
+        self.cooldown = cooldown
+        self.opened_until = self.clock() + cooldown
+        self.probe_in_flight = False
+    
+    def retry_in(self):
+        """Seconds until the circuit lets a probe through (0 if it does now)"""
+        if self.state != OPEN:
+            return 0.0
+        return max(self.opened_until - self.clock(), 0.0)
+    
+    def to_dict(self):
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "retry_in": self.retry_in()
+        }
+
+class SharedCircuitBreaker(CircuitBreaker):
+    """Circuit breaker whose state lives in a StateBackend, shared between processes
+    
+    Every transition is written through to the backend, and the shared state
+    is read back at most every ``sync_interval`` seconds, so a 429 seen by
+    one worker opens the circuit in all of them. Each process still sends
+    its own half-open probe, and concurrent updates are last-writer-wins.
+    """
+    
+    def __init__(self, backend, key, sync_interval=0.5, clock=time.time, **options):
+        super().__init__(clock=clock, **options)
+        self.backend = backend
+        self.key = key
+        self.sync_interval = sync_interval
+        self._synced_at = float('-inf')
+        self._seen = None  # last shared state applied or written by this process
+    
+    def _sync(self):
+        now = self.clock()
+        if now - self._synced_at < self.sync_interval:
+            return
+        self._synced_at = now
+        
+        shared = self.backend.get_state(self.key)
+        if shared is None or shared == self._seen:
+            return
+        self._seen = shared
+        self._state = shared["state"]
+        self.failures = shared["failures"]
+        self.opened_until = shared["opened_until"]
+        self.cooldown = shared["cooldown"]
+    
+    def _save(self):
+        self._seen = {
+            "state": self._state,
+            "failures": self.failures,
+            "opened_until": self.opened_until,
+            "cooldown": self.cooldown
+        }
+        self._synced_at = self.clock()
+        self.backend.set_state(self.key, self._seen)
+    
+    @property
+    def state(self):
+        self._sync()
+        return CircuitBreaker.state.fget(self)
+    
+    def record_success(self):
+        self._sync()
+        changed = self._state != CLOSED or self.failures
+        super().record_success()
+        if changed:
+            # Successes on a healthy circuit are the common case and need no write
+            self._save()
+    
+    def record_failure(self):
+        self._sync()
+        super().record_failure()
+        self._save()
+    
+    def trip(self, cooldown):
+        self._sync()
+        super().trip(cooldown)
+        self._save()
@@ -0,0 +1,112 @@
+import time
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD limit on the number of requests in flight to one provider
+    
+    The limit grows while it is in use and shrinks by ``decrease_factor`` on
+    429s, 503s, timeouts and rising latency, at most once per
+    ``backoff_interval`` and never below ``min_limit``.
+    """
+    
+    def __init__(self, initial_limit=20, min_limit=None, max_limit=200, increase=1.0, decrease_factor=0.5,
+                 latency_tolerance=2.0, alpha=0.1, backoff_interval=1.0, clock=time.monotonic):
+        if min_limit is None:
+            min_limit = max(min(initial_limit, max_limit) // 4, 1)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.alpha = alpha
+        self.backoff_interval = backoff_interval
+        self.clock = clock
+        
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self.in_flight = 0
+        self.latency_ewma = None
+        self.baseline = None  # lowest smoothed latency seen, drifting up slowly
+        self._decreased_at = float('-inf')
+        
+        self.increases = 0
+        self.decreases = 0
+    
+    @property
+    def limit(self):
+        return int(self._limit)
+    
+    def available(self):
+        """Number of free slots"""
+        return max(self.limit - self.in_flight, 0)
+    
+    def is_available(self):
+        """Check whether a request would get a slot, without claiming it"""
+        return self.in_flight < self.limit
+    
+    def try_acquire(self):
+        """Claim a slot for one request; returns False if the limit is reached"""
+        if self.in_flight >= self.limit:
+            return False
+        self.in_flight += 1
+        return True
+    
+    def release(self):
+        """Give back a slot without adjusting the limit (cancelled, or not the provider's fault)"""
+        self.in_flight = max(self.in_flight - 1, 0)
+    
+    def record_success(self, latency=None):
+        """Give back a slot after a successful request and adapt the limit"""
+        in_flight = self.in_flight
+        self.release()
+        
+        if latency is not None and self._record_latency(latency):
+            self._decrease()
+        elif in_flight * 2 >= self.limit:
+            # Only grow while the limit is what holds traffic back
+            self._limit = min(self._limit + self.increase / self._limit, self.max_limit)
+            self.increases += 1
+    
+    def record_overload(self):
+        """Give back a slot after a 429, 503 or timeout and shrink the limit"""
+        self.release()
+        self._decrease()
+    
+    def _record_latency(self, latency):
+        """Update the latency estimates; returns True if latency signals congestion"""
+        if self.latency_ewma is None:
+            self.latency_ewma = self.baseline = latency
+            return False
+        
+        self.latency_ewma += self.alpha * (latency - self.latency_ewma)
+        if self.latency_ewma < self.baseline:
+            self.baseline = self.latency_ewma
+        else:
+            # Let a lasting shift in the provider's latency become the new normal
+            self.baseline += 0.01 * (self.latency_ewma - self.baseline)
+        return self.latency_ewma > self.baseline * self.latency_tolerance
+    
+    def _decrease(self):
+        now = self.clock()
+        if now - self._decreased_at < self.backoff_interval:
+            return
+        self._decreased_at = now
+        self._limit = max(self._limit * self.decrease_factor, self.min_limit)
+        self.decreases += 1
+    
+    def retry_in(self):
+        """Rough seconds until a slot frees up (0 if one is free now)"""
+        if self.is_available():
+            return 0.0
+        if self.latency_ewma is None:
+            return 0.1
+        # Assume in-flight requests finish evenly spread over one latency
+        return self.latency_ewma / max(self.in_flight, 1)
+    
+    def to_dict(self):
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "latency_ewma": self.latency_ewma,
+            "baseline": self.baseline,
+            "increases": self.increases,
+            "decreases": self.decreases
+        }
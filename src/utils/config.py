@@ -1,30 +1,194 @@
-import yaml
+import asyncio
+import logging
 import os
+import threading
 from pathlib import Path
 
+logger = logging.getLogger("llm_router")
+
+# Environment variable that points at a providers.yaml (or a directory holding one)
+CONFIG_ENV_VAR = "LLM_ROUTER_CONFIG"
+
+CONFIG_FILENAME = "providers.yaml"
+
 def get_config_path():
-    """Get the path to the config directory"""
-    # Try to find config in various locations
-    possible_locations = [
-        Path.cwd() / "config",  # Current working directory
-        Path(__file__).parent.parent.parent / "config",  # Relative to this file
+    """Get the path to the directory holding providers.yaml"""
+    return find_config_file().parent
+
+def find_config_file():
+    """Find providers.yaml
+    
+    Looks at ``$LLM_ROUTER_CONFIG``, then a ``config`` directory in the
+    working directory or the project root, then the copy shipped next to
+    the providers.
+    """
+    possible_locations = []
+    if os.environ.get(CONFIG_ENV_VAR):
+        location = Path(os.environ[CONFIG_ENV_VAR])
+        possible_locations.append(location / CONFIG_FILENAME if location.is_dir() else location)
+    possible_locations += [
+        Path.cwd() / "config" / CONFIG_FILENAME,  # Current working directory
+        Path(__file__).parent.parent.parent / "config" / CONFIG_FILENAME,  # Project root
+        Path(__file__).parent.parent / "providers" / CONFIG_FILENAME,  # Shipped with the package
     ]
     
     for location in possible_locations:
-        if location.exists():
+        if location.is_file():
             return location
     
-    # If no config directory found, raise error
-    raise FileNotFoundError("Config directory not found")
+    raise FileNotFoundError(
+        f"Provider config not found, looked at: {', '.join(str(location) for location in possible_locations)}"
+    )
+
+class ConfigLoader:
+    """Parses providers.yaml once and hands out the cached result
+    
+    ``changed()`` compares the file's modification time and size with the
+    parsed version, so a watcher can poll cheaply. The parsed config is
+    shared, treat it as read-only.
+    """
+    
+    def __init__(self, path=None):
+        self._path = Path(path) if path is not None else None
+        self._lock = threading.Lock()
+        self._config = None
+        self._signature = None
+    
+    @property
+    def path(self):
+        if self._path is None:
+            self._path = find_config_file()
+        return self._path
+    
+    def _stat(self):
+        stat = self.path.stat()
+        return stat.st_mtime_ns, stat.st_size
+    
+    def load(self):
+        """Return the provider configs, parsing the file on first use"""
+        if self._config is None:
+            with self._lock:
+                if self._config is None:
+                    self.reload()
+        return self._config
+    
+    def reload(self):
+        """Parse the file again; a file that fails to parse raises and leaves the cache as it was"""
+        signature = self._stat()
+        import yaml  # only paid for when a config file is actually read
+        
+        try:
+            with open(self.path, "r") as f:
+                # The libyaml parser is several times faster where it is installed
+                config = yaml.load(f, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader)) or {}
+            providers = config.get("providers", {})
+            if not isinstance(providers, dict):
+                raise ValueError(f"'providers' in {self.path} must be a mapping")
+        except Exception:
+            # Don't retry the same broken file on every poll, wait for the next edit
+            self._signature = signature
+            raise
+        self._config = providers
+        self._signature = signature
+        return providers
+    
+    def changed(self):
+        """Check whether the file was modified since it was last parsed"""
+        try:
+            return self._signature is None or self._stat() != self._signature
+        except FileNotFoundError:
+            return False  # mid-rename by an editor or deploy, look again next time
+
+_default_loader = None
+
+def get_config_loader():
+    """Return the process-wide loader for the default providers.yaml"""
+    global _default_loader
+    if _default_loader is None:
+        _default_loader = ConfigLoader()
+    return _default_loader
 
 def load_provider_config():
-    """Load provider configuration from YAML file"""
-    config_path = get_config_path() / "providers.yaml"
+    """Load provider configuration from YAML file, parsed once per process"""
+    return get_config_loader().load()
+
+class ConfigWatcher:
+    """Applies changes of providers.yaml to a live router
+    
+    Polls the file's modification time every ``interval`` seconds (0 turns
+    polling off) and, if a signal such as ``signal.SIGHUP`` is given,
+    reloads when the process receives it. Changes go through
+    ``LLMRouter.reconfigure``, which keeps connection pools, health and rate
+    limit state. A file that fails to parse is logged and ignored.
+    """
+    
+    def __init__(self, router, loader=None, interval=5.0, signal=None):
+        self.router = router
+        self.loader = loader or get_config_loader()
+        self.interval = interval
+        self.signal = signal
+        self.reloads = 0
+        self.errors = 0
+        self._task = None
+        self._wakeup = None
+    
+    def start(self):
+        """Start watching; call from within the event loop"""
+        self._wakeup = asyncio.Event()
+        self.loader.load()
+        if self.signal is not None:
+            asyncio.get_running_loop().add_signal_handler(self.signal, self._wakeup.set)
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._watch())
+    
+    async def _watch(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval or None)
+                forced = True
+            except asyncio.TimeoutError:
+                forced = False
+            self._wakeup.clear()
+            await self.check(forced)
     
-    if not config_path.exists():
-        raise FileNotFoundError(f"Provider config file not found at {config_path}")
+    async def check(self, force=False):
+        """Reload and apply the config if the file changed (or always with ``force``)
+        
+        Returns the change summary of ``LLMRouter.reconfigure``, or None if
+        nothing was applied.
+        """
+        if not force and not self.loader.changed():
+            return None
+        
+        loop = asyncio.get_running_loop()
+        try:
+            config = await loop.run_in_executor(None, self.loader.reload)
+            changes, removed = self.router.reconfigure(config)
+        except Exception as e:
+            self.errors += 1
+            logger.error("Not applying provider config from %s: %s", self.loader.path, e)
+            return None
+        
+        self.reloads += 1
+        # Removed providers are already out of routing; their pools close once nothing uses them
+        for provider in removed:
+            asyncio.ensure_future(self._close_when_idle(provider))
+        return changes
     
-    with open(config_path, "r") as f:
-        config = yaml.safe_load(f)
+    async def _close_when_idle(self, provider, timeout=300.0):
+        waited = 0.0
+        while any(key.in_flight for key in provider.key_pool.keys) and waited < timeout:
+            await asyncio.sleep(1.0)
+            waited += 1.0
+        await provider.aclose()
     
-    return config.get("providers", {})
\ No newline at end of file
+    async def stop(self):
+        if self.signal is not None:
+            asyncio.get_running_loop().remove_signal_handler(self.signal)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,54 @@
+import time
+
+class Deadline:
+    """End-to-end time budget shared by every attempt of one router call
+    
+    Created from the ``timeout_total`` (seconds) or ``deadline`` (absolute
+    ``time.time()`` timestamp) request options.
+    """
+    
+    def __init__(self, timeout_total, clock=time.monotonic):
+        self.clock = clock
+        self.timeout_total = timeout_total
+        self.started = clock()
+        self.expires_at = self.started + timeout_total
+        self.skipped = []  # candidates left out because they couldn't fit
+    
+    @classmethod
+    def from_options(cls, options, clock=time.monotonic):
+        """Return a Deadline for the request options, or None if they set no budget"""
+        budgets = []
+        if options.get("timeout_total") is not None:
+            budgets.append(options["timeout_total"])
+        if options.get("deadline") is not None:
+            budgets.append(options["deadline"] - time.time())
+        
+        if not budgets:
+            return None
+        return cls(min(budgets), clock)
+    
+    def remaining(self):
+        """Seconds left in the budget, never negative"""
+        return max(self.expires_at - self.clock(), 0.0)
+    
+    def elapsed(self):
+        return self.clock() - self.started
+    
+    def expired(self):
+        return self.clock() >= self.expires_at
+    
+    def fits(self, expected_latency):
+        """Check whether a call with the given expected latency can finish in time"""
+        if expected_latency is None:
+            return not self.expired()
+        return expected_latency <= self.remaining()
+    
+    def error(self, details=None):
+        """Build the error result returned when the budget runs out"""
+        return {
+            "error": "deadline_exceeded",
+            "timeout_total": self.timeout_total,
+            "elapsed": self.elapsed(),
+            "skipped": list(self.skipped),
+            "details": details or []
+        }
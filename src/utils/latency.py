@@ -0,0 +1,55 @@
+import math
+from collections import deque
+
+class LatencyStats:
+    """Latency statistics: an EWMA plus percentiles over a rolling window
+    
+    Recording a sample is O(1). Percentiles sort the window lazily and the
+    sorted copy is reused until the next sample arrives.
+    """
+    
+    def __init__(self, alpha=0.2, window=100):
+        self.alpha = alpha
+        self.samples = deque(maxlen=window)
+        self.ewma = None
+        self.count = 0
+        self._sorted = None
+    
+    def record(self, seconds):
+        """Record one latency sample in seconds"""
+        if self.ewma is None:
+            self.ewma = seconds
+        else:
+            self.ewma += self.alpha * (seconds - self.ewma)
+        
+        self.samples.append(seconds)
+        self.count += 1
+        self._sorted = None
+    
+    def percentile(self, percent):
+        """Return the given percentile of the rolling window, or None without samples"""
+        if not self.samples:
+            return None
+        
+        if self._sorted is None:
+            self._sorted = sorted(self.samples)
+        
+        # Nearest-rank percentile
+        rank = max(math.ceil(percent / 100 * len(self._sorted)), 1)
+        return self._sorted[rank - 1]
+    
+    @property
+    def p50(self):
+        return self.percentile(50)
+    
+    @property
+    def p95(self):
+        return self.percentile(95)
+    
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "ewma": self.ewma,
+            "p50": self.p50,
+            "p95": self.p95
+        }
@@ -0,0 +1,21 @@
+import importlib
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access
+    
+    Keeps heavy dependencies out of import time for code that only needs
+    them once it does I/O, e.g. ``httpx`` until the first request.
+    """
+    
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+    
+    def __getattr__(self, attribute):
+        module = self._module
+        if module is None:
+            module = self._module = importlib.import_module(self._name)
+        return getattr(module, attribute)
+    
+    def __repr__(self):
+        return f"<lazy module {self._name!r}{' (loaded)' if self._module is not None else ''}>"
@@ -0,0 +1,223 @@
+import bisect
+import threading
+
+from .batch import is_throttled
+from .tokens import usage_total_tokens
+
+# Latency histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Fallback hop histogram bucket upper bounds
+HOP_BUCKETS = (0, 1, 2, 3, 5, 10)
+
+def attempt_outcome(result):
+    """Classify a provider result as success, rate_limited, timeout or error"""
+    if "error" not in result:
+        return "success"
+    if result.get("status_code") == 429 or result["error"] == "rate_limit_exceeded":
+        return "rate_limited"
+    if result.get("timeout"):
+        return "timeout"
+    return "error"
+
+def request_outcome(result):
+    """Classify the final result of a router call"""
+    if "error" not in result:
+        return "cached" if result.get("cached") else "success"
+    if result["error"] in ("deadline_exceeded", "queue_timeout"):
+        return "timeout"
+    if is_throttled(result):
+        return "rate_limited"
+    return "error"
+
+def result_tokens(result):
+    return usage_total_tokens(result.get("usage")) or 0
+
+class RouterHooks:
+    """Callbacks the router invokes around each call and each provider attempt
+    
+    Every method is a no-op; override what you need. A context returned by a
+    ``*_started`` call is passed to the matching ``*_finished`` call. Outcomes
+    are ``success``, ``rate_limited``, ``timeout``, ``error``, ``cancelled``
+    or, for requests, ``cached``. Hooks that set ``wants_candidates`` also get
+    ``routing_decision``.
+    """
+    
+    wants_candidates = False
+    
+    def request_started(self, model_name, prompt, options, stream):
+        return None
+    
+    def routing_decision(self, context, candidates):
+        """``candidates`` are ``(provider, model, score, available)`` tuples in routing order"""
+    
+    def request_finished(self, context, model_name, outcome, latency, fallbacks):
+        """``fallbacks`` is the number of candidates tried before the last one"""
+    
+    def attempt_started(self, provider_name, model_name, parent):
+        return None
+    
+    def attempt_finished(self, context, provider_name, model_name, outcome, latency, tokens, status_code=None):
+        pass
+
+class CompositeHooks(RouterHooks):
+    """Fans every callback out to several hooks, e.g. metrics plus a tracer"""
+    
+    def __init__(self, *hooks):
+        self.hooks = hooks
+        self.wants_candidates = any(hook.wants_candidates for hook in hooks)
+    
+    def request_started(self, model_name, prompt, options, stream):
+        return [hook.request_started(model_name, prompt, options, stream) for hook in self.hooks]
+    
+    def routing_decision(self, context, candidates):
+        for hook, hook_context in zip(self.hooks, context):
+            if hook.wants_candidates:
+                hook.routing_decision(hook_context, candidates)
+    
+    def request_finished(self, context, model_name, outcome, latency, fallbacks):
+        for hook, hook_context in zip(self.hooks, context):
+            hook.request_finished(hook_context, model_name, outcome, latency, fallbacks)
+    
+    def attempt_started(self, provider_name, model_name, parent):
+        parents = parent if parent is not None else [None] * len(self.hooks)
+        return [hook.attempt_started(provider_name, model_name, p) for hook, p in zip(self.hooks, parents)]
+    
+    def attempt_finished(self, context, provider_name, model_name, outcome, latency, tokens, status_code=None):
+        for hook, hook_context in zip(self.hooks, context):
+            hook.attempt_finished(hook_context, provider_name, model_name, outcome, latency, tokens, status_code)
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+    
+    __slots__ = ("bounds", "counts", "sum", "count")
+    
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # the last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+    
+    def cumulative(self):
+        """Yield (upper bound, cumulative count) pairs, ending with +Inf"""
+        total = 0
+        for bound, count in zip(list(self.bounds) + [float('inf')], self.counts):
+            total += count
+            yield bound, total
+    
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": {_format_bound(bound): total for bound, total in self.cumulative()}
+        }
+
+class MetricsRecorder(RouterHooks):
+    """Counters and latency histograms per provider, model and outcome, with Prometheus output"""
+    
+    def __init__(self, buckets=DEFAULT_BUCKETS, namespace="llm_router"):
+        self.buckets = tuple(buckets)
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self.attempts = {}  # (provider, model, outcome): count
+        self.attempt_latency = {}  # (provider, model, outcome): Histogram
+        self.tokens = {}  # (provider, model): tokens
+        self.requests = {}  # outcome: count
+        self.request_latency = {}  # outcome: Histogram
+        self.fallbacks = Histogram(HOP_BUCKETS)
+    
+    def attempt_finished(self, context, provider_name, model_name, outcome, latency, tokens, status_code=None):
+        key = (provider_name, model_name, outcome)
+        with self._lock:
+            self.attempts[key] = self.attempts.get(key, 0) + 1
+            histogram = self.attempt_latency.get(key)
+            if histogram is None:
+                histogram = self.attempt_latency[key] = Histogram(self.buckets)
+            histogram.observe(latency)
+            if tokens:
+                self.tokens[key[:2]] = self.tokens.get(key[:2], 0) + tokens
+    
+    def request_finished(self, context, model_name, outcome, latency, fallbacks):
+        with self._lock:
+            self.requests[outcome] = self.requests.get(outcome, 0) + 1
+            histogram = self.request_latency.get(outcome)
+            if histogram is None:
+                histogram = self.request_latency[outcome] = Histogram(self.buckets)
+            histogram.observe(latency)
+            self.fallbacks.observe(fallbacks)
+    
+    def snapshot(self):
+        """Return all metrics as a JSON-compatible dict"""
+        with self._lock:
+            return {
+                "attempts": [
+                    {"provider": p, "model": m, "outcome": o, "count": count,
+                     "latency": self.attempt_latency[(p, m, o)].to_dict()}
+                    for (p, m, o), count in self.attempts.items()
+                ],
+                "tokens": [{"provider": p, "model": m, "tokens": t} for (p, m), t in self.tokens.items()],
+                "requests": {
+                    outcome: {"count": count, "latency": self.request_latency[outcome].to_dict()}
+                    for outcome, count in self.requests.items()
+                },
+                "fallbacks": self.fallbacks.to_dict()
+            }
+    
+    def to_prometheus(self):
+        """Render the metrics in the Prometheus text exposition format"""
+        ns = self.namespace
+        lines = []
+        with self._lock:
+            lines.append(f"# HELP {ns}_attempts_total Provider attempts by outcome")
+            lines.append(f"# TYPE {ns}_attempts_total counter")
+            for (p, m, o), count in self.attempts.items():
+                lines.append(f"{ns}_attempts_total{_labels(provider=p, model=m, outcome=o)} {count}")
+            
+            lines.append(f"# HELP {ns}_attempt_latency_seconds Provider attempt latency")
+            lines.append(f"# TYPE {ns}_attempt_latency_seconds histogram")
+            for (p, m, o), histogram in self.attempt_latency.items():
+                _render_histogram(lines, f"{ns}_attempt_latency_seconds", histogram, provider=p, model=m, outcome=o)
+            
+            lines.append(f"# HELP {ns}_tokens_total Tokens used as reported by the providers")
+            lines.append(f"# TYPE {ns}_tokens_total counter")
+            for (p, m), tokens in self.tokens.items():
+                lines.append(f"{ns}_tokens_total{_labels(provider=p, model=m)} {tokens}")
+            
+            lines.append(f"# HELP {ns}_requests_total Router calls by final outcome")
+            lines.append(f"# TYPE {ns}_requests_total counter")
+            for outcome, count in self.requests.items():
+                lines.append(f"{ns}_requests_total{_labels(outcome=outcome)} {count}")
+            
+            lines.append(f"# HELP {ns}_request_latency_seconds Router call latency, fallbacks included")
+            lines.append(f"# TYPE {ns}_request_latency_seconds histogram")
+            for outcome, histogram in self.request_latency.items():
+                _render_histogram(lines, f"{ns}_request_latency_seconds", histogram, outcome=outcome)
+            
+            lines.append(f"# HELP {ns}_fallback_hops Candidates tried before the last one, per call")
+            lines.append(f"# TYPE {ns}_fallback_hops histogram")
+            _render_histogram(lines, f"{ns}_fallback_hops", self.fallbacks)
+        return "\n".join(lines) + "\n"
+
+def _format_bound(bound):
+    if bound == float('inf'):
+        return "+Inf"
+    return repr(float(bound))
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(**labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+def _render_histogram(lines, name, histogram, **labels):
+    for bound, total in histogram.cumulative():
+        lines.append(f"{name}_bucket{_labels(**labels, le=_format_bound(bound))} {total}")
+    lines.append(f"{name}_sum{_labels(**labels)} {histogram.sum}")
+    lines.append(f"{name}_count{_labels(**labels)} {histogram.count}")
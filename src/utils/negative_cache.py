@@ -0,0 +1,221 @@
+import json
+import logging
+import re
+import time
+
+logger = logging.getLogger("llm_router")
+
+# Reasons a provider/model pair fails permanently, as opposed to transient errors worth retrying
+MODEL_NOT_FOUND = "model_not_found"
+PAYMENT_REQUIRED = "payment_required"
+AUTH_FAILED = "auth_failed"
+FORBIDDEN = "forbidden"
+
+# Reasons that concern the whole provider rather than one of its models
+PROVIDER_WIDE = (PAYMENT_REQUIRED, AUTH_FAILED)
+
+# 400 responses are only permanent when the provider says the model does not exist (any more);
+# errors about the request's parameters often mention the model too, and must not match
+MODEL_ERROR_CODES = ("model_not_found", "model_decommissioned", "model_not_available", "invalid_model")
+MODEL_ERROR_MESSAGE = re.compile(
+    r"\bmodel\b(?: id| name)?:?\s*(?:`[^`]*`|'[^']*'|\"[^\"]*\"|[\w./:@-]+)?\s+"
+    r"(?:(?:is|was) )?(?:not found|does not exist|doesn't exist|(?:has been|was|is) (?:decommissioned|retired|removed))\b"
+    r"|\b(?:unknown|nonexistent|not a valid) model\b|\binvalid model:?\s*[`'\"]|\bno endpoints found for\b",
+    re.IGNORECASE
+)
+
+def parse_error_body(body):
+    """Return the (code, message) of an OpenAI-style error body, tolerating plain text"""
+    if not body:
+        return None, ""
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return None, body
+    error = data.get("error", data) if isinstance(data, dict) else data
+    if isinstance(error, dict):
+        return error.get("code") or error.get("type"), str(error.get("message", ""))
+    return None, str(error)
+
+def classify_failure(status_code, body=None):
+    """Return the reason an HTTP error is permanent, or None if it is worth retrying later"""
+    if status_code == 401:
+        return AUTH_FAILED
+    if status_code == 402:
+        return PAYMENT_REQUIRED
+    if status_code == 403:
+        return FORBIDDEN
+    if status_code == 404:
+        return MODEL_NOT_FOUND
+    if status_code in (400, 422):
+        code, message = parse_error_body(body)
+        if code in MODEL_ERROR_CODES or MODEL_ERROR_MESSAGE.search(message):
+            return MODEL_NOT_FOUND
+    return None
+
+class NegativeCache:
+    """Expiring record of provider/model pairs that failed permanently
+    
+    Pairs in the cache are left out of routing until their entry expires,
+    so retired models and unpaid or unauthorized providers stop costing a
+    round trip per request. An entry with model None covers every model of
+    the provider. When an entry expires the next request probes the pair
+    again; another permanent failure puts it back with a doubled TTL,
+    capped at ``max_ttl``. A success removes it.
+    """
+    
+    def __init__(self, ttl=600.0, max_ttl=86400.0, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_ttl = max_ttl
+        self.clock = clock
+        self.entries = {}  # (provider_name, model_name or None): entry dict
+        self._history = {}  # same keys: TTL of the last entry, kept after it expires
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def add(self, provider_name, model_name, reason, error=None):
+        """Exclude a pair (or with model_name None, a whole provider) from routing"""
+        key = (provider_name, model_name)
+        previous = self._history.get(key)
+        ttl = self.ttl if previous is None else min(previous * 2, self.max_ttl)
+        entry = self.entries.get(key)
+        self._history[key] = ttl
+        self.entries[key] = {
+            "reason": reason,
+            "error": error,
+            "failures": (entry["failures"] if entry else 0) + 1,
+            "since": entry["since"] if entry else self.clock(),
+            "expires_at": self.clock() + ttl,
+        }
+        logger.warning(
+            "Excluding %s/%s from routing for %.0fs: %s (%s)",
+            provider_name, model_name or "*", ttl, reason, error
+        )
+    
+    def is_dead(self, provider_name, model_name=None):
+        """Check whether a pair, or its whole provider, is currently excluded"""
+        return self._active((provider_name, None)) or (
+            model_name is not None and self._active((provider_name, model_name))
+        )
+    
+    def _active(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return False
+        if entry["expires_at"] > self.clock():
+            return True
+        # Expired: let the next request probe the pair, keeping the TTL history for backoff
+        del self.entries[key]
+        return False
+    
+    def discard(self, provider_name, model_name=None):
+        """Forget a pair after it answered, resetting its backoff"""
+        for key in ((provider_name, model_name), (provider_name, None)):
+            self.entries.pop(key, None)
+            self._history.pop(key, None)
+    
+    def forget_model(self, provider_name, model_name):
+        """Drop the entry of one of a provider's models, e.g. when it stops listing the model"""
+        self.entries.pop((provider_name, model_name), None)
+        self._history.pop((provider_name, model_name), None)
+    
+    def forget_provider(self, provider_name):
+        """Drop every entry of a provider, e.g. when it is removed or reconfigured"""
+        for key in [key for key in self._history if key[0] == provider_name]:
+            self._history.pop(key, None)
+            self.entries.pop(key, None)
+    
+    def clear(self):
+        self.entries.clear()
+        self._history.clear()
+    
+    def to_list(self):
+        """Entries that are still active, soonest expiring first"""
+        now = self.clock()
+        return sorted(
+            (
+                {
+                    "provider": provider_name,
+                    "model": model_name,
+                    "reason": entry["reason"],
+                    "error": entry["error"],
+                    "failures": entry["failures"],
+                    "dead_for": now - entry["since"],
+                    "expires_in": entry["expires_at"] - now,
+                }
+                for (provider_name, model_name), entry in list(self.entries.items())
+                if entry["expires_at"] > now
+            ),
+            key=lambda item: item["expires_in"]
+        )
+
+class SharedNegativeCache(NegativeCache):
+    """NegativeCache whose entries live in a StateBackend, shared between processes
+    
+    Changes are applied to the shared entries in one ``update_state`` call,
+    and the shared entries are read back at most every ``sync_interval``
+    seconds, so a model one worker found retired is skipped by all of them.
+    """
+    
+    def __init__(self, backend, key, sync_interval=0.5, **options):
+        super().__init__(**options)
+        self.backend = backend
+        self.key = key
+        self.sync_interval = sync_interval
+        self._synced_at = float('-inf')
+    
+    def __len__(self):
+        self._sync()
+        return len(self.entries)
+    
+    def _sync(self):
+        now = self.clock()
+        if now - self._synced_at < self.sync_interval:
+            return
+        self._synced_at = now
+        self._load(self.backend.get_state(self.key))
+    
+    def _load(self, shared):
+        shared = shared or {"entries": [], "history": []}
+        self.entries = {(provider_name, model_name): entry for provider_name, model_name, entry in shared["entries"]}
+        self._history = {(provider_name, model_name): ttl for provider_name, model_name, ttl in shared["history"]}
+    
+    def _update(self, change):
+        """Apply ``change()`` to the latest shared entries and write them back"""
+        def apply(shared):
+            self._load(shared)
+            change()
+            return {
+                "entries": [[provider_name, model_name, entry] for (provider_name, model_name), entry in self.entries.items()],
+                "history": [[provider_name, model_name, ttl] for (provider_name, model_name), ttl in self._history.items()]
+            }
+        self._load(self.backend.update_state(self.key, apply))
+        self._synced_at = self.clock()
+    
+    def add(self, provider_name, model_name, reason, error=None):
+        self._update(lambda: NegativeCache.add(self, provider_name, model_name, reason, error))
+    
+    def is_dead(self, provider_name, model_name=None):
+        self._sync()
+        return super().is_dead(provider_name, model_name)
+    
+    def discard(self, provider_name, model_name=None):
+        self._sync()
+        keys = ((provider_name, model_name), (provider_name, None))
+        # Called after every success, so only write when there is something to forget
+        if any(key in self.entries or key in self._history for key in keys):
+            self._update(lambda: NegativeCache.discard(self, provider_name, model_name))
+    
+    def forget_model(self, provider_name, model_name):
+        self._update(lambda: NegativeCache.forget_model(self, provider_name, model_name))
+    
+    def forget_provider(self, provider_name):
+        self._update(lambda: NegativeCache.forget_provider(self, provider_name))
+    
+    def clear(self):
+        self._update(lambda: NegativeCache.clear(self))
+    
+    def to_list(self):
+        self._sync()
+        return super().to_list()
@@ -1,11 +1,188 @@
-class RateLimitTracker:
+import threading
+import time
+from collections import deque
+
+class Reservation:
+    """Token entry of one request in the window, as returned by ``try_acquire``
+    
+    Corrections of the estimate amend the entry in place, so they leave the
+    window together with the tokens they correct.
+    """
+    
+    __slots__ = ("timestamp", "tokens")
+    
+    def __init__(self, timestamp, tokens):
+        self.timestamp = timestamp
+        self.tokens = tokens
+
+class _Window:
+    """Requests and token usage of one key within the sliding window"""
+    
+    __slots__ = ("requests", "tokens", "token_total")
+    
     def __init__(self):
-        self.provider_usage = {}  # Track usage by provider
+        self.requests = deque()  # request timestamps
+        self.tokens = deque()  # Reservation entries in timestamp order, corrections may be negative
+        self.token_total = 0
+    
+    def prune(self, cutoff):
+        requests = self.requests
+        while requests and requests[0] <= cutoff:
+            requests.popleft()
+        
+        tokens = self.tokens
+        while tokens and tokens[0].timestamp <= cutoff:
+            self.token_total -= tokens.popleft().tokens
+    
+    def used_tokens(self):
+        return max(self.token_total, 0)
+    
+    def add_tokens(self, now, tokens):
+        if tokens:
+            self.tokens.append(Reservation(now, tokens))
+            self.token_total += tokens
+    
+    def reserve(self, now, tokens):
+        """Record a request; its token entry is kept even when empty, so it can be amended"""
+        self.requests.append(now)
+        entry = Reservation(now, tokens)
+        self.tokens.append(entry)
+        self.token_total += tokens
+        return entry
+    
+    def amend(self, entry, tokens, cutoff):
+        """Correct the tokens of an entry, unless it has left the window already"""
+        if entry.timestamp > cutoff:
+            entry.tokens += tokens
+            self.token_total += tokens
+
+def has_capacity(requests, used_tokens, limit_info, tokens=0):
+    """Check whether one more request of ``tokens`` fits next to the usage in a window"""
+    request_limit = limit_info.get("requests_per_minute")
+    if request_limit is not None and requests >= request_limit:
+        return False
+    
+    token_limit = limit_info.get("tokens_per_minute")
+    if token_limit is not None and tokens and used_tokens + tokens > token_limit:
+        return False
+    
+    return True
+
+class RateLimitTracker:
+    """Sliding-window rate limiter shared by all providers
+    
+    Keeps a deque of request timestamps per key (usually the provider name),
+    plus a deque of token counts with a running total for tokens_per_minute.
+    Entries that fall out of the window are popped from the left, so checks
+    and reservations are amortized O(1) instead of rescanning the history.
+    """
+    
+    def __init__(self, window=60.0, clock=time.monotonic):
+        self.window = window
+        self.clock = clock
+        self.provider_usage = {}  # Track usage by provider: _Window
+        self._lock = threading.Lock()
+    
+    def _usage(self, provider_name, now):
+        """Return the provider's window with expired entries dropped"""
+        usage = self.provider_usage.get(provider_name)
+        if usage is None:
+            usage = self.provider_usage[provider_name] = _Window()
+        
+        usage.prune(now - self.window)
+        return usage
+    
+    @staticmethod
+    def _has_capacity(usage, limit_info, tokens):
+        return has_capacity(len(usage.requests), usage.used_tokens(), limit_info, tokens)
+        
+    def record_usage(self, provider_name, tokens=0):
+        """Record a request without checking the limit"""
+        with self._lock:
+            now = self.clock()
+            usage = self._usage(provider_name, now)
+            usage.requests.append(now)
+            usage.add_tokens(now, tokens)
+    
+    def record_tokens(self, provider_name, tokens, reservation=None):
+        """Add tokens to the window, e.g. to correct an earlier estimate
+        
+        Pass a negative count to give back part of a reservation. With the
+        ``reservation`` returned by ``try_acquire``, the correction amends it
+        and expires with it; otherwise it is counted from now.
+        """
+        with self._lock:
+            now = self.clock()
+            usage = self._usage(provider_name, now)
+            if reservation is None:
+                usage.add_tokens(now, tokens)
+            elif tokens:
+                usage.amend(reservation, tokens, now - self.window)
+        
+    def is_available(self, provider_name, limit_info, tokens=0):
+        """Check if the provider has a free request slot and enough token budget"""
+        with self._lock:
+            return self._has_capacity(self._usage(provider_name, self.clock()), limit_info, tokens)
+    
+    def try_acquire(self, provider_name, limit_info, tokens=0):
+        """Check for a free slot and token budget and reserve them in one step
+        
+        Returns False without recording anything if a limit would be exceeded,
+        so concurrent callers can never push a provider over its limits.
+        Otherwise returns the ``Reservation``, to pass to ``record_tokens``
+        once the actual usage is known.
+        """
+        with self._lock:
+            now = self.clock()
+            usage = self._usage(provider_name, now)
+            if not self._has_capacity(usage, limit_info, tokens):
+                return False
+            return usage.reserve(now, tokens)
+    
+    def remaining(self, provider_name, limit_info):
+        """Return the number of free request slots, or None if unlimited"""
+        limit = limit_info.get("requests_per_minute")
+        if limit is None:
+            return None
         
-    def record_usage(self, provider_name):
-        # Record timestamp of usage
-        pass
+        with self._lock:
+            return max(limit - len(self._usage(provider_name, self.clock()).requests), 0)
+    
+    def remaining_tokens(self, provider_name, limit_info):
+        """Return the unused token budget in the current window, or None if unlimited"""
+        limit = limit_info.get("tokens_per_minute")
+        if limit is None:
+            return None
         
-    def is_available(self, provider_name, limit_info):
-        # Check if provider is available based on usage history
-        pass
\ No newline at end of file
+        with self._lock:
+            return max(limit - self._usage(provider_name, self.clock()).used_tokens(), 0)
+    
+    def time_until_available(self, provider_name, limit_info, tokens=0):
+        """Return the seconds until a request of the given size would be admitted"""
+        with self._lock:
+            now = self.clock()
+            usage = self._usage(provider_name, now)
+            # Measured against the pruning cutoff, so an entry still counted never reports a zero wait
+            cutoff = now - self.window
+            wait = 0.0
+            
+            request_limit = limit_info.get("requests_per_minute")
+            if request_limit is not None and len(usage.requests) >= request_limit:
+                # The slot frees up when the oldest request keeping us at the limit expires
+                oldest = usage.requests[len(usage.requests) - request_limit]
+                wait = max(wait, oldest - cutoff)
+            
+            token_limit = limit_info.get("tokens_per_minute")
+            if token_limit is not None and tokens:
+                if tokens > token_limit:
+                    return float("inf")
+                
+                # Walk the window until enough tokens have expired
+                excess = usage.used_tokens() + tokens - token_limit
+                for entry in usage.tokens:
+                    if excess <= 0:
+                        break
+                    excess -= entry.tokens
+                    wait = max(wait, entry.timestamp - cutoff)
+            
+            return max(wait, 0.0)
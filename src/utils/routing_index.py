@@ -0,0 +1,68 @@
+class RoutingIndex:
+    """Precomputed candidate ordering used for routing decisions
+    
+    Holds, for every model, its providers ordered by score, plus a global
+    ranking of models. Building it costs O(models x providers), so it is only
+    rebuilt after ``invalidate()`` is called, i.e. when a provider is added or
+    removed or its health changes enough to move its score. Rate limit state
+    changes constantly, so it is not baked in: availability is checked lazily
+    (in O(1)) while iterating over the candidates.
+    """
+    
+    def __init__(self):
+        self.model_candidates = {}  # model_name: provider names, best first
+        self.ranked_models = []  # model names, best first
+        self.version = 0
+        self._dirty = True
+    
+    @property
+    def is_dirty(self):
+        return self._dirty
+    
+    def invalidate(self):
+        """Mark the index as stale so it is rebuilt on the next lookup"""
+        self._dirty = True
+    
+    def rebuild(self, model_map, score, rank):
+        """Rebuild the ordering
+        
+        Args:
+            model_map: Dictionary mapping model names to provider names
+            score: Callable (provider_name, model_name) -> routing score
+            rank: Callable (provider_name, model_name) -> value used to rank models
+        """
+        model_candidates = {}
+        ranked = []
+        
+        for model_name, provider_names in model_map.items():
+            ordered = sorted(provider_names, key=lambda name: (-score(name, model_name), name))
+            model_candidates[model_name] = ordered
+            if ordered:
+                # Models are ranked by the rank of their best provider
+                ranked.append((-rank(ordered[0], model_name), model_name))
+        
+        ranked.sort()
+        self.model_candidates = model_candidates
+        self.ranked_models = [model_name for _, model_name in ranked]
+        self.version += 1
+        self._dirty = False
+    
+    def iter_candidates(self, model_name, is_available):
+        """Yield (provider_name, model_name) pairs in the order they should be tried
+        
+        With a model name, every available provider of that model is yielded.
+        Without one, each model is yielded once with its best available
+        provider, best model first. ``is_available`` is called lazily, right
+        before a candidate is handed out.
+        """
+        if model_name is not None:
+            for provider_name in self.model_candidates.get(model_name, ()):
+                if is_available(provider_name, model_name):
+                    yield provider_name, model_name
+            return
+        
+        for ranked_model in self.ranked_models:
+            for provider_name in self.model_candidates[ranked_model]:
+                if is_available(provider_name, ranked_model):
+                    yield provider_name, ranked_model
+                    break
@@ -0,0 +1,83 @@
+# Scoring policies decide how the router ranks (provider, model) candidates.
+# A policy can be passed to LLMRouter(scoring_policy=...); the trade-off is
+# chosen per request with the "prefer" option.
+
+class ScoringPolicy:
+    """Base class for provider scoring policies"""
+    
+    # Trade-off used when a request doesn't set the "prefer" option
+    default_prefer = "quality"
+    
+    def score(self, router, provider_name, model_name, prefer):
+        """Return the routing score of a candidate, higher is better
+        
+        Rate limits are handled by the router; this only ranks candidates.
+        """
+        raise NotImplementedError
+    
+    def model_rank(self, router, provider_name, model_name, prefer):
+        """Return the value used to rank models against each other
+        
+        Called with the best provider of each model when routing without a
+        specific model. Defaults to the candidate score.
+        """
+        return self.score(router, provider_name, model_name, prefer)
+    
+    def uses_latency(self, prefer):
+        """Whether scores for this trade-off depend on observed latency"""
+        return True
+
+class DefaultScoringPolicy(ScoringPolicy):
+    """Model quality minus a health penalty and, optionally, a latency penalty
+    
+    The latency penalty is ``weight * expected_latency`` (in seconds), where
+    the weight depends on the trade-off requested with ``prefer``:
+    
+    - ``"quality"``: latency is ignored (the original behaviour)
+    - ``"balanced"``: one quality point per second of expected latency
+    - ``"latency"``: four points per second of p95 latency, so fast providers
+      win unless a slower one has a much better model
+    """
+    
+    def __init__(self, latency_weights=None, error_penalty=2, max_error_penalty=10):
+        self.latency_weights = {"quality": 0.0, "balanced": 1.0, "latency": 4.0}
+        self.latency_weights.update(latency_weights or {})
+        self.error_penalty = error_penalty
+        self.max_error_penalty = max_error_penalty
+    
+    def health_penalty(self, health):
+        """Score penalty for a provider's recent errors"""
+        return min(health["consecutive_errors"] * self.error_penalty, self.max_error_penalty)
+    
+    def expected_latency(self, router, provider_name, model_name, prefer):
+        """Return the expected latency of a candidate in seconds, or None if unknown"""
+        stats = router.get_latency_stats(provider_name, model_name)
+        if stats is None:
+            return None
+        if prefer == "latency":
+            return stats.p95
+        return stats.ewma
+    
+    def score(self, router, provider_name, model_name, prefer):
+        provider = router.providers[provider_name]
+        health = router.provider_health[provider_name]
+        
+        # Base score is the model quality, adjusted for health
+        score = provider.available_models.get(model_name, 0) - self.health_penalty(health)
+        
+        weight = self.latency_weights.get(prefer, 0.0)
+        if weight:
+            latency = self.expected_latency(router, provider_name, model_name, prefer)
+            if latency is not None:
+                score -= weight * latency
+        
+        return score
+    
+    def model_rank(self, router, provider_name, model_name, prefer):
+        if prefer == "quality":
+            # Rank models by raw quality, as the router always has
+            return router.providers[provider_name].available_models[model_name]
+        return self.score(router, provider_name, model_name, prefer)
+    
+    def uses_latency(self, prefer):
+        return bool(self.latency_weights.get(prefer, 0.0))
@@ -0,0 +1,256 @@
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import zlib
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency, see the "semantic" extra
+    np = None
+
+from .cache import CACHE_KEY_OPTIONS, encode_response
+
+WORD = re.compile(r"\w+")
+NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+
+def _digest64(text):
+    """Stable signed 64-bit digest, fits a NumPy int64 column"""
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+class HashingFeaturizer:
+    """Embeds text as a hashed bag of word and character n-grams
+    
+    Text is reduced to lowercase words; word n-grams capture wording, character
+    n-grams absorb typos. Vectors are L2-normalized, so a dot product is a cosine.
+    """
+    
+    def __init__(self, dim=1024, word_ngrams=(1, 2), char_ngrams=(3, 4)):
+        self.dim = dim
+        self.word_ngrams = word_ngrams
+        self.char_ngrams = char_ngrams
+    
+    def features(self, text):
+        words = WORD.findall(text.lower())
+        for n in self.word_ngrams:
+            for i in range(len(words) - n + 1):
+                yield "w:" + " ".join(words[i:i + n])
+        normalized = " ".join(words)
+        for n in self.char_ngrams:
+            for i in range(len(normalized) - n + 1):
+                yield "c:" + normalized[i:i + n]
+    
+    def transform(self, texts):
+        """Return an (n, dim) float32 matrix of unit vectors, one row per text"""
+        rows, columns, signs = [], [], []
+        for row, text in enumerate(texts):
+            for feature in self.features(text):
+                hashed = zlib.crc32(feature.encode("utf-8"))
+                rows.append(row)
+                columns.append(hashed % self.dim)
+                signs.append(1.0 if (hashed // self.dim) & 1 else -1.0)
+        
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(vectors, (np.asarray(rows, dtype=np.intp), np.asarray(columns, dtype=np.intp)),
+                  np.asarray(signs, dtype=np.float32))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+class SemanticCache:
+    """Response cache that also answers near-duplicates of cached prompts
+    
+    Entries are scoped by model and ``CACHE_KEY_OPTIONS``, and prompts whose
+    numbers differ never match. A hit needs a cosine similarity of at least
+    ``threshold``; a ``verify_rate`` share of hits is checked against a fresh answer.
+    """
+    
+    def __init__(self, threshold=0.9, capacity=4096, ttl=3600, featurizer=None, verify_rate=0.0,
+                 verify_threshold=0.5, clock=time.time, rng=None):
+        if np is None:
+            raise ImportError("SemanticCache needs NumPy: pip install free-llm-router[semantic]")
+        self.threshold = threshold
+        self.capacity = capacity
+        self.ttl = ttl
+        self.featurizer = featurizer or HashingFeaturizer()
+        self.verify_rate = verify_rate
+        self.verify_threshold = verify_threshold
+        self.clock = clock
+        self.rng = rng or random.Random()
+        
+        self._lock = threading.Lock()
+        self._size = 0
+        self._allocate(min(capacity, 256))
+        self._responses = []
+        self._tick = 0
+        self._next_id = 1
+        
+        self.hits = 0
+        self.misses = 0
+        self.false_hits = 0
+        self.verified = 0
+        self.verify_failures = 0
+        self.evictions = 0
+    
+    def _allocate(self, rows):
+        """Grow the columns to ``rows`` slots, keeping the occupied ones"""
+        dim = self.featurizer.dim
+        old = self._columns() if hasattr(self, "_vectors") else None
+        self._vectors = np.zeros((rows, dim), dtype=np.float32)
+        self._scopes = np.zeros(rows, dtype=np.int64)
+        self._numbers = np.zeros(rows, dtype=np.int64)
+        self._expires = np.zeros(rows, dtype=np.float64)
+        self._last_used = np.zeros(rows, dtype=np.int64)
+        self._ids = np.zeros(rows, dtype=np.int64)
+        if old is not None:
+            for name, column in zip(("_vectors", "_scopes", "_numbers", "_expires", "_last_used", "_ids"), old):
+                getattr(self, name)[:self._size] = column[:self._size]
+    
+    def _columns(self):
+        return self._vectors, self._scopes, self._numbers, self._expires, self._last_used, self._ids
+    
+    @staticmethod
+    def scope(model_name, options):
+        """Digest of what besides the prompt determines a response"""
+        parts = [str(model_name)] + [repr(options.get(name)) for name in CACHE_KEY_OPTIONS]
+        return _digest64("\x1f".join(parts))
+    
+    @staticmethod
+    def numbers(prompt):
+        return _digest64(" ".join(NUMBER.findall(prompt)))
+    
+    def lookup(self, prompt, model_name=None, options=None):
+        """Return (response, similarity, entry id) for the closest cached prompt, or None"""
+        return self.lookup_many([prompt], model_name, options)[0]
+    
+    def lookup_many(self, prompts, model_name=None, options=None):
+        """Look up a batch of prompts with one matrix product; returns one result per prompt"""
+        options = options or {}
+        queries = self.featurizer.transform(prompts)
+        scope = self.scope(model_name, options)
+        numbers = np.array([self.numbers(prompt) for prompt in prompts], dtype=np.int64)
+        now = self.clock()
+        
+        with self._lock:
+            size = self._size
+            rows = np.flatnonzero((self._scopes[:size] == scope) & (self._expires[:size] > now))
+            if not len(rows):
+                self.misses += len(prompts)
+                return [None] * len(prompts)
+            
+            # Only the scope's rows take part in the product
+            similarities = queries @ self._vectors[rows].T  # (prompts, scope entries)
+            matches = numbers[:, None] == self._numbers[rows][None, :]
+            similarities = np.where(matches, similarities, np.float32(-1.0))
+            best = similarities.argmax(axis=1)
+            
+            results = []
+            for index, column in enumerate(best):
+                similarity = float(similarities[index, column])
+                if similarity < self.threshold:
+                    self.misses += 1
+                    results.append(None)
+                    continue
+                row = rows[column]
+                self._tick += 1
+                self._last_used[row] = self._tick
+                self.hits += 1
+                results.append((json.loads(self._responses[row]), similarity, int(self._ids[row])))
+            return results
+    
+    def add(self, prompt, model_name, options, response):
+        """Cache a response; a near-identical prompt in the same scope is replaced"""
+        options = options or {}
+        encoded = encode_response(response)
+        vector = self.featurizer.transform([prompt])[0]
+        scope = self.scope(model_name, options)
+        numbers = self.numbers(prompt)
+        now = self.clock()
+        
+        with self._lock:
+            size = self._size
+            row = None
+            if size:
+                same = (self._scopes[:size] == scope) & (self._numbers[:size] == numbers)
+                similarities = np.where(same, self._vectors[:size] @ vector, np.float32(-1.0))
+                if similarities.max() >= 0.999:
+                    row = int(similarities.argmax())
+            if row is None:
+                row = self._free_row(now)
+            
+            self._vectors[row] = vector
+            self._scopes[row] = scope
+            self._numbers[row] = numbers
+            self._expires[row] = now + self.ttl
+            self._tick += 1
+            self._last_used[row] = self._tick
+            self._ids[row] = self._next_id
+            self._next_id += 1
+            self._responses[row] = encoded
+    
+    def _free_row(self, now):
+        """Return an empty row, growing the matrix or evicting the least recently used entry"""
+        if self._size < self.capacity:
+            if self._size == len(self._vectors):
+                self._allocate(min(len(self._vectors) * 2, self.capacity))
+            self._responses.append(None)
+            self._size += 1
+            return self._size - 1
+        
+        # Expired entries go first, then the least recently used
+        recency = np.where(self._expires[:self._size] > now, self._last_used[:self._size], -1)
+        row = int(recency.argmin())
+        if recency[row] >= 0:
+            self.evictions += 1
+        return row
+    
+    def should_verify(self):
+        """Whether this hit should be checked against a fresh answer"""
+        return self.verify_rate > 0 and self.rng.random() < self.verify_rate
+    
+    def verify(self, entry_id, cached, fresh):
+        """Compare a cached answer with a fresh one for the same prompt
+        
+        Answers whose text similarity is below ``verify_threshold`` count as
+        a false hit, and the entry is dropped. Returns True if the hit held up.
+        """
+        texts = self.featurizer.transform([cached.get("text") or "", fresh.get("text") or ""])
+        agrees = float(texts[0] @ texts[1]) >= self.verify_threshold
+        with self._lock:
+            self.verified += 1
+            self.verify_failures += not agrees
+        if not agrees:
+            self.mark_false_hit(entry_id)
+        return agrees
+    
+    def mark_false_hit(self, entry_id):
+        """Report that a semantic hit answered the wrong question; drops the entry"""
+        with self._lock:
+            self.false_hits += 1
+            rows = np.flatnonzero(self._ids[:self._size] == entry_id)
+            if len(rows):
+                self._expires[rows] = 0.0
+    
+    def clear(self):
+        with self._lock:
+            self._size = 0
+            self._responses = []
+            self._allocate(min(self.capacity, 256))
+    
+    def stats(self):
+        """Return hit, false hit and eviction counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "false_hits": self.false_hits,
+                "verified": self.verified,
+                # Estimated from the verified sample; reported false hits come on top
+                "false_hit_rate": self.verify_failures / self.verified if self.verified else None,
+                "evictions": self.evictions,
+                "entries": int((self._expires[:self._size] > self.clock()).sum()),
+                "capacity": self.capacity
+            }
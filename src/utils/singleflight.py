@@ -0,0 +1,139 @@
+import asyncio
+
+class SingleFlight:
+    """Collapse concurrent identical calls into one upstream call
+    
+    The first caller for a key starts the call; callers that arrive while it
+    is in flight wait for the same outcome, result or exception. The shared
+    call is shielded, so a caller that is cancelled doesn't cancel it for
+    the others.
+    """
+    
+    def __init__(self):
+        self._calls = {}  # key: asyncio.Task
+        self.calls = 0
+        self.shared = 0
+    
+    def in_flight(self):
+        return len(self._calls)
+    
+    async def do(self, key, fn, timeout=None):
+        """Run ``fn()`` for the key, or join the call already in flight
+        
+        Returns a tuple of (result, shared) where ``shared`` is True for
+        callers that joined an existing call. With a ``timeout`` the caller
+        gives up after that many seconds with asyncio.TimeoutError, while
+        the call carries on for the others.
+        """
+        task = self._calls.get(key)
+        shared = task is not None
+        if shared:
+            self.shared += 1
+        else:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        
+        if timeout is None:
+            return await asyncio.shield(task), shared
+        return await asyncio.wait_for(asyncio.shield(task), timeout), shared
+
+class StreamBroadcast:
+    """Fan the chunks of one upstream stream out to any number of subscribers
+    
+    Chunks are buffered, so a subscriber that joins late first replays what
+    it missed. The upstream stream is consumed by a background task, which
+    is cancelled (and waited for) when the last subscriber goes away.
+    """
+    
+    def __init__(self, stream, on_done=None):
+        self._stream = stream
+        self._on_done = on_done
+        self._chunks = []
+        self._done = False
+        self._error = None
+        self._changed = asyncio.Condition()
+        self._subscribers = 0
+        self._task = None
+    
+    def _start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._pump())
+    
+    async def _pump(self):
+        try:
+            async for chunk in self._stream:
+                async with self._changed:
+                    self._chunks.append(chunk)
+                    self._changed.notify_all()
+        except Exception as e:
+            self._error = e
+        finally:
+            await self._stream.aclose()
+            if self._on_done is not None:
+                self._on_done()
+            async with self._changed:
+                self._done = True
+                self._changed.notify_all()
+    
+    async def subscribe(self):
+        """Yield every chunk of the upstream stream, from the beginning"""
+        self._subscribers += 1
+        self._start()
+        index = 0
+        try:
+            while True:
+                async with self._changed:
+                    while index >= len(self._chunks) and not self._done:
+                        await self._changed.wait()
+                    pending = self._chunks[index:]
+                    finished = self._done
+                
+                for chunk in pending:
+                    yield chunk
+                index += len(pending)
+                
+                if finished and index >= len(self._chunks):
+                    if self._error is not None:
+                        raise self._error
+                    return
+        finally:
+            self._subscribers -= 1
+            if not self._subscribers and not self._done:
+                self._task.cancel()
+                await asyncio.gather(self._task, return_exceptions=True)
+
+class StreamSingleFlight:
+    """SingleFlight for streams: concurrent identical streams share one upstream stream"""
+    
+    def __init__(self):
+        self._broadcasts = {}  # key: StreamBroadcast
+        self.calls = 0
+        self.shared = 0
+    
+    def in_flight(self):
+        return len(self._broadcasts)
+    
+    async def stream(self, key, factory):
+        """Yield the chunks of ``factory()``, sharing the stream with concurrent callers"""
+        broadcast = self._broadcasts.get(key)
+        if broadcast is None:
+            self.calls += 1
+            broadcast = self._broadcasts[key] = StreamBroadcast(
+                factory(), on_done=lambda: self._discard(key, broadcast)
+            )
+        else:
+            self.shared += 1
+        
+        subscription = broadcast.subscribe()
+        try:
+            async for chunk in subscription:
+                yield chunk
+        finally:
+            await subscription.aclose()
+    
+    def _discard(self, key, broadcast):
+        # Once the upstream has finished, new callers start a fresh stream
+        if self._broadcasts.get(key) is broadcast:
+            del self._broadcasts[key]
@@ -0,0 +1,333 @@
+import json
+import os
+import threading
+import time
+
+from .cache import SQLiteCacheStore
+from .circuit_breaker import CircuitBreaker, SharedCircuitBreaker
+from .negative_cache import NegativeCache, SharedNegativeCache
+from .rate_limiter import RateLimitTracker, has_capacity
+
+class StateBusy(Exception):
+    """Another process held the shared state's write lock for longer than the busy timeout"""
+
+class StateBackend:
+    """Where the router keeps rate limits, provider health, circuits and cached responses
+    
+    A backend shared between processes makes all workers respect one set of
+    provider quotas; a networked store such as Redis can implement the same methods.
+    """
+    
+    clock = time.time  # shared timestamps must mean the same in every process
+    
+    def rate_limiter(self, window=60.0):
+        """Return a rate limiter whose windows live in this backend"""
+        raise NotImplementedError
+    
+    def get_state(self, key):
+        """Return the JSON-compatible value stored under ``key``, or None"""
+        raise NotImplementedError
+    
+    def set_state(self, key, value):
+        raise NotImplementedError
+    
+    def update_state(self, key, fn):
+        """Store ``fn(value)`` under ``key`` and return it; atomic where the store allows"""
+        value = fn(self.get_state(key))
+        self.set_state(key, value)
+        return value
+    
+    def circuit_breaker(self, key, **options):
+        """Return a circuit breaker whose state is stored under ``key``"""
+        return SharedCircuitBreaker(self, key, **{"clock": self.clock, **options})
+    
+    def negative_cache(self, **options):
+        """Return a negative cache whose entries are stored in this backend"""
+        return SharedNegativeCache(self, "negative_cache", **{"clock": self.clock, **options})
+    
+    def cache_store(self):
+        """Return a persistent tier for ResponseCache, or None to cache in memory only"""
+        return None
+    
+    def close(self):
+        pass
+
+class InProcessStateBackend(StateBackend):
+    """Keeps all state in this process; the default"""
+    
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._state = {}
+        self._lock = threading.Lock()
+    
+    def rate_limiter(self, window=60.0):
+        return RateLimitTracker(window, self.clock)
+    
+    def get_state(self, key):
+        with self._lock:
+            return self._state.get(key)
+    
+    def set_state(self, key, value):
+        with self._lock:
+            self._state[key] = value
+    
+    def update_state(self, key, fn):
+        with self._lock:
+            value = self._state[key] = fn(self._state.get(key))
+            return value
+    
+    def circuit_breaker(self, key, **options):
+        # Nobody else reads the state, so skip the write-through
+        return CircuitBreaker(**{"clock": self.clock, **options})
+    
+    def negative_cache(self, **options):
+        return NegativeCache(**{"clock": self.clock, **options})
+
+class SQLiteStateBackend(StateBackend):
+    """Shares state between processes on one machine through a SQLite file in WAL mode
+    
+    Transactions wait at most ``busy_timeout`` for another process: a
+    reservation then fails like a full window, and other writes are deferred to
+    the next transaction. The connection is reopened after a fork.
+    """
+    
+    def __init__(self, path, clock=time.time, busy_timeout=0.05):
+        self.path = str(path)
+        self.clock = clock
+        self.busy_timeout = busy_timeout
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._deferred = []  # writes that found the database busy, run with the next transaction
+    
+    @property
+    def connection(self):
+        if self._conn is None or self._pid != os.getpid():
+            import sqlite3  # deferred, the default in-process backend never needs it
+            
+            # The parent's pending writes are the parent's to apply
+            self._deferred = []
+            
+            # Autocommit mode; write transactions are opened explicitly
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_events ("
+                "name TEXT NOT NULL, ts REAL NOT NULL, requests INTEGER NOT NULL, tokens INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS rate_events_name_ts ON rate_events (name, ts)")
+            conn.execute("CREATE TABLE IF NOT EXISTS router_state (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+    
+    def transaction(self, fn):
+        """Run ``fn(connection)`` in one write transaction, exclusive across processes
+        
+        Raises StateBusy if another process holds the write lock for longer
+        than ``busy_timeout``.
+        """
+        import sqlite3
+        
+        with self._lock:
+            conn = self.connection
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError as e:
+                raise StateBusy(str(e)) from e
+            deferred, self._deferred = self._deferred, []
+            try:
+                for write in deferred:
+                    write(conn)
+                result = fn(conn)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                self._deferred[:0] = deferred
+                raise
+            conn.execute("COMMIT")
+            return result
+    
+    def write(self, fn):
+        """Run ``fn(connection)`` in a write transaction, or with the next one if the database is busy"""
+        try:
+            self.transaction(fn)
+        except StateBusy:
+            self._defer(fn)
+    
+    def _defer(self, fn):
+        with self._lock:
+            self._deferred.append(fn)
+    
+    def read(self, fn):
+        """Run ``fn(connection)`` outside a write transaction; WAL readers never block writers"""
+        with self._lock:
+            return fn(self.connection)
+    
+    def rate_limiter(self, window=60.0):
+        return SQLiteRateLimitTracker(self, window)
+    
+    def get_state(self, key):
+        row = self.read(lambda conn: conn.execute(
+            "SELECT value FROM router_state WHERE key = ?", (key,)
+        ).fetchone())
+        return json.loads(row[0]) if row else None
+    
+    def set_state(self, key, value):
+        encoded = json.dumps(value)
+        self.write(lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO router_state (key, value) VALUES (?, ?)", (key, encoded)
+        ))
+    
+    def update_state(self, key, fn):
+        def update(conn):
+            row = conn.execute("SELECT value FROM router_state WHERE key = ?", (key,)).fetchone()
+            value = fn(json.loads(row[0]) if row else None)
+            conn.execute("INSERT OR REPLACE INTO router_state (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+            return value
+        try:
+            return self.transaction(update)
+        except StateBusy:
+            self._defer(update)
+            return fn(self.get_state(key))
+    
+    def cache_store(self):
+        return SQLiteCacheStore(self.path, busy_timeout=self.busy_timeout)
+    
+    def close(self):
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+class SQLiteRateLimitTracker:
+    """Sliding-window rate limiter with the RateLimitTracker interface, kept in SQLite
+    
+    Every request is a row in ``rate_events``, and corrections of its token
+    estimate update that row; rows older than the window are deleted every
+    ``PRUNE_INTERVAL`` writes. ``try_acquire`` returns the row id as the
+    reservation.
+    """
+    
+    PRUNE_INTERVAL = 256
+    
+    def __init__(self, backend, window=60.0):
+        self.backend = backend
+        self.window = window
+        self.clock = backend.clock
+        self._writes = 0
+    
+    def _usage(self, conn, provider_name, now):
+        """Return (requests, used tokens) in the window"""
+        requests, tokens = conn.execute(
+            "SELECT COALESCE(SUM(requests), 0), COALESCE(SUM(tokens), 0) FROM rate_events "
+            "WHERE name = ? AND ts > ?",
+            (provider_name, now - self.window)
+        ).fetchone()
+        return requests, max(tokens, 0)
+    
+    def _insert(self, conn, provider_name, now, requests, tokens):
+        rowid = conn.execute(
+            "INSERT INTO rate_events (name, ts, requests, tokens) VALUES (?, ?, ?, ?)",
+            (provider_name, now, requests, tokens)
+        ).lastrowid
+        self._writes += 1
+        if self._writes % self.PRUNE_INTERVAL == 0:
+            conn.execute("DELETE FROM rate_events WHERE ts <= ?", (now - self.window,))
+        return rowid
+    
+    def record_usage(self, provider_name, tokens=0):
+        """Record a request without checking the limit"""
+        now = self.clock()
+        self.backend.write(lambda conn: self._insert(conn, provider_name, now, 1, tokens))
+    
+    def record_tokens(self, provider_name, tokens, reservation=None):
+        """Add tokens to the window; negative counts give back a reservation
+        
+        With a ``reservation`` the correction amends its row, so it expires
+        with the tokens it corrects; otherwise it is counted from now.
+        """
+        if not tokens:
+            return
+        now = self.clock()
+        if reservation is None:
+            self.backend.write(lambda conn: self._insert(conn, provider_name, now, 0, tokens))
+        else:
+            self.backend.write(lambda conn: conn.execute(
+                "UPDATE rate_events SET tokens = tokens + ? WHERE rowid = ? AND ts > ?",
+                (tokens, reservation, now - self.window)
+            ))
+    
+    def is_available(self, provider_name, limit_info, tokens=0):
+        requests, used = self.backend.read(lambda conn: self._usage(conn, provider_name, self.clock()))
+        return has_capacity(requests, used, limit_info, tokens)
+    
+    def try_acquire(self, provider_name, limit_info, tokens=0):
+        """Check for a free slot and token budget and reserve them in one transaction"""
+        def acquire(conn):
+            now = self.clock()
+            requests, used = self._usage(conn, provider_name, now)
+            if not has_capacity(requests, used, limit_info, tokens):
+                return False
+            return self._insert(conn, provider_name, now, 1, tokens)
+        try:
+            return self.backend.transaction(acquire)
+        except StateBusy:
+            # Treated like a full window; the router tries another key or provider, or waits
+            return False
+    
+    def remaining(self, provider_name, limit_info):
+        limit = limit_info.get("requests_per_minute")
+        if limit is None:
+            return None
+        requests, _ = self.backend.read(lambda conn: self._usage(conn, provider_name, self.clock()))
+        return max(limit - requests, 0)
+    
+    def remaining_tokens(self, provider_name, limit_info):
+        limit = limit_info.get("tokens_per_minute")
+        if limit is None:
+            return None
+        _, used = self.backend.read(lambda conn: self._usage(conn, provider_name, self.clock()))
+        return max(limit - used, 0)
+    
+    def time_until_available(self, provider_name, limit_info, tokens=0):
+        """Return the seconds until a request of the given size would be admitted"""
+        return self.backend.read(lambda conn: self._time_until_available(conn, provider_name, limit_info, tokens))
+    
+    def _time_until_available(self, conn, provider_name, limit_info, tokens):
+        now = self.clock()
+        cutoff = now - self.window
+        requests, used = self._usage(conn, provider_name, now)
+        wait = 0.0
+        
+        request_limit = limit_info.get("requests_per_minute")
+        if request_limit is not None and requests >= request_limit:
+            # The slot frees up when the oldest request keeping us at the limit expires
+            oldest = conn.execute(
+                "SELECT ts FROM rate_events WHERE name = ? AND ts > ? AND requests > 0 "
+                "ORDER BY ts LIMIT 1 OFFSET ?",
+                (provider_name, cutoff, requests - request_limit)
+            ).fetchone()
+            if oldest is not None:
+                wait = max(wait, oldest[0] - cutoff)
+        
+        token_limit = limit_info.get("tokens_per_minute")
+        if token_limit is not None and tokens:
+            if tokens > token_limit:
+                return float("inf")
+            
+            # Walk the window until enough tokens have expired
+            excess = used + tokens - token_limit
+            if excess > 0:
+                rows = conn.execute(
+                    "SELECT ts, tokens FROM rate_events WHERE name = ? AND ts > ? AND tokens != 0 ORDER BY ts",
+                    (provider_name, cutoff)
+                )
+                for timestamp, count in rows:
+                    if excess <= 0:
+                        break
+                    excess -= count
+                    wait = max(wait, timestamp - cutoff)
+        
+        return max(wait, 0.0)
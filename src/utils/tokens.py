@@ -0,0 +1,34 @@
+# Rough token estimates used for tokens_per_minute admission before a request
+# is sent. Actual counts from the response "usage" block replace them afterwards.
+
+# Average characters per token for English text with the common BPE tokenizers
+CHARS_PER_TOKEN = 4
+
+# Tokens added per chat message for role markers and separators
+MESSAGE_OVERHEAD_TOKENS = 4
+
+def estimate_tokens(text):
+    """Estimate the number of tokens in a piece of text"""
+    if not text:
+        return 0
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def estimate_request_tokens(prompt, options=None):
+    """Estimate the tokens a chat request can consume: prompt, system message and max_tokens"""
+    options = options or {}
+    
+    tokens = estimate_tokens(prompt) + MESSAGE_OVERHEAD_TOKENS
+    if "system_message" in options:
+        tokens += estimate_tokens(options["system_message"]) + MESSAGE_OVERHEAD_TOKENS
+    
+    return tokens + options.get("max_tokens", 1024)
+
+def usage_total_tokens(usage):
+    """Return the total tokens from an OpenAI-style usage block, or None if missing"""
+    if not usage:
+        return None
+    if usage.get("total_tokens") is not None:
+        return usage["total_tokens"]
+    if usage.get("prompt_tokens") is not None or usage.get("completion_tokens") is not None:
+        return (usage.get("prompt_tokens") or 0) + (usage.get("completion_tokens") or 0)
+    return None
@@ -0,0 +1,90 @@
+import asyncio
+import json
+
+import httpx
+
+from src.providers.base import OpenAICompatibleProvider
+from src.router import LLMRouter
+
+class FakeClock:
+    """Manually advanced time source for rate limit windows, circuits and caches"""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+class MockProvider(OpenAICompatibleProvider):
+    """OpenAI-compatible provider named by its config, so the factory can build it for config reloads"""
+
+    def __init__(self, config, api_key=None):
+        super().__init__(config["name"], config, api_key)
+
+def make_provider(name, handler, models=None, rate_limits=None, api_key="test-key", **config):
+    """A MockProvider whose API is ``handler`` behind an httpx MockTransport"""
+    provider = MockProvider({
+        "class": "tests.mocks:MockProvider",
+        "name": name,
+        "base_url": f"https://{name}.test/v1",
+        "models": models if models is not None else {"m": 5},
+        "rate_limits": rate_limits if rate_limits is not None else {"requests_per_minute": 1000},
+        **config
+    }, api_key)
+    provider.transport = httpx.MockTransport(handler)
+    return provider
+
+def two_providers(primary, backup, **router_options):
+    """A router with a preferred primary and a backup provider for model m"""
+    return LLMRouter(providers=[
+        make_provider("primary", primary, {"m": 9}),
+        make_provider("backup", backup, {"m": 1}),
+    ], **router_options)
+
+class Upstream:
+    """Request handler that counts the calls it serves"""
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.requests = []
+
+    async def __call__(self, request):
+        self.requests.append(request)
+        return await self.respond(request)
+
+def completion(text="hello", delay=0.0, total_tokens=10):
+    async def respond(request):
+        await asyncio.sleep(delay)
+        return httpx.Response(200, json={
+            "choices": [{"message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"total_tokens": total_tokens}
+        })
+    return Upstream(respond)
+
+def error(status_code, message="error", code=None, headers=None):
+    async def respond(request):
+        return httpx.Response(status_code, headers=headers, json={"error": {"message": message, "code": code}})
+    return Upstream(respond)
+
+def stream(chunks=("a", "b", "c"), delay=0.0, fail_after=None):
+    """Server-sent events with one chunk per entry, ``delay`` seconds apart
+
+    With ``fail_after`` the connection breaks after that many chunks.
+    """
+    async def respond(request):
+        async def body():
+            for i, text in enumerate(chunks):
+                if i == fail_after:
+                    raise httpx.ReadError("connection reset")
+                await asyncio.sleep(delay)
+                event = {"choices": [{"delta": {"content": text}, "finish_reason": None}]}
+                yield f"data: {json.dumps(event)}\n\n".encode()
+            yield b"data: [DONE]\n\n"
+        return httpx.Response(200, headers={"Content-Type": "text/event-stream"}, content=body())
+    return Upstream(respond)
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
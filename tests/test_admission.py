@@ -0,0 +1,95 @@
+import asyncio
+import json
+
+import httpx
+
+from src.router import LLMRouter
+from src.utils.admission import AdmissionQueue
+from tests.mocks import Upstream, collect, completion, make_provider, stream
+
+def one_slot_router(upstream, **queue_options):
+    """A router whose only provider takes one request at a time, with an admission queue"""
+    return LLMRouter(
+        providers=[make_provider("p", upstream)],
+        admission_queue=AdmissionQueue(**queue_options),
+        concurrency_limit_options={"initial_limit": 1, "min_limit": 1}
+    )
+
+def echo(delay):
+    """Upstream answering with the prompt it was sent, after ``delay`` seconds"""
+    async def respond(request):
+        await asyncio.sleep(delay)
+        prompt = json.loads(request.content)["messages"][-1]["content"]
+        return httpx.Response(200, json={"choices": [{"message": {"content": prompt}}], "usage": {"total_tokens": 5}})
+    return Upstream(respond)
+
+def test_interactive_requests_overtake_batch_ones():
+    upstream = echo(0.02)
+    router = one_slot_router(upstream)
+    served = []
+
+    async def call(prompt, priority):
+        result = await router.generate(prompt, "m", {"priority": priority})
+        served.append(result["text"])
+
+    async def calls():
+        first = asyncio.ensure_future(call("first", "default"))
+        await asyncio.sleep(0.005)
+        waiting = [asyncio.ensure_future(call("batch", "batch"))]
+        await asyncio.sleep(0.005)
+        waiting.append(asyncio.ensure_future(call("interactive", "interactive")))
+        await asyncio.gather(first, *waiting)
+
+    asyncio.run(calls())
+    assert served == ["first", "interactive", "batch"]
+    assert router.admission_queue.stats()["admitted"] == 3
+
+def test_requests_leave_the_queue_when_their_wait_runs_out():
+    router = one_slot_router(completion(delay=0.3), max_wait=0.05)
+
+    async def calls():
+        return await asyncio.gather(
+            router.generate("hi", "m"),
+            router.generate("hi", "m"),
+            router.generate("hi", "m", {"timeout_total": 0.05}),
+        )
+
+    served, queued, bounded = asyncio.run(calls())
+    assert "error" not in served
+    assert queued["error"] == "queue_timeout"
+    assert bounded["error"] == "deadline_exceeded"
+    assert router.admission_queue.stats()["expired"] == 2
+
+def test_streams_wait_for_capacity():
+    upstream = stream(["a", "b"], delay=0.02)
+    router = one_slot_router(upstream)
+
+    async def calls():
+        return await asyncio.gather(*(collect(router.generate_stream("hi", "m")) for _ in range(3)))
+
+    for chunks in asyncio.run(calls()):
+        assert [chunk["text"] for chunk in chunks] == ["a", "b"]
+    assert len(upstream.requests) == 3
+
+class SaturatedRouter:
+    """Router stand-in without capacity that counts capacity lookups"""
+
+    def __init__(self):
+        self.lookups = 0
+
+    def time_until_capacity(self, model_name=None, tokens=0):
+        self.lookups += 1
+        return 0.5
+
+    def remaining_capacity(self):
+        return 0
+
+def test_waiters_of_the_same_shape_share_one_capacity_lookup_per_round():
+    router = SaturatedRouter()
+    queue = AdmissionQueue()
+
+    async def waiters():
+        return await asyncio.gather(*(queue.wait(router, "m", 100, timeout=0.05) for _ in range(100)))
+
+    assert asyncio.run(waiters()) == [False] * 100
+    assert router.lookups <= 3
@@ -0,0 +1,61 @@
+import asyncio
+
+import httpx
+
+from src.router import LLMRouter
+from src.utils.batch import BatchScheduler
+from tests.mocks import Upstream, completion, error, make_provider
+
+def run(coro):
+    return asyncio.run(coro)
+
+async def batch(router, prompts, model_name="m", **options):
+    scheduler = BatchScheduler(router, prompts, model_name, **{"retry_backoff": 0.01, "max_wait": 0.05, **options})
+    results = [result async for result in scheduler.run()]
+    return sorted(results, key=lambda result: result["index"]), scheduler
+
+def test_batch_yields_every_result():
+    upstream = completion("done")
+    router = LLMRouter(providers=[make_provider("p", upstream)])
+    results, scheduler = run(batch(router, [f"prompt {i}" for i in range(10)], concurrency=3))
+    assert [result["index"] for result in results] == list(range(10))
+    assert all(result["text"] == "done" for result in results)
+    assert scheduler.stats()["succeeded"] == 10 and scheduler.stats()["in_flight"] == 0
+
+def test_batch_retries_failures_then_gives_up():
+    upstream = error(500, "boom")
+    router = LLMRouter(providers=[make_provider("p", upstream)],
+                       circuit_breaker_options={"failure_threshold": 100})
+    results, scheduler = run(batch(router, ["a"], max_retries=2))
+    assert results[0]["attempts"] == 3 and "error" in results[0]
+    assert len(upstream.requests) == 3
+    assert scheduler.stats()["failed"] == 1
+
+def test_batch_terminates_when_no_provider_can_ever_serve_it():
+    # A single key that gets a 401 leaves no capacity that could ever free up
+    router = LLMRouter(providers=[make_provider("p", error(401, "invalid api key"))])
+    results, scheduler = run(asyncio.wait_for(batch(router, ["a", "b", "c"]), 5))
+    assert len(results) == 3 and all("error" in result for result in results)
+    assert scheduler.stats()["completed"] == 3 and scheduler.stats()["in_flight"] == 0
+
+def test_batch_fails_prompts_larger_than_every_token_limit():
+    router = LLMRouter(providers=[make_provider("p", completion(), rate_limits={"tokens_per_minute": 50})])
+    results, _ = run(asyncio.wait_for(batch(router, ["x" * 1000]), 5))
+    assert "error" in results[0]
+
+def test_stopping_a_batch_early_cancels_the_prompts_in_flight():
+    async def respond(request):
+        # The first prompt answers right away, the others take a while
+        await asyncio.sleep(0 if b"fast" in request.content else 1)
+        return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}], "usage": {"total_tokens": 5}})
+
+    router = LLMRouter(providers=[make_provider("p", Upstream(respond))])
+
+    async def first_result():
+        results = router.generate_many(["fast", "slow", "slow"], "m", concurrency=3)
+        first = await results.__anext__()
+        await results.aclose()
+        assert router.get_concurrency_limits()["p"]["in_flight"] == 0
+        return first
+
+    assert run(asyncio.wait_for(first_result(), 0.5))["index"] == 0
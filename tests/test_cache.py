@@ -0,0 +1,71 @@
+import asyncio
+
+from src.router import LLMRouter
+from src.utils.cache import ResponseCache, SQLiteCacheStore
+from tests.mocks import FakeClock, completion, make_provider
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_mutating_a_response_leaves_the_cache_intact():
+    cache = ResponseCache()
+    response = {"text": "hello", "usage": {"total_tokens": 10}}
+    cache.set("k", response)
+    response["text"] = "changed"
+
+    hit = cache.get("k")
+    hit["usage"]["total_tokens"] = 0
+    assert cache.get("k") == {"text": "hello", "usage": {"total_tokens": 10}}
+
+def test_per_call_fields_are_not_cached():
+    cache = ResponseCache()
+    cache.set("k", {"text": "hello", "hedged": True, "coalesced": True})
+    assert cache.get("k") == {"text": "hello"}
+
+def test_entries_expire_after_the_ttl():
+    clock = FakeClock()
+    cache = ResponseCache(ttl=10, clock=clock)
+    cache.set("k", {"text": "hello"})
+    clock.advance(11)
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(max_entries=2)
+    cache.set("a", {"text": "a"})
+    cache.set("b", {"text": "b"})
+    cache.get("a")
+    cache.set("c", {"text": "c"})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"text": "a"}
+    assert cache.stats()["evictions"] == 1
+
+def test_persistent_tier_survives_a_new_memory_tier(tmp_path):
+    path = tmp_path / "cache.db"
+    ResponseCache(persistent=SQLiteCacheStore(path)).set("k", {"text": "hello", "hedged": False})
+
+    cache = ResponseCache(persistent=SQLiteCacheStore(path))
+    hit = cache.get("k")
+    hit["text"] = "changed"
+    assert cache.get("k") == {"text": "hello"}
+    assert cache.stats()["persistent_hits"] == 1
+
+def test_router_serves_repeated_requests_from_the_cache():
+    upstream = completion("hello")
+    router = LLMRouter(providers=[make_provider("p", upstream)], cache=ResponseCache())
+
+    async def calls():
+        first = await router.generate("hi", "m")
+        first["text"] = "changed"
+        return await router.generate("hi", "m"), await router.generate("hi", "m", {"cache": "bypass"})
+
+    cached, bypassed = run(calls())
+    assert cached["text"] == "hello" and cached["cached"] is True
+    assert "cached" not in bypassed
+    assert len(upstream.requests) == 2
+
+def test_only_if_cached_never_calls_a_provider():
+    upstream = completion()
+    router = LLMRouter(providers=[make_provider("p", upstream)], cache=ResponseCache())
+    assert run(router.generate("hi", "m", {"cache": "only_if_cached"})) == {"error": "not_cached"}
+    assert upstream.requests == []
@@ -0,0 +1,69 @@
+import asyncio
+import collections
+import json
+
+from benchmarks import replay, simulate
+from src.router import LLMRouter
+from src.utils.capture import TrafficCapture, hash_text
+from tests.mocks import collect, error, make_provider, stream
+
+def capture_traffic(path):
+    """Send calls and streams through a router whose primary provider fails every other request"""
+    failures = iter([True, False] * 10)
+
+    async def flaky_stream(request):
+        upstream = error(500, "boom") if next(failures) else stream(["a", "b"])
+        return await upstream.respond(request)
+
+    capture = TrafficCapture(path)
+    router = LLMRouter(providers=[
+        make_provider("primary", flaky_stream, {"m": 9}),
+        make_provider("backup", stream(["from backup"], delay=0.01), {"m": 1}),
+    ], hooks=capture, circuit_breaker_options={"failure_threshold": 100})
+    capture.record_config(router)
+
+    async def traffic():
+        for index in range(6):
+            await collect(router.generate_stream(f"stream {index}", "m"))
+        await capture.aclose()
+
+    asyncio.run(traffic())
+
+def test_capture_records_every_attempt(tmp_path):
+    path = tmp_path / "capture.jsonl"
+    capture_traffic(path)
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert records[0]["type"] == "config" and set(records[0]["providers"]) == {"primary", "backup"}
+
+    requests = records[1:]
+    assert len(requests) == 6 and all(record["outcome"] == "success" for record in requests)
+    first = requests[0]
+    assert first["prompt_sha256"] == hash_text("stream 0") and "prompt" not in first
+    assert [(a["provider"], a["outcome"], a.get("status")) for a in first["attempts"]] == [
+        ("primary", "error", 500), ("backup", "success", None)
+    ]
+    assert first["fallbacks"] == 1
+    assert [candidate[0] for candidate in first["candidates"]] == ["primary", "backup"]
+
+def test_replay_reproduces_the_captured_routing(tmp_path, monkeypatch):
+    path = tmp_path / "capture.jsonl"
+    capture_traffic(path)
+    config, captured = replay.load_capture(path)
+
+    # Every stream must be closed by the router, none left for the garbage collector
+    finalized = collections.Counter()
+    original = simulate.VirtualTimeLoop._asyncgen_finalizer_hook
+
+    def finalizer(loop, agen):
+        finalized[agen.__qualname__] += 1
+        return original(loop, agen)
+
+    monkeypatch.setattr(simulate.VirtualTimeLoop, "_asyncgen_finalizer_hook", finalizer)
+    replayed, upstreams = simulate.run_virtual(replay.replay(config["providers"], captured))
+
+    report = replay.compare(captured, replayed, upstreams)
+    assert report["requests"] == 6
+    assert report["same_provider"] == 1.0 and report["same_first_choice"] == 1.0
+    assert report["replayed"]["outcomes"] == {"success": 6}
+    assert upstreams["primary"].unrecorded == 0
+    assert not finalized
@@ -0,0 +1,50 @@
+import asyncio
+
+import httpx
+
+from src.router import LLMRouter
+from src.utils.catalog import ModelCatalog, merge_models
+from src.utils.negative_cache import MODEL_NOT_FOUND
+from tests.mocks import make_provider
+
+LISTED = ["llama-70b", "llama-8b:free", "whisper-large", "llama-guard"]
+
+def run(coro):
+    return asyncio.run(coro)
+
+def models_endpoint(ids):
+    async def respond(request):
+        return httpx.Response(200, json={"data": [{"id": model_id} for model_id in ids]})
+    return respond
+
+def test_without_include_only_configured_models_are_kept():
+    configured = {"llama-70b": 8, "retired": 6}
+    assert merge_models(configured, LISTED) == {"llama-70b": 8}
+
+def test_include_and_exclude_choose_the_new_models():
+    models = merge_models({"llama-70b": 8}, LISTED, default_score=3, include=["llama-*"], exclude=["*guard*"])
+    assert models == {"llama-70b": 8, "llama-8b:free": 3}
+
+def test_refresh_applies_the_merged_models(tmp_path):
+    provider = make_provider(
+        "p", models_endpoint(LISTED), {"llama-70b": 8, "retired": 6}, discovery={"include": ["*:free"]}
+    )
+    router = LLMRouter(providers=[provider], model_catalog=ModelCatalog(tmp_path / "catalog.json"))
+    router.model_catalog.router = router
+    run(router.model_catalog.refresh())
+
+    assert provider.available_models == {"llama-70b": 8, "llama-8b:free": 1}
+    assert "retired" not in router.model_map
+    assert (tmp_path / "catalog.json").exists()
+
+def test_removed_models_leave_no_stale_state():
+    router = LLMRouter(providers=[make_provider("p", models_endpoint([]), {"m": 5, "retired": 6})])
+    router._mark_dead("p", "retired", MODEL_NOT_FOUND, "gone")
+    router._get_circuit("p", "retired").trip(60)
+
+    router.set_provider_models("p", {"m": 5})
+    assert router.get_dead_models() == []
+    assert "retired" not in router.provider_health["p"]["model_circuits"]
+
+    router.set_provider_models("p", {"m": 5, "retired": 6})
+    assert router._circuit_available("p", "retired")
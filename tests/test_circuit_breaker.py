@@ -0,0 +1,123 @@
+import asyncio
+import time
+from email.utils import formatdate
+
+import pytest
+
+from src.providers.base import parse_retry_after
+from src.router import LLMRouter
+from src.utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from tests.mocks import FakeClock, completion, error, make_provider
+
+def test_opens_after_consecutive_failures():
+    clock = FakeClock()
+    circuit = CircuitBreaker(failure_threshold=3, recovery_timeout=30, clock=clock)
+    circuit.record_failure()
+    circuit.record_failure()
+    circuit.record_success()  # resets the count
+    circuit.record_failure()
+    circuit.record_failure()
+    assert circuit.state == CLOSED
+    circuit.record_failure()
+    assert circuit.state == OPEN
+    assert not circuit.allow_request()
+    assert circuit.retry_in() == pytest.approx(30)
+
+def test_half_open_lets_one_probe_through():
+    clock = FakeClock()
+    circuit = CircuitBreaker(failure_threshold=1, recovery_timeout=30, clock=clock)
+    circuit.record_failure()
+    clock.advance(30)
+    assert circuit.state == HALF_OPEN
+    assert circuit.allow_request()
+    assert not circuit.allow_request()
+    assert not circuit.is_available()
+
+    # A cancelled probe gives its permission back
+    circuit.release()
+    assert circuit.allow_request()
+    circuit.record_success()
+    assert circuit.state == CLOSED
+    assert circuit.allow_request() and circuit.allow_request()
+
+def test_failed_probe_doubles_the_cooldown_up_to_the_cap():
+    clock = FakeClock()
+    circuit = CircuitBreaker(failure_threshold=1, recovery_timeout=30, max_recovery_timeout=100, clock=clock)
+    circuit.record_failure()
+    for expected in (60, 100, 100):
+        clock.advance(circuit.retry_in())
+        assert circuit.allow_request()
+        circuit.record_failure()
+        assert circuit.state == OPEN
+        assert circuit.retry_in() == pytest.approx(expected)
+
+def test_trip_opens_for_the_given_cooldown():
+    clock = FakeClock()
+    circuit = CircuitBreaker(clock=clock)
+    circuit.trip(7)
+    assert circuit.state == OPEN
+    clock.advance(6.9)
+    assert not circuit.is_available()
+    clock.advance(0.1)
+    assert circuit.is_available()
+
+@pytest.mark.parametrize("headers, expected", [
+    ({"retry-after": "12"}, 12),
+    ({"retry-after": "-3"}, 0),
+    ({"x-ratelimit-reset-requests": "2m59.5s"}, 179.5),
+    ({"x-ratelimit-reset-tokens": "120ms", "x-ratelimit-reset-requests": "7s"}, 0.12),
+    ({}, None),
+    ({"retry-after": "soon"}, None),
+])
+def test_parse_retry_after(headers, expected):
+    if expected is None:
+        assert parse_retry_after(headers) is None
+    else:
+        assert parse_retry_after(headers) == pytest.approx(expected, abs=1.0)
+
+def test_parse_retry_after_timestamps():
+    now = time.time()
+    assert parse_retry_after({"retry-after": formatdate(now + 60, usegmt=True)}) == pytest.approx(60, abs=2)
+    assert parse_retry_after({"x-ratelimit-reset": str(int((now + 30) * 1000))}) == pytest.approx(30, abs=1)
+    assert parse_retry_after({"x-ratelimit-reset": str(int(now + 30))}) == pytest.approx(30, abs=2)
+
+def test_429_opens_the_provider_circuit_for_retry_after():
+    clock = FakeClock()
+    limited = error(429, "slow down", headers={"Retry-After": "20"})
+    backup = completion("from backup")
+    router = LLMRouter(
+        providers=[make_provider("limited", limited, {"m": 9}), make_provider("backup", backup, {"m": 1})],
+        clock=clock
+    )
+
+    async def run():
+        assert (await router.generate("hi", "m"))["text"] == "from backup"
+        # While the circuit is open the limited provider gets no requests at all
+        assert (await router.generate("hi", "m"))["text"] == "from backup"
+        assert len(limited.requests) == 1
+        assert router.get_circuit_states()["limited"]["circuit"]["retry_in"] == pytest.approx(20)
+
+        # After Retry-After one probe goes out; another 429 opens the circuit again
+        clock.advance(20)
+        assert (await router.generate("hi", "m"))["text"] == "from backup"
+        assert len(limited.requests) == 2
+        assert router.get_circuit_states()["limited"]["circuit"]["state"] == OPEN
+
+    asyncio.run(run())
+
+def test_server_errors_open_the_circuit_and_skip_the_provider():
+    clock = FakeClock()
+    broken = error(503, "unavailable")
+    router = LLMRouter(
+        providers=[make_provider("broken", broken, {"m": 9}), make_provider("backup", completion(), {"m": 1})],
+        circuit_breaker_options={"failure_threshold": 2, "recovery_timeout": 30},
+        clock=clock
+    )
+
+    async def run():
+        for _ in range(4):
+            assert "error" not in await router.generate("hi", "m")
+
+    asyncio.run(run())
+    assert len(broken.requests) == 2
+    assert router.get_circuit_states()["broken"]["circuit"]["state"] == OPEN
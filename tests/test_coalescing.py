@@ -0,0 +1,68 @@
+import asyncio
+
+from src.router import LLMRouter
+from tests.mocks import collect, completion, make_provider, stream
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_identical_concurrent_requests_share_one_call():
+    upstream = completion("shared", delay=0.05)
+    router = LLMRouter(providers=[make_provider("p", upstream)], coalesce=True)
+
+    async def calls():
+        return await asyncio.gather(*(router.generate("hi", "m") for _ in range(3)))
+
+    results = run(calls())
+    assert [result["text"] for result in results] == ["shared"] * 3
+    assert sorted(bool(result.get("coalesced")) for result in results) == [False, True, True]
+    assert len(upstream.requests) == 1
+
+def test_requests_with_other_dispatch_options_are_not_coalesced():
+    upstream = completion(delay=0.05)
+    router = LLMRouter(providers=[make_provider("p", upstream)], coalesce=True)
+
+    async def calls():
+        await asyncio.gather(router.generate("hi", "m"), router.generate("hi", "m", {"hedge": True}))
+
+    run(calls())
+    assert len(upstream.requests) == 2
+
+def test_joined_request_keeps_its_own_deadline():
+    upstream = completion("slow", delay=0.5)
+    router = LLMRouter(providers=[make_provider("p", upstream)], coalesce=True)
+
+    async def calls():
+        leader = asyncio.ensure_future(router.generate("hi", "m"))
+        await asyncio.sleep(0.01)
+        joiner = await router.generate("hi", "m", {"timeout_total": 0.05})
+        assert not leader.done()
+        return await leader, joiner
+
+    leader, joiner = run(calls())
+    assert joiner["error"] == "deadline_exceeded"
+    assert leader["text"] == "slow"
+    assert len(upstream.requests) == 1
+
+def test_concurrent_streams_share_one_upstream_stream():
+    upstream = stream(["a", "b"], delay=0.02)
+    router = LLMRouter(providers=[make_provider("p", upstream)], coalesce=True)
+
+    async def calls():
+        return await asyncio.gather(*(collect(router.generate_stream("hi", "m")) for _ in range(2)))
+
+    first, second = run(calls())
+    assert [chunk["text"] for chunk in first] == [chunk["text"] for chunk in second] == ["a", "b"]
+    assert len(upstream.requests) == 1
+
+def test_closing_the_last_shared_stream_releases_the_upstream():
+    router = LLMRouter(providers=[make_provider("p", stream(["a", "b", "c"], delay=0.01))], coalesce=True)
+
+    async def read_one():
+        chunks = router.generate_stream("hi", "m")
+        await chunks.__anext__()
+        await chunks.aclose()
+        assert router.get_concurrency_limits()["p"]["in_flight"] == 0
+        assert router.inflight_streams.in_flight() == 0
+
+    run(read_one())
@@ -0,0 +1,82 @@
+import asyncio
+
+import httpx
+
+from src.router import LLMRouter
+from src.utils.concurrency import AdaptiveConcurrencyLimiter
+from tests.mocks import FakeClock, Upstream, error, make_provider
+
+def test_overload_halves_the_limit_down_to_the_floor():
+    clock = FakeClock()
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=40, clock=clock)
+    assert limiter.min_limit == 10
+    for _ in range(5):
+        assert limiter.try_acquire()
+        limiter.record_overload()
+        clock.advance(1)
+    assert limiter.limit == 10
+    assert limiter.in_flight == 0
+
+def test_one_congestion_event_shrinks_the_limit_once():
+    clock = FakeClock()
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=20, clock=clock)
+    for _ in range(5):
+        limiter.try_acquire()
+    for _ in range(5):
+        limiter.record_overload()
+    assert limiter.limit == 10 and limiter.decreases == 1
+
+def test_limit_grows_only_while_it_is_used():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=4, clock=FakeClock())
+    limiter.try_acquire()
+    limiter.record_success()
+    assert limiter.increases == 0
+
+    for _ in range(40):
+        for _ in range(limiter.limit):
+            limiter.try_acquire()
+        for _ in range(limiter.limit):
+            limiter.record_success()
+    assert limiter.limit > 4
+
+def test_limit_starts_at_the_request_rate_limit():
+    router = LLMRouter(providers=[
+        make_provider("one", error(500), rate_limits={"requests_per_minute": 30}),
+        make_provider("pool", error(500), rate_limits={"requests_per_minute": 30}, api_key=["a", "b"]),
+        make_provider("fast", error(500), rate_limits={"requests_per_minute": 1000}),
+    ])
+    limits = router.get_concurrency_limits()
+    assert [limits[name]["limit"] for name in ("one", "pool", "fast")] == [30, 60, 200]
+
+    router = LLMRouter(providers=[make_provider("one", error(500))], concurrency_limit_options={"initial_limit": 5})
+    assert router.get_concurrency_limits()["one"]["limit"] == 5
+
+def flaky(every):
+    """Upstream that answers every ``every``-th request with a 500"""
+    async def respond(request):
+        if len(upstream.requests) % every == 0:
+            return httpx.Response(500, json={"error": {"message": "internal error"}})
+        return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}], "usage": {"total_tokens": 5}})
+    upstream = Upstream(respond)
+    return upstream
+
+def test_sporadic_server_errors_do_not_shrink_the_limit():
+    router = LLMRouter(
+        providers=[make_provider("p", flaky(5), rate_limits={"requests_per_minute": 40})],
+        circuit_breaker_options={"failure_threshold": 100}
+    )
+
+    async def run():
+        for _ in range(10):
+            await asyncio.gather(*(router.generate("hi", "m") for _ in range(10)))
+
+    asyncio.run(run())
+    state = router.get_concurrency_limits()["p"]
+    assert state["limit"] == 40 and state["decreases"] == 0 and state["in_flight"] == 0
+
+def test_503s_and_429s_shrink_the_limit():
+    for status in (503, 429):
+        router = LLMRouter(providers=[make_provider("p", error(status), rate_limits={"requests_per_minute": 40})])
+        asyncio.run(router.generate("hi", "m"))
+        state = router.get_concurrency_limits()["p"]
+        assert state["limit"] == 20 and state["decreases"] == 1
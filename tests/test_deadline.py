@@ -0,0 +1,38 @@
+import asyncio
+
+from src.router import LLMRouter
+from tests.mocks import collect, completion, make_provider, stream
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_deadline_returns_in_time_without_penalising_the_provider():
+    router = LLMRouter(providers=[make_provider("slow", completion(delay=1.0))])
+    limit = router.get_concurrency_limits()["slow"]["limit"]
+
+    async def calls():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        results = [await router.generate("hi", "m", {"timeout_total": 0.1}) for _ in range(6)]
+        return results, loop.time() - start
+
+    results, elapsed = run(calls())
+    assert {result["error"] for result in results} == {"deadline_exceeded"}
+    assert elapsed < 1.5
+    # The caller's budget ran out, not the provider's timeout
+    assert router.get_circuit_states()["slow"]["circuit"]["state"] == "closed"
+    assert router.get_concurrency_limits()["slow"]["limit"] == limit
+    assert router.get_concurrency_limits()["slow"]["in_flight"] == 0
+    assert router.provider_health["slow"]["error_count"] == 0
+
+def test_deadline_bounds_a_stream():
+    router = LLMRouter(providers=[make_provider("slow", stream(["a", "b", "c", "d"], delay=0.15))])
+    chunks = run(collect(router.generate_stream("hi", "m", {"timeout_total": 0.4})))
+    assert [chunk["text"] for chunk in chunks[:-1]] == ["a", "b"]
+    assert chunks[-1]["error"] == "deadline_exceeded"
+    assert router.get_concurrency_limits()["slow"]["in_flight"] == 0
+
+def test_deadline_bounds_the_time_to_the_first_chunk():
+    router = LLMRouter(providers=[make_provider("slow", stream(["a"], delay=1.0))])
+    chunks = run(collect(router.generate_stream("hi", "m", {"timeout_total": 0.1})))
+    assert len(chunks) == 1 and chunks[0]["error"] == "deadline_exceeded"
@@ -0,0 +1,38 @@
+import pytest
+
+from src.providers import factory
+from src.providers.factory import create_all_providers, get_provider_class, is_registered, register_provider
+from tests.mocks import MockProvider
+
+def section(name, **config):
+    return {"class": "tests.mocks:MockProvider", "name": name, "base_url": f"https://{name}.test/v1",
+            "models": {"m": 5}, **config}
+
+def test_providers_without_keys_are_skipped_before_import():
+    configs = {
+        "keyed": section("keyed"),
+        "keyless": section("keyless", **{"class": "tests.not_a_module:Provider"}),
+        "local": section("local", requires_key=False),
+        "empty_keys": section("empty_keys"),
+    }
+    providers = create_all_providers({"keyed": "k", "empty_keys": ["", None]}, configs)
+    assert [provider.name for provider in providers] == ["keyed", "local"]
+
+def test_unknown_providers_are_skipped():
+    configs = {"unknown": {"name": "unknown", "models": {"m": 5}}}
+    assert create_all_providers({"unknown": "k"}, configs) == []
+
+def test_registered_classes_are_imported_on_first_use():
+    register_provider("lazy", "tests.mocks:MockProvider")
+    try:
+        assert is_registered("lazy")
+        assert factory.PROVIDER_CLASSES["lazy"] == "tests.mocks:MockProvider"
+        assert get_provider_class("lazy") is MockProvider
+        assert factory.PROVIDER_CLASSES["lazy"] is MockProvider
+    finally:
+        del factory.PROVIDER_CLASSES["lazy"]
+
+def test_class_in_config_takes_precedence():
+    assert get_provider_class("groq", {"class": "tests.mocks:MockProvider"}) is MockProvider
+    with pytest.raises(ValueError):
+        get_provider_class("not_registered_anywhere")
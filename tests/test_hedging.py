@@ -0,0 +1,47 @@
+import asyncio
+import time
+
+from tests.mocks import completion, error, two_providers
+
+HEDGE = {"hedge": True, "hedge_after": 0.05}
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_slow_candidate_is_raced_by_a_backup():
+    primary, backup = completion("slow", delay=1.0), completion("fast")
+    router = two_providers(primary, backup)
+
+    async def call():
+        result = await router.generate("hi", "m", HEDGE)
+        # The losing request was cancelled and gave back its slot
+        assert router.provider_health["primary"]["concurrency"].in_flight == 0
+        return result
+
+    result = run(call())
+    assert result["text"] == "fast" and result["hedged"] is True
+    assert len(primary.requests) == len(backup.requests) == 1
+    assert router.provider_health["primary"]["error_count"] == 0
+
+def test_fast_candidate_needs_no_backup():
+    primary, backup = completion("fast"), completion("backup")
+    router = two_providers(primary, backup)
+    result = run(router.generate("hi", "m", HEDGE))
+    assert result["text"] == "fast" and result["hedged"] is False
+    assert backup.requests == []
+
+def test_failure_starts_the_next_candidate_at_once():
+    router = two_providers(error(500), completion("backup"))
+    start = time.monotonic()
+    result = run(router.generate("hi", "m", {"hedge": True, "hedge_after": 5.0}))
+    assert result["text"] == "backup"
+    assert time.monotonic() - start < 1.0
+
+def test_hedge_delay_follows_the_latency_percentile():
+    router = two_providers(completion(), completion())
+    assert router._hedge_delay("primary", "m", {"hedge_after": 0.3}) == 0.3
+    for latency in (0.1, 0.2, 0.3, 0.4, 1.0):
+        router._record_latency("primary", "m", latency)
+    stats = router.get_latency_stats("primary", "m")
+    assert router._hedge_delay("primary", "m", {}) == stats.p95
+    assert router._hedge_delay("primary", "m", {"hedge_after": "p50"}) == stats.percentile(50)
@@ -0,0 +1,68 @@
+import asyncio
+
+import httpx
+
+from src.providers.key_pool import ROUND_ROBIN, KeyPool
+from src.router import LLMRouter
+from tests.mocks import FakeClock, Upstream, make_provider
+
+def keyed(responses):
+    """Upstream answering by API key: a status code, or 200 with the key as text"""
+    async def respond(request):
+        key = request.headers["Authorization"].split()[-1]
+        status = responses.get(key, 200)
+        if status != 200:
+            return httpx.Response(status, json={"error": {"message": f"key {key} rejected"}})
+        return httpx.Response(200, json={"choices": [{"message": {"content": key}}], "usage": {"total_tokens": 5}})
+    return Upstream(respond)
+
+def test_revoked_key_is_skipped_and_the_request_retried():
+    upstream = keyed({"bad": 401})
+    provider = make_provider("p", upstream, api_key=["bad", "good"], key_selection=ROUND_ROBIN)
+    router = LLMRouter(providers=[provider])
+
+    async def run():
+        return [await router.generate("hi", "m") for _ in range(3)]
+
+    results = asyncio.run(run())
+    assert [result["text"] for result in results] == ["good", "good", "good"]
+    # The bad key was tried once, then left the pool for good
+    assert len(upstream.requests) == 4
+    states = {state["key"]: state for state in router.get_key_states()["p"]}
+    assert states["...bad"]["revoked"] and states["...bad"]["error_count"] == 1
+    assert states["...good"]["success_count"] == 3
+    # Another key still works, so the provider stays in routing
+    assert router.get_dead_models() == []
+
+def test_provider_is_excluded_once_every_key_is_revoked():
+    upstream = keyed({"one": 401, "two": 401})
+    backup = keyed({})
+    router = LLMRouter(providers=[
+        make_provider("p", upstream, {"m": 9}, api_key=["one", "two"]),
+        make_provider("backup", backup, {"m": 1}, api_key="spare"),
+    ])
+
+    async def run():
+        return [await router.generate("hi", "m") for _ in range(2)]
+
+    results = asyncio.run(run())
+    assert [result["text"] for result in results] == ["spare", "spare"]
+    assert len(upstream.requests) == 2
+    dead = router.get_dead_models()
+    assert [(entry["provider"], entry["model"], entry["reason"]) for entry in dead] == [("p", None, "auth_failed")]
+    assert router.time_until_capacity("m") == 0
+    assert router.providers["p"].time_until_available() == float("inf")
+
+def test_throttled_key_sits_out_its_cooldown():
+    clock = FakeClock()
+    pool = KeyPool("p", ["a", "b"], clock=clock)
+    first, second = pool.keys
+    pool.throttle(first, 30, "rate_limit_exceeded")
+    assert pool.usable() == [second]
+    assert pool.retry_in(first) == 30
+    clock.advance(30)
+    assert pool.usable() == [first, second]
+
+def test_single_key_pool_uses_the_provider_window():
+    assert [key.rate_limit_name for key in KeyPool("groq", "k").keys] == ["groq"]
+    assert [key.rate_limit_name for key in KeyPool("groq", ["a", "b"]).keys] == ["groq[0]", "groq[1]"]
@@ -0,0 +1,39 @@
+import asyncio
+
+from src.utils.metrics import MetricsRecorder
+from tests.mocks import completion, error, two_providers
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_records_attempts_requests_and_fallbacks():
+    metrics = MetricsRecorder()
+    router = two_providers(error(500), completion(total_tokens=12), hooks=metrics)
+    run(router.generate("hi", "m"))
+
+    snapshot = metrics.snapshot()
+    outcomes = {(a["provider"], a["outcome"]): a["count"] for a in snapshot["attempts"]}
+    assert outcomes == {("primary", "error"): 1, ("backup", "success"): 1}
+    assert snapshot["tokens"] == [{"provider": "backup", "model": "m", "tokens": 12}]
+    assert snapshot["requests"]["success"]["count"] == 1
+    assert snapshot["fallbacks"]["sum"] == 1
+
+def test_rate_limited_attempts_are_told_apart():
+    metrics = MetricsRecorder()
+    router = two_providers(error(429), completion(), hooks=metrics)
+    run(router.generate("hi", "m"))
+    assert {a["outcome"] for a in metrics.snapshot()["attempts"]} == {"rate_limited", "success"}
+
+def test_prometheus_output():
+    metrics = MetricsRecorder(buckets=(0.1, 1.0))
+    metrics.attempt_finished(None, "p", 'm"1', "success", 0.5, 7)
+    metrics.request_finished(None, 'm"1', "success", 0.5, 0)
+    text = metrics.to_prometheus()
+
+    assert "# TYPE llm_router_attempts_total counter" in text
+    assert 'llm_router_attempts_total{provider="p",model="m\\"1",outcome="success"} 1' in text
+    assert 'llm_router_attempt_latency_seconds_bucket{provider="p",model="m\\"1",outcome="success",le="0.1"} 0' in text
+    assert 'llm_router_attempt_latency_seconds_bucket{provider="p",model="m\\"1",outcome="success",le="+Inf"} 1' in text
+    assert 'llm_router_tokens_total{provider="p",model="m\\"1"} 7' in text
+    assert 'llm_router_requests_total{outcome="success"} 1' in text
+    assert text.endswith("\n")
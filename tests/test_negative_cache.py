@@ -0,0 +1,80 @@
+import asyncio
+import json
+
+import pytest
+
+from src.router import LLMRouter
+from src.utils.negative_cache import AUTH_FAILED, MODEL_NOT_FOUND, PAYMENT_REQUIRED, NegativeCache, classify_failure
+from tests.mocks import FakeClock, completion, error, make_provider
+
+def body(message, code=None):
+    return json.dumps({"error": {"message": message, "code": code}})
+
+@pytest.mark.parametrize("message", [
+    "The model `llama-3.1-70b-versatile` has been decommissioned and is no longer supported.",
+    "The model `llama-3.1-405b` does not exist or you do not have access to it.",
+    "meta-llama/llama-3.2-3b:free is not a valid model ID",
+    "Invalid model 'sonar-huge'. Permitted models can be found in the documentation.",
+    "No endpoints found for mistralai/mistral-7b-instruct:free.",
+])
+def test_missing_model_400s_are_permanent(message):
+    assert classify_failure(400, body(message)) == MODEL_NOT_FOUND
+
+@pytest.mark.parametrize("message", [
+    "model: max_tokens value is invalid",
+    "Requested model context length exceeded, input is invalid",
+    "temperature out of range for model X; value not supported",
+    "model 'x' does not support tools",
+    "tool 'search' not found for this model",
+])
+def test_request_400s_are_not_permanent(message):
+    assert classify_failure(400, body(message)) is None
+
+def test_status_codes():
+    assert classify_failure(400, body("bad", "model_decommissioned")) == MODEL_NOT_FOUND
+    assert classify_failure(404) == MODEL_NOT_FOUND
+    assert classify_failure(401) == AUTH_FAILED
+    assert classify_failure(402) == PAYMENT_REQUIRED
+    assert classify_failure(500) is None
+    assert classify_failure(429) is None
+
+def test_entries_expire_with_doubling_ttl():
+    clock = FakeClock()
+    cache = NegativeCache(ttl=10, max_ttl=25, clock=clock)
+    cache.add("p", "m", MODEL_NOT_FOUND)
+    assert cache.is_dead("p", "m") and not cache.is_dead("p", "other")
+    for ttl in (20, 25):
+        clock.advance(cache.to_list()[0]["expires_in"])
+        assert not cache.is_dead("p", "m")
+        cache.add("p", "m", MODEL_NOT_FOUND)
+        assert cache.to_list()[0]["expires_in"] == ttl
+
+    # A success resets the backoff
+    cache.discard("p", "m")
+    cache.add("p", "m", MODEL_NOT_FOUND)
+    assert cache.to_list()[0]["expires_in"] == 10
+
+def test_router_stops_routing_to_a_retired_model():
+    retired = error(404, "The model `old` does not exist")
+    router = LLMRouter(providers=[
+        make_provider("retired", retired, {"m": 9}),
+        make_provider("backup", completion("ok"), {"m": 1}),
+    ])
+
+    async def run():
+        return [await router.generate("hi", "m") for _ in range(3)]
+
+    assert [result["text"] for result in asyncio.run(run())] == ["ok"] * 3
+    assert len(retired.requests) == 1
+    assert [(entry["provider"], entry["model"]) for entry in router.get_dead_models()] == [("retired", "m")]
+
+def test_request_errors_keep_the_model_in_routing():
+    invalid = error(400, "model: max_tokens value is invalid")
+    router = LLMRouter(providers=[make_provider("p", invalid)])
+
+    async def run():
+        return [await router.generate("hi", "m") for _ in range(2)]
+
+    asyncio.run(run())
+    assert len(invalid.requests) == 2
+    assert router.get_dead_models() == []
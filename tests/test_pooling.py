@@ -0,0 +1,34 @@
+import asyncio
+
+from src.router import LLMRouter
+from tests.mocks import completion, make_provider
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_requests_share_one_pooled_client():
+    provider = make_provider("p", completion())
+    router = LLMRouter(providers=[provider])
+
+    async def calls():
+        await router.generate("one", "m")
+        client = provider.client
+        await asyncio.gather(*(router.generate(f"call {i}", "m") for i in range(5)))
+        return client
+
+    client = run(calls())
+    assert provider.client is client and not client.is_closed
+
+def test_closing_the_router_closes_the_pools():
+    provider = make_provider("p", completion())
+
+    async def lifecycle():
+        async with LLMRouter(providers=[provider]) as router:
+            client = provider.client
+            assert (await router.generate("hi", "m"))["text"] == "hello"
+        assert client.is_closed
+        # A closed pool is replaced on next use
+        assert provider.client is not client and not provider.client.is_closed
+        await provider.aclose()
+
+    run(lifecycle())
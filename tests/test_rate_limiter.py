@@ -0,0 +1,138 @@
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+from src.router import LLMRouter
+from src.utils.rate_limiter import RateLimitTracker
+from src.utils.state import SQLiteStateBackend
+from src.utils.tokens import estimate_request_tokens, estimate_tokens
+from tests.mocks import FakeClock, Upstream, completion, make_provider, stream
+
+@pytest.fixture(params=["memory", "sqlite"])
+def tracker(request, tmp_path):
+    """A (tracker, clock) pair for each rate limiter implementation"""
+    clock = FakeClock()
+    if request.param == "memory":
+        yield RateLimitTracker(clock=clock), clock
+        return
+    backend = SQLiteStateBackend(tmp_path / "state.db", clock=clock)
+    yield backend.rate_limiter(), clock
+    backend.close()
+
+def test_request_limit_and_window_expiry(tracker):
+    limiter, clock = tracker
+    limits = {"requests_per_minute": 2}
+    assert limiter.try_acquire("p", limits)
+    clock.advance(10)
+    assert limiter.try_acquire("p", limits)
+    assert not limiter.try_acquire("p", limits)
+    assert limiter.remaining("p", limits) == 0
+    assert limiter.time_until_available("p", limits) == pytest.approx(50)
+
+    # The first request leaves the window after 60s, the second one 10s later
+    clock.advance(50)
+    assert limiter.remaining("p", limits) == 1
+    assert limiter.try_acquire("p", limits)
+    assert not limiter.try_acquire("p", limits)
+
+def test_token_limit(tracker):
+    limiter, clock = tracker
+    limits = {"tokens_per_minute": 1000}
+    assert limiter.try_acquire("p", limits, 600)
+    assert not limiter.try_acquire("p", limits, 600)
+    assert limiter.try_acquire("p", limits, 400)
+    assert limiter.remaining_tokens("p", limits) == 0
+    # A request larger than the whole budget can never be admitted
+    assert limiter.time_until_available("p", limits, 1001) == float("inf")
+
+    clock.advance(61)
+    assert limiter.remaining_tokens("p", limits) == 1000
+
+def test_windows_are_per_key(tracker):
+    limiter, _ = tracker
+    limits = {"requests_per_minute": 1}
+    assert limiter.try_acquire("a", limits)
+    assert limiter.try_acquire("b", limits)
+    assert not limiter.try_acquire("a", limits)
+
+def test_correction_expires_with_its_reservation(tracker):
+    limiter, clock = tracker
+    limits = {"tokens_per_minute": 1000}
+    reservation = limiter.try_acquire("p", limits, 1000)
+    assert reservation
+
+    # The request used 100 tokens; the correction frees the rest of the estimate
+    clock.advance(30)
+    limiter.record_tokens("p", -900, reservation)
+    assert limiter.remaining_tokens("p", limits) == 900
+
+    # Once the reservation leaves the window, no credit is left behind
+    clock.advance(31)
+    assert limiter.remaining_tokens("p", limits) == 1000
+    assert not limiter.try_acquire("p", limits, 1500)
+    assert limiter.try_acquire("p", limits, 1000)
+
+def test_correction_of_an_expired_reservation_is_dropped(tracker):
+    limiter, clock = tracker
+    limits = {"tokens_per_minute": 1000}
+    reservation = limiter.try_acquire("p", limits, 500)
+    clock.advance(90)
+    limiter.record_tokens("p", -500, reservation)
+    assert limiter.remaining_tokens("p", limits) == 1000
+    assert not limiter.try_acquire("p", limits, 1001)
+
+def test_concurrent_reservations_never_exceed_the_limit(tracker):
+    limiter, _ = tracker
+    limits = {"requests_per_minute": 25, "tokens_per_minute": 100000}
+    granted = []
+    start = threading.Barrier(8)
+
+    def worker():
+        start.wait()
+        for _ in range(10):
+            if limiter.try_acquire("p", limits, 10):
+                granted.append(1)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(granted) == 25
+    assert limiter.remaining("p", limits) == 0
+
+# Token budgets of routed requests
+
+TOKEN_LIMITS = {"requests_per_minute": 100, "tokens_per_minute": 10000}
+
+def remaining_tokens(router, name="p"):
+    provider = router.providers[name]
+    return router.rate_limiter.remaining_tokens(provider.key_pool.keys[0].rate_limit_name, TOKEN_LIMITS)
+
+def test_reservation_is_corrected_to_the_reported_usage():
+    router = LLMRouter(providers=[make_provider("p", completion(total_tokens=42), rate_limits=TOKEN_LIMITS)])
+    asyncio.run(router.generate("hi", "m"))
+    assert remaining_tokens(router) == 10000 - 42
+
+def test_unparseable_response_gives_the_reservation_back():
+    async def respond(request):
+        return httpx.Response(200, json={"unexpected": True})
+
+    router = LLMRouter(providers=[make_provider("p", Upstream(respond), rate_limits=TOKEN_LIMITS)])
+    assert "error" in asyncio.run(router.generate("hi", "m"))
+    assert remaining_tokens(router) == 10000
+
+def test_stream_closed_early_is_settled_on_what_it_received():
+    router = LLMRouter(providers=[make_provider("p", stream(["abcd", "efgh", "ijkl"]), rate_limits=TOKEN_LIMITS)])
+    options = {"max_tokens": 500}
+
+    async def read_one():
+        chunks = router.generate_stream("hi", "m", options)
+        await chunks.__anext__()
+        await chunks.aclose()
+        return remaining_tokens(router)
+
+    used = estimate_request_tokens("hi", options) - options["max_tokens"] + estimate_tokens("abcd")
+    assert asyncio.run(read_one()) == 10000 - used
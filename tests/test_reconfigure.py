@@ -0,0 +1,63 @@
+import asyncio
+import copy
+
+import pytest
+
+from tests.mocks import Upstream, collect, completion, error, stream, two_providers
+
+def run(coro):
+    return asyncio.run(coro)
+
+def configs(router):
+    return {name: copy.deepcopy(provider.config) for name, provider in router.providers.items()}
+
+def test_reconfigure_updates_and_removes_providers_in_place():
+    router = two_providers(completion(), completion())
+    router.provider_configs = configs(router)
+    primary = router.providers["primary"]
+    health = router.provider_health["primary"]
+
+    new_configs = configs(router)
+    del new_configs["backup"]
+    new_configs["primary"]["models"] = {"m": 9, "n": 3}
+    new_configs["primary"]["rate_limits"] = {"requests_per_minute": 5}
+    changes, removed = router.reconfigure(new_configs)
+
+    assert changes["removed"] == ["backup"] and [provider.name for provider in removed] == ["backup"]
+    assert set(changes["updated"]["primary"]) == {"models", "rate_limits"}
+    # The provider instance and its health survive the reload
+    assert router.providers["primary"] is primary and router.provider_health["primary"] is health
+    assert primary.get_rate_limit_info()["requests_per_minute"] == 5
+    assert router.model_map == {"m": ["primary"], "n": ["primary"]}
+    assert "backup" not in router.provider_health
+
+def test_invalid_config_changes_nothing():
+    router = two_providers(completion(), completion())
+    router.provider_configs = configs(router)
+    # A valid new provider comes first, the broken section after it
+    new_configs = {"extra": {"class": "tests.mocks:MockProvider", "name": "extra", "requires_key": False,
+                             "models": {"m": 1}}}
+    new_configs.update(configs(router))
+    new_configs["primary"]["key_selection"] = "nonsense"
+    with pytest.raises(ValueError):
+        router.reconfigure(new_configs)
+    assert set(router.providers) == {"primary", "backup"}
+    assert router.model_map == {"m": ["primary", "backup"]}
+
+def test_provider_removed_during_a_request_is_skipped():
+    router = None
+
+    async def reload_then_fail(request):
+        router.reconfigure({"primary": router.provider_configs["primary"]})
+        return await error(500, "boom").respond(request)
+
+    router = two_providers(Upstream(reload_then_fail), completion())
+    router.provider_configs = configs(router)
+    result = run(router.generate("hi", "m"))
+    assert result["error"] == "All providers for model m failed or unavailable"
+    assert list(router.providers) == ["primary"]
+
+    router = two_providers(Upstream(reload_then_fail), stream())
+    router.provider_configs = configs(router)
+    chunks = run(collect(router.generate_stream("hi", "m")))
+    assert chunks[-1]["error"] == "All models and providers failed"
@@ -0,0 +1,53 @@
+import asyncio
+
+from tests.mocks import collect, completion, error, stream, two_providers
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_generate_falls_back_to_the_next_provider():
+    primary = error(500, "boom")
+    router = two_providers(primary, completion("from backup"))
+    result = run(router.generate("hi", "m"))
+    assert result["text"] == "from backup" and result["provider"] == "backup"
+    assert len(primary.requests) == 1
+
+def test_generate_reports_every_failed_candidate():
+    router = two_providers(error(500, "boom"), error(502, "bad gateway"))
+    result = run(router.generate("hi", "m"))
+    assert result["error"] == "All providers for model m failed or unavailable"
+    assert [detail.split(":")[0] for detail in result["details"]] == ["primary/m", "backup/m"]
+
+def test_unknown_model():
+    router = two_providers(completion(), completion())
+    assert run(router.generate("hi", "nope")) == {"error": "Model nope not available"}
+
+def test_stream_falls_back_before_the_first_chunk():
+    primary = error(503, "unavailable")
+    router = two_providers(primary, stream(["a", "b"]))
+    chunks = run(collect(router.generate_stream("hi", "m")))
+    assert [chunk["text"] for chunk in chunks] == ["a", "b"]
+    assert {chunk["provider"] for chunk in chunks} == {"backup"}
+    assert len(primary.requests) == 1
+
+def test_stream_failure_after_the_first_chunk_is_not_retried():
+    backup = stream(["x"])
+    router = two_providers(stream(["a", "b", "c"], fail_after=1), backup)
+    chunks = run(collect(router.generate_stream("hi", "m")))
+    assert chunks[0]["text"] == "a"
+    assert "error" in chunks[-1] and len(chunks) == 2
+    assert backup.requests == []
+
+def test_closing_a_stream_early_releases_its_slot():
+    router = two_providers(stream(["a", "b", "c"]), stream())
+
+    async def read_one():
+        chunks = router.generate_stream("hi", "m")
+        first = await chunks.__anext__()
+        await chunks.aclose()
+        # Checked before the event loop shuts down and finalizes leftover generators
+        assert router.get_concurrency_limits()["primary"]["in_flight"] == 0
+        assert router.providers["primary"].key_pool.keys[0].in_flight == 0
+        return first
+
+    assert run(read_one())["text"] == "a"
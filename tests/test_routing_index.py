@@ -0,0 +1,52 @@
+import asyncio
+
+from src.router import LLMRouter
+from src.utils.routing_index import RoutingIndex
+from tests.mocks import completion, error, make_provider, two_providers
+
+def run(coro):
+    return asyncio.run(coro)
+
+def order(router, model_name="m"):
+    return [provider_name for provider_name, _ in router._iter_candidates(model_name)]
+
+def test_index_orders_providers_and_models():
+    index = RoutingIndex()
+    scores = {("a", "m"): 1, ("b", "m"): 5, ("a", "big"): 9}
+    index.rebuild({"m": ["a", "b"], "big": ["a"]}, lambda p, m: scores[p, m], lambda p, m: scores[p, m])
+    assert index.model_candidates["m"] == ["b", "a"]
+    assert index.ranked_models == ["big", "m"]
+    assert not index.is_dirty
+
+    # Availability is checked while iterating, not baked into the index
+    available = lambda p, m: p != "b"
+    assert list(index.iter_candidates("m", available)) == [("a", "m")]
+    assert list(index.iter_candidates(None, available)) == [("a", "big"), ("a", "m")]
+
+def test_index_is_reused_until_something_changes():
+    router = two_providers(completion(), completion())
+    order(router)
+    version = router.routing_indexes["quality"].version
+
+    run(router.generate("hi", "m"))
+    assert router.routing_indexes["quality"].version == version
+
+    router.add_provider(make_provider("third", completion(), {"m": 5}))
+    assert order(router) == ["primary", "third", "backup"]
+    assert router.routing_indexes["quality"].version == version + 1
+
+def test_errors_reorder_the_candidates():
+    router = LLMRouter(providers=[
+        make_provider("flaky", error(500), {"m": 9}),
+        make_provider("steady", completion(), {"m": 6}),
+    ])
+    assert order(router) == ["flaky", "steady"]
+    for _ in range(2):
+        run(router.generate("hi", "m"))
+    assert order(router) == ["steady", "flaky"]
+
+def test_removed_provider_leaves_the_index():
+    router = two_providers(completion(), completion())
+    order(router)
+    router.remove_provider("primary")
+    assert order(router) == ["backup"]
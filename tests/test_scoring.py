@@ -0,0 +1,44 @@
+import asyncio
+
+from src.router import LLMRouter
+from tests.mocks import completion, make_provider, stream
+
+def run(coro):
+    return asyncio.run(coro)
+
+def slow_and_fast():
+    """A router with a better but slower provider and a faster one"""
+    router = LLMRouter(providers=[
+        make_provider("slow", completion("slow"), {"m": 9}),
+        make_provider("fast", completion("fast"), {"m": 7}),
+    ])
+    for _ in range(5):
+        router._record_latency("slow", "m", 3.0)
+        router._record_latency("fast", "m", 0.2)
+    return router
+
+def test_prefer_trades_quality_for_latency():
+    router = slow_and_fast()
+    assert run(router.generate("hi", "m"))["provider"] == "slow"
+    assert run(router.generate("hi", "m", {"prefer": "balanced"}))["provider"] == "fast"
+    assert run(router.generate("hi", "m", {"prefer": "latency"}))["provider"] == "fast"
+
+def test_latency_penalty_follows_the_scoring_weights():
+    router = slow_and_fast()
+    quality = router._get_static_score("slow", "m", "quality")
+    balanced = router._get_static_score("slow", "m", "balanced")
+    assert quality == 9
+    assert balanced < quality
+    assert router._get_static_score("slow", "m", "latency") < balanced
+
+def test_stream_records_its_time_to_first_chunk():
+    router = LLMRouter(providers=[make_provider("p", stream(["a", "b", "c"], delay=0.02))])
+
+    async def consume():
+        async for _ in router.generate_stream("hi", "m"):
+            await asyncio.sleep(0.1)  # a slow consumer doesn't make the provider look slow
+
+    run(consume())
+    stats = router.get_latency_stats("p", "m")
+    assert stats.count == 1
+    assert stats.ewma < 0.1
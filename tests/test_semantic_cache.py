@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from src.router import LLMRouter
+from src.utils.semantic_cache import SemanticCache
+from tests.mocks import FakeClock, completion, make_provider
+
+QUESTION = "What is the capital of France?"
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_near_duplicate_prompt_is_a_hit():
+    cache = SemanticCache(threshold=0.8)
+    cache.add(QUESTION, "m", {}, {"text": "Paris"})
+    response, similarity, _ = cache.lookup("what is the capitol of france", "m")
+    assert response == {"text": "Paris"}
+    assert 0.8 <= similarity < 1.0
+
+def test_unrelated_prompt_and_different_numbers_miss():
+    cache = SemanticCache(threshold=0.8)
+    cache.add(QUESTION, "m", {}, {"text": "Paris"})
+    cache.add("What is 2+2?", "m", {}, {"text": "4"})
+    assert cache.lookup("Write a poem about autumn leaves", "m") is None
+    assert cache.lookup("What is 2+3?", "m") is None
+    assert cache.stats()["misses"] == 2
+
+def test_entries_are_scoped_by_model_and_options():
+    cache = SemanticCache()
+    cache.add(QUESTION, "m", {"temperature": 0}, {"text": "Paris"})
+    assert cache.lookup(QUESTION, "other", {"temperature": 0}) is None
+    assert cache.lookup(QUESTION, "m", {"temperature": 1}) is None
+    assert cache.lookup(QUESTION, "m", {"temperature": 0})[0] == {"text": "Paris"}
+
+def test_batch_lookup_matches_each_prompt_within_its_scope():
+    cache = SemanticCache()
+    cache.add(QUESTION, "m", {}, {"text": "Paris"})
+    cache.add("Who wrote Hamlet?", "m", {}, {"text": "Shakespeare"})
+    cache.add("Who wrote Hamlet?", "other", {}, {"text": "wrong scope"})
+    results = cache.lookup_many(["who wrote hamlet", "Name a color", QUESTION], "m")
+    assert [result and result[0]["text"] for result in results] == ["Shakespeare", None, "Paris"]
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticCache(capacity=2)
+    cache.add("first prompt", "m", {}, {"text": "1"})
+    cache.add("second prompt", "m", {}, {"text": "2"})
+    cache.lookup("first prompt", "m")
+    cache.add("third prompt", "m", {}, {"text": "3"})
+    assert cache.lookup("second prompt", "m") is None
+    assert cache.lookup("first prompt", "m")[0] == {"text": "1"}
+    assert cache.stats()["evictions"] == 1
+
+def test_entries_expire_after_the_ttl():
+    clock = FakeClock()
+    cache = SemanticCache(ttl=10, clock=clock)
+    cache.add(QUESTION, "m", {}, {"text": "Paris"})
+    clock.advance(11)
+    assert cache.lookup(QUESTION, "m") is None
+
+def test_hits_are_copies_without_per_call_fields():
+    cache = SemanticCache()
+    cache.add(QUESTION, "m", {}, {"text": "Paris", "hedged": True})
+    cache.lookup(QUESTION, "m")[0]["text"] = "changed"
+    assert cache.lookup(QUESTION, "m")[0] == {"text": "Paris"}
+
+def test_router_answers_paraphrases_from_the_semantic_cache():
+    upstream = completion("Paris")
+    router = LLMRouter(providers=[make_provider("p", upstream)], semantic_cache=SemanticCache(threshold=0.8))
+    run(router.generate(QUESTION, "m"))
+    result = run(router.generate("what is the capitol of france", "m"))
+    assert result["text"] == "Paris" and result["cached"] is True
+    assert result["semantic"]["similarity"] >= 0.8
+    assert len(upstream.requests) == 1
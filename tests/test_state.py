@@ -0,0 +1,75 @@
+import asyncio
+import sqlite3
+import time
+
+from src.router import LLMRouter
+from src.utils.cache import SQLiteCacheStore
+from src.utils.negative_cache import MODEL_NOT_FOUND
+from src.utils.state import SQLiteStateBackend
+from tests.mocks import FakeClock, error, make_provider
+
+def run(coro):
+    return asyncio.run(coro)
+
+def hold_write_lock(path):
+    """Open a connection that holds the database's write lock, like a busy worker"""
+    conn = sqlite3.connect(str(path), isolation_level=None)
+    conn.execute("BEGIN IMMEDIATE")
+    return conn
+
+def test_busy_database_does_not_block_reservations(tmp_path):
+    path = tmp_path / "state.db"
+    backend = SQLiteStateBackend(path)
+    limiter = backend.rate_limiter()
+    limits = {"requests_per_minute": 10, "tokens_per_minute": 1000}
+    reservation = limiter.try_acquire("p", limits, 100)
+
+    other = hold_write_lock(path)
+    start = time.monotonic()
+    assert limiter.try_acquire("p", limits, 100) is False
+    limiter.record_tokens("p", -60, reservation)
+    assert time.monotonic() - start < 0.5
+    other.execute("ROLLBACK")
+
+    # The deferred correction is applied with the next transaction
+    assert limiter.try_acquire("p", limits, 100)
+    assert limiter.remaining_tokens("p", limits) == 860
+    backend.close()
+
+def test_negative_cache_is_shared_between_workers(tmp_path):
+    first = SQLiteStateBackend(tmp_path / "state.db").negative_cache(sync_interval=0)
+    second = SQLiteStateBackend(tmp_path / "state.db").negative_cache(sync_interval=0)
+
+    first.add("p", "retired", MODEL_NOT_FOUND, "gone")
+    assert second.is_dead("p", "retired")
+    assert not second.is_dead("p", "other")
+
+    second.discard("p", "retired")
+    assert not first.is_dead("p", "retired")
+
+def test_error_counters_are_shared_between_workers(tmp_path):
+    routers = [
+        LLMRouter(providers=[make_provider("p", error(500))], state_backend=SQLiteStateBackend(tmp_path / "state.db"))
+        for _ in range(2)
+    ]
+    for router in routers:
+        run(router.generate("hi", "m"))
+
+    health = routers[1].provider_health["p"]
+    assert health["error_count"] == 2
+    assert health["consecutive_errors"] == 2
+
+def test_circuit_breakers_use_the_backend_clock(tmp_path):
+    clock = FakeClock()
+    backend = SQLiteStateBackend(tmp_path / "state.db", clock=clock)
+    assert backend.circuit_breaker("circuit:p").clock is clock
+    assert backend.negative_cache().clock is clock
+
+def test_cache_store_reopens_after_fork(tmp_path):
+    store = SQLiteCacheStore(tmp_path / "cache.db")
+    store.set("k", {"text": "hello"}, time.time() + 60)
+    parent = store.connection
+
+    store._pid = -1  # as seen from a forked child
+    assert store.connection is not parent
+    assert store.get("k")[0] == {"text": "hello"}